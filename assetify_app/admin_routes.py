@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response
 from flask_login import login_required, current_user
 from functools import wraps
-from models import db, User, Distributor, AssetRequest
-from forms import UserForm, DistributorForm
+from models import db, User, Distributor, AssetRequest, ImportJob
+from forms import UserForm, DistributorForm, MappingImportForm
+from .query_budget import query_budget
+from .import_jobs import ERROR_REPORT_HEADERS, import_job_errors, import_job_payload, request_import_job
+from .xlsx_stream import stream_xlsx
+from .pagination import cursor_mode_requested, keyset_paginate
+from .status_counters import reassign_distributor_counters
 from sqlalchemy.exc import IntegrityError
 from wtforms.validators import DataRequired, Length, EqualTo, Optional 
 
@@ -54,6 +59,7 @@ def dashboard():
     return redirect(url_for('admin.manage_users'))
 
 @admin_bp.route('/users')
+@query_budget(4)
 @login_required
 @role_required('Admin')
 def manage_users():
@@ -82,12 +88,20 @@ def manage_users():
             'so': User.so
         }
         sort_field = sort_column_map.get(sort_by, User.name)
-        if order_by == 'desc':
-            query = query.order_by(sort_field.desc())
+        if cursor_mode_requested():
+            # Keyset comparisons skip NULLs, so nullable sort columns are coalesced.
+            if sort_by in ('email', 'so'):
+                sort_field = db.func.coalesce(sort_field, '')
+            pagination = keyset_paginate(
+                query, sort_field, User.id, sort_by, order_by,
+                current_app.config['ITEMS_PER_PAGE'], request.args.get('cursor')
+            )
         else:
-            query = query.order_by(sort_field.asc())
-        
-        pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
+            if order_by == 'desc':
+                query = query.order_by(sort_field.desc())
+            else:
+                query = query.order_by(sort_field.asc())
+            pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
         
         return render_template(
             'admin/manage_users.html', 
@@ -136,7 +150,8 @@ def add_user():
                     employee_code=form.employee_code.data.strip(),
                     email=form.email.data.strip().lower() if form.email.data else None,
                     role=form.role.data,
-                    so=form.so.data.strip() if form.so.data else None
+                    so=form.so.data.strip() if form.so.data else None,
+                    notification_mode=form.notification_mode.data
                 )
                 new_user.set_password(form.password.data)
                 if new_user.role == 'DB' and form.distributor_id.data != 0:
@@ -197,6 +212,7 @@ def edit_user(user_id):
                 user.email = new_email_raw
                 user.role = form.role.data
                 user.so = form.so.data.strip() if form.so.data else None
+                user.notification_mode = form.notification_mode.data
                 if form.password.data:
                     user.set_password(form.password.data)
                     
@@ -268,6 +284,7 @@ def delete_user(user_id):
 
 
 @admin_bp.route('/distributors')
+@query_budget(4)
 @login_required
 @role_required('Admin')
 def manage_distributors():
@@ -286,6 +303,11 @@ def manage_distributors():
             BM_User, Distributor.bm_id == BM_User.id
         ).outerjoin(
             RH_User, Distributor.rh_id == RH_User.id
+        ).options(
+            # Fill the SE/BM/RH relationships from the joins above instead of one SELECT per row
+            db.contains_eager(Distributor.sales_executive.of_type(SE_User)),
+            db.contains_eager(Distributor.branch_manager.of_type(BM_User)),
+            db.contains_eager(Distributor.regional_head.of_type(RH_User))
         )
         if search:
             search_term = f'%{search}%'
@@ -306,12 +328,20 @@ def manage_distributors():
             'rh': RH_User.name
         }
         sort_field = sort_column_map.get(sort_by, Distributor.name)
-        if order_by == 'desc':
-            query = query.order_by(sort_field.desc())
+        if cursor_mode_requested():
+            # Code and the outer-joined manager names can be NULL.
+            if sort_by in ('code', 'se', 'bm', 'rh'):
+                sort_field = db.func.coalesce(sort_field, '')
+            pagination = keyset_paginate(
+                query, sort_field, Distributor.id, sort_by, order_by,
+                current_app.config['ITEMS_PER_PAGE'], request.args.get('cursor')
+            )
         else:
-            query = query.order_by(sort_field.asc())
-        
-        pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
+            if order_by == 'desc':
+                query = query.order_by(sort_field.desc())
+            else:
+                query = query.order_by(sort_field.asc())
+            pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
         
         return render_template(
             'admin/manage_distributors.html', 
@@ -383,6 +413,7 @@ def edit_distributor(dist_id):
             flash('This Distributor Name is already in use by another distributor.', 'danger')
         else:
             try:
+                old_bm_id, old_rh_id = dist.bm_id, dist.rh_id
                 dist.code = form.code.data.strip()
                 dist.name = form.name.data.strip()
                 dist.city = form.city.data.strip() or None
@@ -390,6 +421,7 @@ def edit_distributor(dist_id):
                 dist.se_id = form.se_id.data if form.se_id.data != 0 else None
                 dist.bm_id = form.bm_id.data if form.bm_id.data != 0 else None
                 dist.rh_id = form.rh_id.data if form.rh_id.data != 0 else None
+                reassign_distributor_counters(dist, old_bm_id, old_rh_id)
                 db.session.commit()
                 flash(f'Distributor "{dist.name}" updated successfully.', 'success')
                 return redirect(url_for('admin.manage_distributors'))
@@ -434,4 +466,72 @@ def delete_distributor(dist_id):
     except Exception as e:
         db.session.rollback()
         flash(f"Error deleting distributor: {e}", "danger")
-    return redirect(url_for('admin.manage_distributors'))
\ No newline at end of file
+    return redirect(url_for('admin.manage_distributors'))
+
+
+# --- Org Mapping Import ---
+@admin_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@role_required('Admin')
+def import_mapping():
+    """Upload the mapping workbook; it is validated and applied by a background job."""
+    form = MappingImportForm()
+    if form.validate_on_submit():
+        upload = form.mapping_file.data
+        # .xlsx files are zip archives
+        if upload.stream.read(4) != b'PK\x03\x04':
+            flash("This file is not a valid .xlsx workbook.", "danger")
+        else:
+            upload.stream.seek(0)
+            try:
+                job = request_import_job(current_user, upload)
+                flash("Import queued. It runs in the background; you can leave this page.", "success")
+                return redirect(url_for('admin.import_job', job_id=job.id))
+            except Exception as e:
+                db.session.rollback()
+                flash(f"Error queueing import: {e}", "danger")
+    recent_jobs = ImportJob.query.order_by(ImportJob.id.desc()).limit(10).all()
+    return render_template('admin/import_mapping.html', form=form, recent_jobs=recent_jobs)
+
+
+@admin_bp.route('/import/<int:job_id>')
+@login_required
+@role_required('Admin')
+def import_job(job_id):
+    """Progress, summary and row errors of one import."""
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        flash("Import not found.", "danger")
+        return redirect(url_for('admin.import_mapping'))
+    return render_template('admin/import_job.html', job=job, payload=import_job_payload(job),
+                           row_errors=import_job_errors(job)[:100])
+
+
+@admin_bp.route('/import/<int:job_id>/status')
+@login_required
+@role_required('Admin')
+def import_job_status(job_id):
+    """Polling endpoint for a background import."""
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'ok': False, 'message': 'Import not found.'}), 404
+    payload = import_job_payload(job)
+    payload['ok'] = True
+    return jsonify(payload)
+
+
+@admin_bp.route('/import/<int:job_id>/errors')
+@login_required
+@role_required('Admin')
+def import_job_error_report(job_id):
+    """Download every rejected row of an import as .xlsx."""
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        flash("Import not found.", "danger")
+        return redirect(url_for('admin.import_mapping'))
+    response = Response(
+        stream_xlsx(ERROR_REPORT_HEADERS, import_job_errors(job), sheet_title="Import Errors"),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="import_{job.id}_errors.xlsx"'
+    return response
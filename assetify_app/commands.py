@@ -0,0 +1,155 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('rebuild-status-counters')
+@with_appcontext
+def rebuild_status_counters_command():
+    """Recompute the dashboard status counters from asset_request."""
+    from .status_counters import rebuild_status_counters
+    rows = rebuild_status_counters()
+    click.echo(f"Rebuilt status counters ({rows} rows).")
+
+
+@click.command('backfill-updated-at')
+@with_appcontext
+def backfill_updated_at_command():
+    """Set a missing asset_request.updated_at (the migration that adds the column backfills it)."""
+    from models import db, AssetRequest
+    result = db.session.execute(
+        db.update(AssetRequest)
+        .where(AssetRequest.updated_at.is_(None))
+        .values(updated_at=db.func.coalesce(AssetRequest.deployment_date, AssetRequest.request_date))
+    )
+    db.session.commit()
+    click.echo(f"Backfilled updated_at on {result.rowcount} requests.")
+
+
+@click.command('backfill-status-category')
+@with_appcontext
+def backfill_status_category_command():
+    """
+    Re-derive asset_request.status_category / status_code from status where they disagree
+    (e.g. after manual SQL edits). The migration that adds the columns backfills them.
+    """
+    from models import db, AssetRequest, STATUS_CATEGORIES, STATUS_CODES
+    category = db.case(STATUS_CATEGORIES, value=AssetRequest.status)
+    code = db.case(STATUS_CODES, value=AssetRequest.status)
+    result = db.session.execute(
+        db.update(AssetRequest)
+        .where(AssetRequest.status.in_(STATUS_CODES), db.or_(
+            AssetRequest.status_category.is_(None), AssetRequest.status_category != category,
+            AssetRequest.status_code.is_(None), AssetRequest.status_code != code
+        ))
+        # Keep updated_at: a backfill is not a change the export feed should resend
+        .values(status_category=category, status_code=code, updated_at=AssetRequest.updated_at)
+    )
+    db.session.commit()
+    click.echo(f"Backfilled status_category / status_code on {result.rowcount} requests.")
+    unknown = db.session.query(AssetRequest.status).filter(
+        db.or_(AssetRequest.status_category.is_(None), AssetRequest.status_code.is_(None))
+    ).distinct().all()
+    for (status,) in unknown:
+        click.echo(f"WARN: Status '{status}' is missing from STATUS_CATEGORIES / STATUS_CODES.")
+
+
+@click.command('migrate-uploads')
+@with_appcontext
+def migrate_uploads_command():
+    """Copy flat uuid4 uploads to the sharded content-addressed layout and rebuild reference counts."""
+    from .photos import migrate_legacy_uploads
+    moved, missing = migrate_legacy_uploads()
+    click.echo(f"Moved {moved} uploads to content-addressed storage.")
+    for filename in missing:
+        click.echo(f"WARN: {filename} is referenced by a request but missing from the upload folder.")
+
+
+@click.command('gc-uploads')
+@click.option('--grace-minutes', type=int, default=60, show_default=True,
+              help='Leave stray files younger than this (uploads still being submitted).')
+@with_appcontext
+def gc_uploads_command(grace_minutes):
+    """Delete uploaded photos no request refers to any more."""
+    from .photos import collect_unreferenced_uploads
+    collected, stray = collect_unreferenced_uploads(grace_minutes)
+    click.echo(f"Deleted {collected} unreferenced uploads and {stray} stray files.")
+
+
+@click.command('send-outbox')
+@click.option('--batch-size', type=int, default=None, help='Messages claimed per batch (default MAIL_OUTBOX_BATCH_SIZE).')
+@click.option('--loop', is_flag=True, help='Keep running and poll for new mail.')
+@click.option('--interval', type=int, default=10, show_default=True, help='Seconds between polls with --loop.')
+@with_appcontext
+def send_outbox_command(batch_size, loop, interval):
+    """Deliver queued notification emails from the email_outbox table."""
+    from flask import current_app
+    from .outbox import drain_outbox, mail_configured
+    if not mail_configured(current_app.config):
+        click.echo("Email credentials not configured; queued emails stay pending.")
+        return
+    totals = drain_outbox(batch_size or current_app.config['MAIL_OUTBOX_BATCH_SIZE'], loop=loop, interval=interval)
+    click.echo(f"Outbox: {totals['sent']} sent, {totals['pending']} to retry, {totals['dead']} dead-lettered.")
+
+
+@click.command('send-digests')
+@with_appcontext
+def send_digests_command():
+    """Queue approval digest emails for BMs / RHs in digest mode (run before send-outbox)."""
+    from flask import current_app
+    from .digests import send_digests
+    # url_for(_external=True) in the email templates needs a request context
+    with current_app.test_request_context(base_url=current_app.config['APP_BASE_URL']):
+        queued = send_digests()
+    click.echo(f"Queued {queued} approval digest(s).")
+
+
+@click.command('generate-data')
+@click.option('--seed', type=int, default=42, show_default=True, help='Random seed; same options + seed = same data.')
+@click.option('--regions', type=int, default=4, show_default=True, help='Regional heads (RHs).')
+@click.option('--bms-per-region', type=int, default=6, show_default=True)
+@click.option('--distributors-per-bm', type=int, default=25, show_default=True)
+@click.option('--distributors-per-se', type=int, default=3, show_default=True, help='Distributors covered by one SE.')
+@click.option('--requests', 'request_count', type=int, default=200000, show_default=True)
+@click.option('--days', type=int, default=730, show_default=True, help='How far back request dates go.')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Date of the newest requests (default today).')
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='Rows per INSERT batch / commit.')
+@click.option('--password', default='synthetic', show_default=True, help='Password for every generated account.')
+@click.option('--replace', is_flag=True, help='Delete previously generated SYN* data first.')
+@with_appcontext
+def generate_data_command(seed, regions, bms_per_region, distributors_per_bm, distributors_per_se,
+                          request_count, days, end_date, batch_size, password, replace):
+    """Generate a synthetic org tree and asset requests for load tests and benchmarks."""
+    import time
+    from datetime import date
+    from .synthetic import delete_synthetic_data, generate_synthetic_data, synthetic_data_exists
+    if synthetic_data_exists():
+        if not replace:
+            click.echo("Synthetic (SYN*) data already exists. Use --replace to regenerate it.")
+            return
+        click.echo(f"Deleted {delete_synthetic_data()} synthetic requests.")
+    started = time.perf_counter()
+
+    def progress(done):
+        rate = done / (time.perf_counter() - started)
+        click.echo(f"  {done}/{request_count} requests ({rate:.0f} rows/s)")
+
+    distributors, created = generate_synthetic_data(
+        seed, regions, bms_per_region, distributors_per_bm, distributors_per_se,
+        request_count, days, batch_size, password,
+        end_date=end_date.date() if end_date else date.today(), progress=progress
+    )
+    click.echo(f"Generated {regions} RHs, {regions * bms_per_region} BMs, {distributors} distributors "
+               f"and {created} requests in {time.perf_counter() - started:.1f}s.")
+
+
+def register_commands(app):
+    """Attach the Assetify CLI commands to the app (`flask <command>`)."""
+    app.cli.add_command(rebuild_status_counters_command)
+    app.cli.add_command(backfill_updated_at_command)
+    app.cli.add_command(backfill_status_category_command)
+    app.cli.add_command(migrate_uploads_command)
+    app.cli.add_command(gc_uploads_command)
+    app.cli.add_command(send_outbox_command)
+    app.cli.add_command(send_digests_command)
+    app.cli.add_command(generate_data_command)
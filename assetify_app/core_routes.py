@@ -1,21 +1,27 @@
 import os
-import base64
-import uuid
-import io
 from flask import (
     Blueprint, render_template, redirect, url_for, flash, request, 
-    send_from_directory, jsonify, current_app, send_file
+    send_file, jsonify, current_app, Response, stream_with_context
 )
 from flask_login import login_required, current_user
-from flask_mail import Message
-from threading import Thread
 from functools import wraps
-from models import db, User, Distributor, AssetRequest
+from models import db, User, Distributor, AssetRequest, ExportJob, CATEGORIES, STATUS_CATEGORIES, STATUS_CODES
 from forms import AssetRequestForm, DeploymentForm
+from .query_budget import query_budget
+from .digests import notify_approver
+from .exports import (
+    DMS_EXPORT_HEADERS, EXPORT_MIMETYPE, build_changes_query, build_export_projection,
+    dms_export_row_from_projection, export_filename, format_watermark, iter_export_rows, parse_watermark
+)
+from .export_jobs import export_job_payload, export_scope, fail_abandoned_export_jobs, request_export_job
+from .xlsx_stream import stream_xlsx
+from .photos import save_photo, send_upload, thumbnail_filename, upload_path
+from .pagination import cursor_mode_requested, keyset_paginate
+from .status_counters import aggregate_status_stats, counter_stats_for_user, record_status_change, status_counters_ready
+from .transitions import approve_as_admin, approve_as_bm, approve_as_rh, current_status, deploy, reject
 from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-from openpyxl import Workbook
 # We do not import db or mail here, they are imported from the factory in __init__.py
 
 # --- Create Blueprint ---
@@ -37,72 +43,17 @@ def role_required(*roles):
         return decorated_view
     return wrapper
 
-def send_async_email(app_instance, msg):
-    with app_instance.app_context():
-        try:
-            # --- FIX: Import mail from the app factory ---
-            from assetify_app import mail
-            if app_instance.config['MAIL_USERNAME'] and app_instance.config['MAIL_PASSWORD']:
-                mail.send(msg)
-                print(f"Email sent to {msg.recipients}")
-            else:
-                print(f"Email NOT SENT to {msg.recipients} (credentials not configured)")
-        except Exception as e:
-            print(f"ERROR sending email to {msg.recipients}: {e}")
-
-def send_email(recipient_email, subject, template, **kwargs):
-    if not recipient_email:
-        print(f"WARN: No recipient email for subject: {subject}")
-        return
-    if not current_app.config['MAIL_USERNAME'] or not current_app.config['MAIL_PASSWORD']:
-        print(f"Email skipped (not configured): '{subject}' to {recipient_email}")
-        return
-    try:
-        sender = current_app.config['MAIL_DEFAULT_SENDER'] or current_app.config['MAIL_USERNAME']
-        msg = Message(subject, sender=sender, recipients=[recipient_email])
-        msg.html = render_template(template, **kwargs)
-        
-        thread = Thread(target=send_async_email, args=[current_app._get_current_object(), msg])
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"ERROR preparing email: {e}")
-
-# --- THIS IS THE ORIGINAL FUNCTION FOR SAVING TO THE UPLOADS FOLDER ---
-def _save_photo_from_data_url(data_url):
-    """Helper function to save a base64 data URL as a file."""
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
-    
-    if not data_url or not data_url.startswith('data:image'):
-        return None, "Invalid photo data."
-    try:
-        header, encoded = data_url.split(",", 1)
-        data = base64.b64decode(encoded)
-        ext = header.split('/')[1].split(';')[0]
-        if ext not in allowed_extensions:
-            return None, f"Invalid image type: {ext}"
-        
-        filename = f"{uuid.uuid4()}.{ext}"
-        filepath = os.path.join(upload_folder, filename)
-        
-        with open(filepath, "wb") as f:
-            f.write(data)
-        return filename, None # Return the filename
-    except Exception as e:
-        print(f"ERROR processing image: {e}")
-        return None, "Error processing image file."
-
-
 # --- Core Application Routes ---
 
 @core_bp.route('/dashboard')
+@query_budget(8)
 @login_required
 def dashboard():
     # ... (This function is unchanged from the blueprint version) ...
     page = request.args.get('page', 1, type=int)
     search_distributor = request.args.get('distributor', '').strip()
     filter_status = request.args.get('status', '').strip()
+    filter_category = request.args.get('category', '').strip()
     filter_requester_id = request.args.get('requester', '').strip()
     sort_by = request.args.get('sort_by', 'date')
     order_by = request.args.get('order_by', 'desc')
@@ -119,7 +70,7 @@ def dashboard():
             requester_id=current_user.id
         )
     elif current_user.role == 'BM':
-        base_query = base_query.join(Distributor).filter(
+        base_query = base_query.join(Distributor, AssetRequest.distributor_id == Distributor.id).filter(
             db.or_(
                 Distributor.bm_id == current_user.id,
                 AssetRequest.requester_id == current_user.id
@@ -127,7 +78,7 @@ def dashboard():
         )
         joined_distributor = True
     elif current_user.role == 'RH':
-        base_query = base_query.join(Distributor).filter(
+        base_query = base_query.join(Distributor, AssetRequest.distributor_id == Distributor.id).filter(
             db.or_(
                 Distributor.rh_id == current_user.id,
                 AssetRequest.requester_id == current_user.id
@@ -164,36 +115,50 @@ def dashboard():
             query = query.join(Distributor, AssetRequest.distributor_id == Distributor.id, isouter=True)
             joined_distributor = True
         query = query.filter(Distributor.name.ilike(f'%{search_distributor}%'))
-    if filter_status:
+    if filter_status in STATUS_CODES:
+        query = query.filter(AssetRequest.status_code == STATUS_CODES[filter_status])
+    elif filter_status:
         query = query.filter(AssetRequest.status == filter_status)
+    if filter_category in CATEGORIES:
+        query = query.filter(AssetRequest.status_category == filter_category)
     if filter_requester_id and current_user.role in ['Admin', 'BM', 'RH', 'DB']:
         try:
             query = query.filter(AssetRequest.requester_id == int(filter_requester_id))
         except ValueError:
             flash("Invalid requester ID provided in filter.", "warning")
             
-    stats = {
-        'total_requests': base_query.count(),
-        'pending_requests': base_query.filter(AssetRequest.status.like('Pending%')).count(),
-        'approved_requests': base_query.filter(AssetRequest.status == 'Approved').count(),
-        'deployed_requests': base_query.filter(AssetRequest.status == 'Deployed').count(),
-        'rejected_requests': base_query.filter(AssetRequest.status.like('%Rejected%')).count(),
-        'pending_bm_count': base_query.filter(AssetRequest.status == 'Pending BM Approval').count(),
-        'pending_rh_count': base_query.filter(AssetRequest.status == 'Pending RH Approval').count()
-    }
+    # Cards come from the status counter table (O(1) lookup); the single
+    # conditional-aggregation query is the fallback when counters are off.
+    if current_app.config['STATUS_COUNTERS_ENABLED'] and status_counters_ready():
+        stats = counter_stats_for_user(current_user)
+    else:
+        stats = aggregate_status_stats(base_query)
     
-    pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
+    # The list renders requester and distributor names for every row; load them
+    # with the page (reusing the explicit joins when they are already there).
+    query = query.options(
+        db.contains_eager(AssetRequest.distributor) if joined_distributor else db.joinedload(AssetRequest.distributor),
+        db.contains_eager(AssetRequest.requester) if joined_requester else db.joinedload(AssetRequest.requester)
+    )
+
+    if cursor_mode_requested():
+        pagination = keyset_paginate(
+            query, sort_field, AssetRequest.id, sort_by, order_by,
+            current_app.config['ITEMS_PER_PAGE'], request.args.get('cursor')
+        )
+    else:
+        pagination = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
     
     requesters = []
     if current_user.role in ['Admin', 'BM', 'RH', 'DB']:
         requesters = User.query.filter_by(role='SE').order_by(User.name).all()
         
-    statuses_query = db.session.query(AssetRequest.status).distinct().order_by(AssetRequest.status)
-    statuses = [s[0] for s in statuses_query.all()] 
+    statuses = sorted(STATUS_CATEGORIES)
 
     search_values = {
         'distributor': search_distributor,
         'status': filter_status,
+        'category': filter_category,
         'requester': filter_requester_id
     }
 
@@ -240,10 +205,8 @@ def new_request():
 
 
     if form.validate_on_submit(): 
-        # --- Uses the local _save_photo_from_data_url ---
-        photo_filename, photo_error = _save_photo_from_data_url(
-            form.captured_photo.data
-        )
+        # --- File part (streamed to disk) or legacy data URL ---
+        photo_filename, photo_error = save_photo(form.captured_photo.data)
         if photo_error:
             return jsonify({'success': False, 'message': f"Photo Error: {photo_error}"}), 400
 
@@ -276,11 +239,13 @@ def new_request():
                 status='Pending BM Approval'
             )
             db.session.add(new_req)
-            db.session.commit()
+            record_status_change(new_req, None, new_req.status, distributor=distributor)
+            db.session.flush()  # assigns new_req.id for the email
 
+            # --- Queued in the outbox, committed together with the request ---
             if distributor.branch_manager and distributor.branch_manager.email:
-                send_email(
-                    distributor.branch_manager.email,
+                notify_approver(
+                    distributor.branch_manager,
                     f'New Asset Request #{new_req.id} for Approval',
                     'email/new_for_approval.html',
                     request=new_req,
@@ -288,6 +253,7 @@ def new_request():
                 )
             else:
                 print(f"WARN: No BM assigned or BM has no email for Distributor ID {distributor.id}. Cannot send email.")
+            db.session.commit()
             
             flash('Request submitted successfully!', 'success')
             return jsonify({'success': True, 'request_id': new_req.id})
@@ -310,10 +276,17 @@ def new_request():
 
 
 @core_bp.route('/request/<int:request_id>')
+@query_budget(3)
 @login_required
 def view_request(request_id):
     # ... (This function is unchanged from the blueprint version) ...
-    asset_request = db.session.get(AssetRequest, request_id)
+    asset_request = db.session.get(AssetRequest, request_id, options=[
+        db.joinedload(AssetRequest.requester),
+        db.joinedload(AssetRequest.distributor),
+        db.joinedload(AssetRequest.bm_approver),
+        db.joinedload(AssetRequest.rh_approver),
+        db.joinedload(AssetRequest.deployed_by)
+    ])
     if not asset_request:
         flash("Request not found.", "danger")
         return redirect(url_for('core.dashboard'))
@@ -343,101 +316,86 @@ def view_request(request_id):
     return render_template('view_request.html', request=asset_request)
 
 
+def _transition_refused(request_id, action):
+    """
+    Redirect after a conditional transition matched no row: the request is
+    gone, is at another stage (possibly just handled by someone else), or
+    is not the current user's to act on.
+    """
+    status = current_status(request_id)
+    if status is None:
+        flash("Request not found.", "danger")
+        return redirect(url_for('core.dashboard'))
+    flash(f"Cannot {action} this request: it is now '{status}' (it may have just been handled "
+          f"by someone else) or you lack permission.", 'warning')
+    return redirect(url_for('core.view_request', request_id=request_id))
+
+
 @core_bp.route('/approve/<int:request_id>', methods=['POST'])
 @login_required
 @role_required('BM', 'RH', 'Admin')
 def approve_request(request_id):
-    # ... (This function is unchanged, and already contains the "disabled SE email" logic) ...
-    asset_request = db.session.get(AssetRequest, request_id)
-    if not asset_request:
-        flash("Request not found.", "danger")
-        return redirect(url_for('core.dashboard'))
-        
-    action_taken = False
-    original_status = asset_request.status
-
-    if current_user.role == 'BM' and asset_request.status == 'Pending BM Approval':
-        approval_type = request.form.get('approval_type')
-        if approval_type == 'security':
-            try:
-                amount = int(request.form.get('security_amount', 0))
+    # Each approval is one conditional UPDATE (see transitions.py); the
+    # request is not loaded first, so a concurrent approval cannot be overwritten.
+    remarks = request.form.get('remarks', '').strip()
+    try:
+        if current_user.role == 'BM':
+            approval_type = request.form.get('approval_type')
+            if approval_type == 'security':
+                try:
+                    amount = int(request.form.get('security_amount', 0))
+                except (ValueError, TypeError):
+                    flash('Invalid security amount entered.', 'danger')
+                    return redirect(url_for('core.view_request', request_id=request_id))
                 if amount <= 0:
                     flash('Security amount must be greater than zero.', 'danger')
                     return redirect(url_for('core.view_request', request_id=request_id))
-                asset_request.bm_approval_type = 'With Security'
-                asset_request.bm_security_amount = amount
-                asset_request.bm_foc_justification = None 
-            except (ValueError, TypeError):
-                flash('Invalid security amount entered.', 'danger')
-                return redirect(url_for('core.view_request', request_id=request_id))
-        elif approval_type == 'foc':
-            justification = request.form.get('foc_justification', '').strip()
-            if not justification:
-                flash('Justification is required for "Free of Cost" approval.', 'danger')
+                result = approve_as_bm(request_id, current_user, 'With Security', security_amount=amount)
+            elif approval_type == 'foc':
+                justification = request.form.get('foc_justification', '').strip()
+                if not justification:
+                    flash('Justification is required for "Free of Cost" approval.', 'danger')
+                    return redirect(url_for('core.view_request', request_id=request_id))
+                result = approve_as_bm(request_id, current_user, 'Free of Cost', justification=justification)
+            else:
+                flash('You must select an approval type ("With Security" or "Free of Cost").', 'danger')
                 return redirect(url_for('core.view_request', request_id=request_id))
-            asset_request.bm_approval_type = 'Free of Cost'
-            asset_request.bm_foc_justification = justification
-            asset_request.bm_security_amount = None
+            success_message = 'Request approved and forwarded to Regional Head.'
+        elif current_user.role == 'RH':
+            result = approve_as_rh(request_id, current_user, remarks)
+            success_message = 'Request has been fully approved!'
         else:
-            flash('You must select an approval type ("With Security" or "Free of Cost").', 'danger')
-            return redirect(url_for('core.view_request', request_id=request_id))
-
-        asset_request.status = 'Pending RH Approval'
-        asset_request.bm_approver_id = current_user.id
-        asset_request.bm_remarks = None 
-        action_taken = True
-        flash('Request approved and forwarded to Regional Head.', 'success')
-
-    elif current_user.role == 'RH' and asset_request.status == 'Pending RH Approval':
-        remarks = request.form.get('remarks', '').strip() 
-        asset_request.status = 'Approved'
-        asset_request.rh_approver_id = current_user.id
-        if remarks:
-            asset_request.rh_remarks = remarks
-        action_taken = True
-        flash('Request has been fully approved!', 'success')
-
-    elif current_user.role == 'Admin' and 'Pending' in asset_request.status:
-        remarks = request.form.get('remarks', '').strip()
-        asset_request.status = 'Approved'
-        if original_status == 'Pending BM Approval': 
-            asset_request.bm_approver_id = current_user.id
-            if remarks: asset_request.bm_remarks = f"Approved by Admin: {remarks}"
-        asset_request.rh_approver_id = current_user.id
-        if remarks: asset_request.rh_remarks = f"Approved by Admin: {remarks}"
-        asset_request.bm_approval_type = "Admin Override" 
-        action_taken = True
-        flash('Request approved by Admin.', 'success')
-
-    if action_taken:
-        try:
-            db.session.commit()
-            db.session.refresh(asset_request) 
-            if original_status == 'Pending BM Approval' and asset_request.status == 'Pending RH Approval':
-                if asset_request.distributor.regional_head and asset_request.distributor.regional_head.email:
-                    send_email(
-                        asset_request.distributor.regional_head.email,
-                        f'Asset Request #{asset_request.id} Requires Your Approval',
-                        'email/new_for_approval.html',
-                        request=asset_request,
-                        recipient_name=asset_request.distributor.regional_head.name or 'Regional Head'
-                    )
-                else:
-                    print(f"WARN: Could not send RH approval email for Req #{asset_request.id} - RH not assigned or email missing")
-            
-            # --- SE Email is Disabled Here ---
-            # elif asset_request.status == 'Approved':
-            #     if asset_request.requester and asset_request.requester.email:
-            #          send_email( ... )
+            result = approve_as_admin(request_id, current_user, remarks)
+            success_message = 'Request approved by Admin.'
 
-        except Exception as e:
+        if result is None:
             db.session.rollback()
-            print(f"ERROR during commit or email sending: {e}") 
-            flash(f'Error saving approval or sending email: {e}', 'danger')
-            return redirect(url_for('core.view_request', request_id=request_id)) 
-    else:
-        if 'Pending' not in asset_request.status: 
-             flash('Cannot approve this request at its current stage or you lack permission.', 'warning')
+            return _transition_refused(request_id, 'approve')
+
+        # --- Queued in the outbox, committed together with the approval ---
+        if result.old_status == 'Pending BM Approval' and result.status == 'Pending RH Approval':
+            regional_head = result.regional_head
+            if regional_head and regional_head.email:
+                notify_approver(
+                    regional_head,
+                    f'Asset Request #{result.id} Requires Your Approval',
+                    'email/new_for_approval.html',
+                    request=result,
+                    recipient_name=regional_head.name or 'Regional Head'
+                )
+            else:
+                print(f"WARN: Could not send RH approval email for Req #{result.id} - RH not assigned or email missing")
+
+        # --- SE Email is Disabled Here ---
+        # elif result.status == 'Approved':
+        #     queue_email( ... )
+        db.session.commit()
+        flash(success_message, 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"ERROR during commit or email sending: {e}")
+        flash(f'Error saving approval or sending email: {e}', 'danger')
     return redirect(url_for('core.view_request', request_id=request_id))
 
 
@@ -445,57 +403,25 @@ def approve_request(request_id):
 @login_required
 @role_required('BM', 'RH', 'Admin')
 def reject_request(request_id):
-    # ... (This function is unchanged, and already contains the "disabled SE email" logic) ...
-    asset_request = db.session.get(AssetRequest, request_id)
-    if not asset_request:
-        flash("Request not found.", "danger")
-        return redirect(url_for('core.dashboard'))
-        
-    action_taken = False
-    outcome = 'Rejected'
     remarks = request.form.get('remarks', '').strip()
-    
     if not remarks:
         flash('Reason for Rejection is required.', 'danger')
         return redirect(url_for('core.view_request', request_id=request_id))
 
-    if current_user.role == 'BM' and asset_request.status == 'Pending BM Approval':
-        asset_request.status = 'Rejected by BM'
-        asset_request.bm_approver_id = current_user.id
-        asset_request.bm_remarks = remarks
-        outcome = 'Rejected by BM'
-        action_taken = True
-    elif current_user.role == 'RH' and asset_request.status == 'Pending RH Approval':
-        asset_request.status = 'Rejected by RH'
-        asset_request.rh_approver_id = current_user.id
-        asset_request.rh_remarks = remarks
-        outcome = 'Rejected by RH'
-        action_taken = True
-    elif current_user.role == 'Admin' and 'Pending' in asset_request.status:
-        original_status = asset_request.status
-        asset_request.status = 'Rejected by Admin'
-        if original_status == 'Pending BM Approval':
-            asset_request.bm_approver_id = current_user.id
-            asset_request.bm_remarks = f"Rejected by Admin: {remarks}"
-        asset_request.rh_approver_id = current_user.id
-        asset_request.rh_remarks = f"Rejected by Admin: {remarks}"
-        outcome = 'Rejected by Admin'
-        action_taken = True
-
-    if action_taken:
-        try:
-            db.session.commit()
-            
-            # --- SE Email is Disabled Here ---
-            # if asset_request.requester and asset_request.requester.email:
-            #     send_email( ... )
-            
-            flash('Request has been rejected.', 'success')
-        except Exception as e:
+    try:
+        result = reject(request_id, current_user, remarks)
+        if result is None:
             db.session.rollback()
-            flash(f'Error saving rejection: {e}', 'danger')
-    else:
-        flash('Cannot reject this request at its current stage or you lack permission.', 'warning') 
+            return _transition_refused(request_id, 'reject')
+        db.session.commit()
+
+        # --- SE Email is Disabled Here ---
+        # queue_email( ... )
+
+        flash('Request has been rejected.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error saving rejection: {e}', 'danger')
     return redirect(url_for('core.view_request', request_id=request_id))
 
 @core_bp.route('/request/<int:request_id>/deploy', methods=['GET', 'POST'])
@@ -527,28 +453,25 @@ def confirm_deployment(request_id):
         if existing_serial:
             flash("This asset serial number has already been recorded for another request.", "danger")
         else:
-            # --- Uses the local _save_photo_from_data_url ---
-            photo1_filename, p1_error = _save_photo_from_data_url(
-                form.deployment_photo1.data
-            )
+            # --- File parts (streamed to disk) or legacy data URLs ---
+            photo1_filename, p1_error = save_photo(form.deployment_photo1.data)
             if p1_error:
                 flash(f"Photo 1 Error: {p1_error}", "danger")
             
-            photo2_filename, p2_error = _save_photo_from_data_url(
-                form.deployment_photo2.data
-            )
+            photo2_filename, p2_error = save_photo(form.deployment_photo2.data)
             if p2_error:
                 flash(f"Photo 2 Error: {p2_error}", "danger")
                 
             if not existing_serial and not p1_error and not p2_error:
                 try:
-                    asset_request.deployed_make = form.deployed_make.data.strip()
-                    asset_request.deployed_serial_no = serial_no_stripped
-                    asset_request.deployment_photo1_filename = photo1_filename # <-- Saves filename
-                    asset_request.deployment_photo2_filename = photo2_filename # <-- Saves filename
-                    asset_request.deployed_by_id = current_user.id
-                    asset_request.deployment_date = datetime.utcnow()
-                    asset_request.status = 'Deployed' 
+                    # 'Approved' -> 'Deployed' only if nobody deployed it meanwhile
+                    result = deploy(
+                        request_id, current_user, form.deployed_make.data.strip(), serial_no_stripped,
+                        photo1_filename, photo2_filename
+                    )
+                    if result is None:
+                        db.session.rollback()
+                        return _transition_refused(request_id, 'deploy')
                     db.session.commit()
                     flash('Deployment confirmed successfully! The request is now closed.', 'success')
                     return redirect(url_for('core.view_request', request_id=request_id))
@@ -561,144 +484,144 @@ def confirm_deployment(request_id):
 @core_bp.route('/export/excel')
 @login_required
 def export_excel():
-    # ... (This function is unchanged from the blueprint version) ...
-    base_query = AssetRequest.query
-    if current_user.role == 'SE':
-        base_query = base_query.filter_by(requester_id=current_user.id)
-    elif current_user.role == 'DB':
-        base_query = base_query.filter_by(distributor_id=current_user.distributor_id)
-    elif current_user.role == 'BM':
-        base_query = base_query.join(Distributor).filter(
-            Distributor.bm_id == current_user.id
-        )
-    elif current_user.role == 'RH':
-        base_query = base_query.join(Distributor).filter(
-            Distributor.rh_id == current_user.id
-        )
-    
-    query = base_query.options(
-        db.joinedload(AssetRequest.distributor),
-        db.joinedload(AssetRequest.requester)
-    ).order_by(AssetRequest.request_date.desc())
+    """Stream the DMS export as it is generated (constant memory, no full-workbook build)."""
+    try:
+        query = build_export_projection(current_user, request.args)
+    except ValueError:
+        flash("Invalid filter value provided.", "danger")
+        return redirect(url_for('core.dashboard'))
+
+    rows = iter_export_rows(query)
+    response = Response(
+        stream_with_context(stream_xlsx(DMS_EXPORT_HEADERS, rows, sheet_title="DMS Export")),
+        mimetype=EXPORT_MIMETYPE
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename()}"'
+    return response
 
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    filter_requester_id = request.args.get('requester')
-    filter_status = request.args.get('status')
+@core_bp.route('/export/changes')
+@login_required
+def export_changes():
+    """
+    Incremental DMS feed: only requests created or changed after ?since=<watermark>.
+    The next watermark is returned in the X-Export-Watermark header (xlsx) or in
+    the body (?format=json). Omit `since` for the first, full pull.
+    """
+    since_str = request.args.get('since', '').strip()
+    try:
+        since = parse_watermark(since_str) if since_str else None
+        # Leave a short lag so changes still being committed are not skipped past
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['EXPORT_FEED_LAG_SECONDS'])
+        query = build_changes_query(current_user, request.args, since=since, until=cutoff)
+    except ValueError:
+        return jsonify({'ok': False, 'message': 'Invalid watermark or filter value.'}), 400
+
+    if request.args.get('format') == 'json':
+        limit = min(request.args.get('limit', 1000, type=int), current_app.config['EXPORT_FEED_MAX_LIMIT'])
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        watermark = format_watermark(rows[-1].updated_at, rows[-1].id) if rows else since_str
+        return jsonify({
+            'ok': True,
+            'watermark': watermark,
+            'has_more': has_more,
+            'count': len(rows),
+            'rows': [dict(zip(DMS_EXPORT_HEADERS, dms_export_row_from_projection(r))) for r in rows]
+        })
+
+    last_change = query.order_by(None).order_by(
+        AssetRequest.updated_at.desc(), AssetRequest.id.desc()
+    ).with_entities(AssetRequest.updated_at, AssetRequest.id).first()
+    watermark = format_watermark(*last_change) if last_change else since_str
+
+    response = Response(
+        stream_with_context(stream_xlsx(DMS_EXPORT_HEADERS, iter_export_rows(query), sheet_title="DMS Changes")),
+        mimetype=EXPORT_MIMETYPE
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="changes_{export_filename()}"'
+    response.headers['X-Export-Watermark'] = watermark
+    return response
 
+
+@core_bp.route('/export/jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    """Queue (or reuse) a background export for the posted filters."""
     try:
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            query = query.filter(AssetRequest.request_date >= start_date)
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            end_date_inclusive = end_date + timedelta(days=1)
-            query = query.filter(AssetRequest.request_date < end_date_inclusive)
-        if filter_requester_id and current_user.role in ['Admin', 'BM', 'RH', 'DB']:
-             query = query.filter(AssetRequest.requester_id == int(filter_requester_id))
-        if filter_status:
-            query = query.filter(AssetRequest.status == filter_status)
+        job = request_export_job(current_user, request.form)
     except ValueError:
-        flash("Invalid filter value provided.", "danger")
+        return jsonify({'ok': False, 'message': 'Invalid filter value provided.'}), 400
+    payload = export_job_payload(job)
+    payload.update(
+        ok=True,
+        status_url=url_for('core.export_job_status', job_id=job.id),
+        download_url=url_for('core.download_export_job', job_id=job.id)
+    )
+    return jsonify(payload), 202
+
+
+def _get_export_job_for_user(job_id):
+    """Returns the job if it exists and covers the same rows the user may export."""
+    job = db.session.get(ExportJob, job_id)
+    if not job or job.scope != export_scope(current_user):
+        return None
+    return job
+
+
+@core_bp.route('/export/jobs/<int:job_id>')
+@login_required
+def export_job_status(job_id):
+    """Polling endpoint for a background export."""
+    job = _get_export_job_for_user(job_id)
+    if not job:
+        return jsonify({'ok': False, 'message': 'Export job not found.'}), 404
+    if job.status in ('queued', 'running') and fail_abandoned_export_jobs():
+        db.session.refresh(job)
+    payload = export_job_payload(job)
+    payload['ok'] = True
+    if job.status == 'done':
+        payload['download_url'] = url_for('core.download_export_job', job_id=job.id)
+    return jsonify(payload)
+
+
+@core_bp.route('/export/jobs/<int:job_id>/download')
+@login_required
+def download_export_job(job_id):
+    """Download the finished file of a background export."""
+    job = _get_export_job_for_user(job_id)
+    if not job or job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        flash("This export is not available. Please create it again.", "warning")
         return redirect(url_for('core.dashboard'))
-            
-    requests_to_export = query.all()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "DMS Export"
-
-    headers = [
-        # --- Original DMS Headers ---
-        "Customer Category", "Customer Name", "Customer Code", "Customer Type",
-        "Customer Address", "Region", "Sales Office", "pincode",
-        "Territory/Cluster", "Contact No 1", "Contact No 2", "Contact No 3",
-        "Email Id 1", "Email Id 2", "Primary Contact Person", "Secondary Contact Person",
-        "Parent Customer Code", "GST No", "GST State Code", "PAN",
-        "Rate Code", "Discount Code", "Remarks", "FSSAI", "BEAT Name",
-        
-        # --- NEW TRACKING HEADERS ---
-        "Request ID",
-        "Request Date",
-        "Request Status",
-        "SE (Requester)",
-        "Distributor Name",
-        "BM Approver",
-        "BM Approval Type",
-        "BM Security Amount",
-        "BM FOC Justification",
-        "RH Approver",
-        "Deployed By",
-        "Deployment Date"
-    ]
-    ws.append(headers)
-
-    for req in requests_to_export:
-        full_address = f"{req.retailer_address or ''} {req.landmark or ''}".strip()
-        row = [
-            # --- Original DMS Data ---
-            req.category,
-            req.retailer_name,
-            req.id,
-            "GT",
-            full_address,
-            req.distributor.city if req.distributor else "",
-            req.requester.so if req.requester else "",
-            "", "", 
-            req.retailer_contact,
-            "", "", 
-            req.retailer_email,
-            "", 
-            req.retailer_name,
-            "", 
-            req.distributor.code if req.distributor else "",
-            "", "", "", 
-            "", "", 
-            "", "", "" ,
-            
-            # --- NEW TRACKING DATA ---
-            f"#{req.id}",
-            req.request_date.strftime('%Y-%m-%d') if req.request_date else "N/A",
-            req.status,
-            req.requester.name if req.requester else "N/A",
-            req.distributor.name if req.distributor else "N/A",
-            req.bm_approver.name if req.bm_approver else "N/A",
-            req.bm_approval_type if req.bm_approval_type else "N/A",
-            req.bm_security_amount if req.bm_security_amount else "N/A",
-            req.bm_foc_justification if req.bm_foc_justification else "N/A",
-            req.rh_approver.name if req.rh_approver else "N/A",
-            req.deployed_by.name if req.deployed_by else "N/A",
-            req.deployment_date.strftime('%Y-%m-%d') if req.deployment_date else "N/A"
-        ]
-        ws.append(row)
-
-    file_buffer = io.BytesIO()
-    wb.save(file_buffer)
-    file_buffer.seek(0)
-    filename = f"hfl_dms_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return send_file(
-        file_buffer,
+        job.file_path,
         as_attachment=True,
-        download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        download_name=f"hfl_dms_export_{job.finished_at.strftime('%Y%m%d_%H%M%S')}.xlsx",
+        mimetype=EXPORT_MIMETYPE
     )
 
 # --- API Routes ---
 @core_bp.route('/api/distributors')
+@query_budget(3)
 @login_required
 def get_distributors():
     # ... (This function is unchanged from the blueprint version) ...
     try:
+        # BM and RH are read for every distributor in the list
+        query = Distributor.query.options(
+            db.joinedload(Distributor.branch_manager),
+            db.joinedload(Distributor.regional_head)
+        )
         if current_user.role == 'SE':
-            distributors = Distributor.query.filter_by(se_id=current_user.id).order_by(Distributor.name).all()
+            distributors = query.filter_by(se_id=current_user.id).order_by(Distributor.name).all()
         elif current_user.role == 'DB':
-            distributors = Distributor.query.filter_by(id=current_user.distributor_id).all()
+            distributors = query.filter_by(id=current_user.distributor_id).all()
         elif current_user.role == 'BM':
-            distributors = Distributor.query.filter_by(bm_id=current_user.id).order_by(Distributor.name).all()
+            distributors = query.filter_by(bm_id=current_user.id).order_by(Distributor.name).all()
         elif current_user.role == 'RH':
-            distributors = Distributor.query.filter_by(rh_id=current_user.id).order_by(Distributor.name).all()
+            distributors = query.filter_by(rh_id=current_user.id).order_by(Distributor.name).all()
         else: # Admin
-            distributors = Distributor.query.order_by(Distributor.name).all()
+            distributors = query.order_by(Distributor.name).all()
         
         dist_list = [{
             'name': d.name,
@@ -733,9 +656,15 @@ def check_retailer_phone(phone):
 @core_bp.route('/uploads/<path:filename>')
 @login_required
 def uploaded_file(filename):
-    """Serve uploaded files"""
-    try:
-        safe_filename = secure_filename(filename)
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], safe_filename)
-    except FileNotFoundError:
-        return "File not found", 404
\ No newline at end of file
+    """Serve uploaded files (cacheable forever, optionally sent by the front proxy)"""
+    return send_upload(secure_filename(filename))
+
+@core_bp.route('/uploads/thumb/<path:filename>')
+@login_required
+def uploaded_thumbnail(filename):
+    """Serve the thumbnail of an uploaded photo (the original for photos saved before thumbnails existed)"""
+    safe_filename = secure_filename(filename)
+    thumb = thumbnail_filename(safe_filename)
+    if os.path.exists(upload_path(thumb)):
+        return send_upload(thumb)
+    return send_upload(safe_filename, immutable=False)
\ No newline at end of file
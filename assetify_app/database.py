@@ -0,0 +1,57 @@
+import os
+from sqlalchemy import event
+
+
+def database_uri(default):
+    """DATABASE_URL if set (postgres:// is accepted as an alias of postgresql://), else `default`."""
+    uri = os.environ.get('DATABASE_URL') or default
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """
+    Connection pool settings from the environment (DB_POOL_SIZE,
+    DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING).
+    Unset values keep SQLAlchemy's defaults. Server databases ping and
+    recycle connections by default so restarts and idle timeouts are survived.
+    """
+    is_sqlite = uri.startswith('sqlite')
+    options = {}
+    for key, env_name in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                          ('pool_timeout', 'DB_POOL_TIMEOUT'), ('pool_recycle', 'DB_POOL_RECYCLE')):
+        if os.environ.get(env_name):
+            options[key] = int(os.environ[env_name])
+    if not is_sqlite:
+        options.setdefault('pool_recycle', 1800)
+    pre_ping = os.environ.get('DB_POOL_PRE_PING', 'false' if is_sqlite else 'true')
+    options['pool_pre_ping'] = pre_ping.lower() in ['true', '1', 't']
+    return options
+
+
+def _apply_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if value is not None:
+                    cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_sqlite_pragmas(app, db):
+    """
+    Runs the SQLITE_PRAGMAS on every new SQLite connection. WAL lets
+    readers and one writer work at the same time (with the rollback
+    journal a reader blocks every commit), and busy_timeout makes a second
+    writer wait for the lock instead of failing with "database is locked".
+    Does nothing for other databases.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    event.listen(engine, 'connect', _apply_sqlite_pragmas(app.config['SQLITE_PRAGMAS']))
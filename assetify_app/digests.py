@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, User, Distributor, AssetRequest
+from .outbox import queue_email
+
+# Approval stage -> the Distributor column naming the approver for that stage
+APPROVAL_STAGES = (
+    ('Pending BM Approval', Distributor.bm_id),
+    ('Pending RH Approval', Distributor.rh_id),
+)
+
+
+def notify_approver(approver, subject, template, **kwargs):
+    """
+    Queues the immediate approval email for `approver`, unless they chose
+    digest mode: then the request is picked up by their next digest.
+    """
+    if approver.notification_mode == 'digest':
+        return None
+    return queue_email(approver.email, subject, template, **kwargs)
+
+
+def _pending_by_approver(approver_ids):
+    """Returns {approver id: [(stage, AssetRequest), ...]} for the requests waiting on them, oldest first."""
+    pending = {}
+    for stage, approver_column in APPROVAL_STAGES:
+        rows = db.session.query(AssetRequest, approver_column).join(
+            Distributor, AssetRequest.distributor_id == Distributor.id
+        ).options(
+            db.joinedload(AssetRequest.requester),
+            db.contains_eager(AssetRequest.distributor)
+        ).filter(
+            AssetRequest.status == stage,
+            approver_column.in_(approver_ids)
+        ).order_by(AssetRequest.request_date, AssetRequest.id)
+        for req, approver_id in rows:
+            pending.setdefault(approver_id, []).append((stage, req))
+    return pending
+
+
+def _changed_since(req, since):
+    changed = req.updated_at or req.request_date
+    return since is None or changed is None or changed > since
+
+
+def send_digests(now=None):
+    """
+    Queues one digest email per digest-mode approver whose interval
+    (MAIL_DIGEST_INTERVAL_MINUTES) has passed and who has at least one
+    request that reached them since their last digest. The digest lists
+    everything still waiting on them and is rendered once per approver.
+    Returns the number of digests queued.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=current_app.config['MAIL_DIGEST_INTERVAL_MINUTES'])
+    approvers = User.query.filter(
+        User.notification_mode == 'digest',
+        User.email.isnot(None),
+        db.or_(User.digest_sent_at.is_(None), User.digest_sent_at <= cutoff)
+    ).all()
+    if not approvers:
+        return 0
+
+    pending = _pending_by_approver([user.id for user in approvers])
+    queued = 0
+    for user in approvers:
+        items = pending.get(user.id)
+        if not items or not any(_changed_since(req, user.digest_sent_at) for _, req in items):
+            continue
+        entry = queue_email(
+            user.email,
+            f'{len(items)} Asset Request(s) Awaiting Your Approval',
+            'email/approval_digest.html',
+            items=[(stage, req, _changed_since(req, user.digest_sent_at)) for stage, req in items],
+            recipient_name=user.name
+        )
+        if entry is not None:
+            user.digest_sent_at = now
+            queued += 1
+    db.session.commit()
+    return queued
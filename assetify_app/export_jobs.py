@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from models import db, AssetRequest, Distributor, ExportJob, User
+from .exports import (
+    DMS_EXPORT_HEADERS, build_export_projection, dms_export_row_from_projection, iter_export_row_chunks
+)
+from .xlsx_stream import stream_xlsx
+
+FILTER_KEYS = ('start_date', 'end_date', 'requester', 'status', 'category')
+# Covered by the uq_export_job_active index: one such job per filter hash + fingerprint
+ACTIVE_STATUSES = ('queued', 'running', 'done')
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor(app):
+    """
+    Process-wide bounded pool that builds export files off the request
+    thread. Jobs live only in this process: a restart loses whatever was
+    queued or running, and fail_abandoned_export_jobs() closes those rows.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config['EXPORT_JOB_WORKERS'],
+                thread_name_prefix='export-job'
+            )
+    return _executor
+
+
+def export_scope(user):
+    """The part of the user that decides which rows an export contains."""
+    if user.role == 'Admin':
+        return 'Admin'
+    if user.role == 'DB':
+        return f'DB:{user.distributor_id}'
+    return f'{user.role}:{user.id}'
+
+
+def _normalized_filters(user, args):
+    filters = {key: (args.get(key) or '').strip() for key in FILTER_KEYS}
+    if user.role not in ['Admin', 'BM', 'RH', 'DB']:
+        filters['requester'] = ''  # ignored by the export query for SEs
+    return filters
+
+
+def _filter_hash(scope, filters):
+    key = json.dumps([scope] + [filters[k] for k in FILTER_KEYS])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _joined_columns_digest():
+    """
+    Hash of the distributor and user columns the export copies into each
+    row. Neither table has an updated_at, so the (small) org tables are
+    read in full; a renamed distributor or user changes the digest.
+    """
+    digest = hashlib.sha256()
+    for columns in (
+        (Distributor.id, Distributor.code, Distributor.name, Distributor.city),
+        (User.id, User.name, User.so),
+    ):
+        for row in db.session.query(*columns).order_by(columns[0]):
+            digest.update(json.dumps(list(row)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _data_fingerprint(query):
+    """
+    Cheap signature of the rows an export would contain: row count, newest
+    id and latest updated_at, plus the joined distributor / user columns.
+    Any new, deleted or modified request, or a renamed distributor or
+    user, alters it.
+    """
+    row = query.order_by(None).with_entities(
+        db.func.count(AssetRequest.id), db.func.max(AssetRequest.id), db.func.max(AssetRequest.updated_at)
+    ).one()
+    key = json.dumps([row[0], row[1], row[2].isoformat() if row[2] else None, _joined_columns_digest()])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _scope_user(params):
+    return SimpleNamespace(**params['user'])
+
+
+def fail_abandoned_export_jobs():
+    """
+    Marks queued/running jobs that made no progress for
+    EXPORT_JOB_STALE_MINUTES as failed, so their pollers stop waiting and
+    the export can be queued again. Their worker thread died with its
+    process (restart, deploy, crash); jobs are never resumed. Runs at app
+    startup and whenever a job is requested or polled while unfinished.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=current_app.config['EXPORT_JOB_STALE_MINUTES'])
+    abandoned = ExportJob.query.filter(
+        ExportJob.status.in_(('queued', 'running')), ExportJob.updated_at < cutoff
+    ).update({
+        ExportJob.status: 'failed',
+        ExportJob.error: 'The export stopped (the server was probably restarted). Please create it again.',
+        ExportJob.finished_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    if abandoned:
+        print(f"WARN: Marked {abandoned} abandoned export job(s) as failed.")
+    return abandoned
+
+
+def init_export_jobs(app):
+    """Startup sweep for jobs a previous process left queued or running (skipped before the tables exist)."""
+    with app.app_context():
+        try:
+            if db.inspect(db.engine).has_table(ExportJob.__tablename__):
+                fail_abandoned_export_jobs()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"WARN: Could not check for abandoned export jobs: {e}")
+        finally:
+            db.session.remove()
+
+
+def _remove_file(job):
+    if job.file_path and os.path.exists(job.file_path):
+        try:
+            os.remove(job.file_path)
+        except OSError as e:
+            print(f"WARN: Could not remove old export file {job.file_path}: {e}")
+
+
+def _active_job(filter_hash, fingerprint):
+    return ExportJob.query.filter(
+        ExportJob.filter_hash == filter_hash,
+        ExportJob.data_fingerprint == fingerprint,
+        ExportJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def _retire(job, error):
+    """Takes a finished job out of reuse (its file is gone or out of date)."""
+    _remove_file(job)
+    job.status = 'failed'
+    job.error = error
+
+
+def request_export_job(user, args):
+    """
+    Returns an ExportJob for the user's filters, reusing a finished (or
+    in-progress) job with the same filter hash when none of the matching
+    AssetRequest rows (nor the distributor / user columns they show)
+    changed since it was queued. The unique
+    uq_export_job_active index makes concurrent requests for the same
+    export share one job. Raises ValueError for malformed filter values.
+    """
+    filters = _normalized_filters(user, args)
+    query = build_export_projection(user, filters)
+    scope = export_scope(user)
+    filter_hash = _filter_hash(scope, filters)
+    fingerprint = _data_fingerprint(query)
+
+    fail_abandoned_export_jobs()
+    active = _active_job(filter_hash, fingerprint)
+    if active:
+        if active.status != 'done' or (active.file_path and os.path.exists(active.file_path)):
+            return active
+        _retire(active, 'The export file was removed. Please create it again.')
+
+    # Files of earlier snapshots of the same filters are out of date
+    outdated = ExportJob.query.filter(
+        ExportJob.filter_hash == filter_hash,
+        ExportJob.status == 'done',
+        ExportJob.data_fingerprint != fingerprint
+    )
+    for previous in outdated:
+        _retire(previous, 'Superseded by a newer export of the same filters.')
+
+    job = ExportJob(
+        filter_hash=filter_hash,
+        scope=scope,
+        params=json.dumps({
+            'user': {'id': user.id, 'role': user.role, 'distributor_id': user.distributor_id},
+            'filters': filters
+        }),
+        data_fingerprint=fingerprint,
+        status='queued',
+        requested_by_id=user.id
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same export first; share its job
+        db.session.rollback()
+        existing = _active_job(filter_hash, fingerprint)
+        if existing is None:
+            raise
+        return existing
+
+    app = current_app._get_current_object()
+    _get_executor(app).submit(run_export_job, app, job.id)
+    return job
+
+
+def run_export_job(app, job_id):
+    """Builds one export file to disk, recording progress after every chunk."""
+    with app.app_context():
+        # Claim the job; it may have been failed as abandoned while it waited in the pool
+        claimed = ExportJob.query.filter_by(id=job_id, status='queued').update(
+            {ExportJob.status: 'running'}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            db.session.remove()
+            return
+        job = db.session.get(ExportJob, job_id)
+        temp_path = None
+        try:
+            params = json.loads(job.params)
+            query = build_export_projection(_scope_user(params), params['filters'])
+            job.rows_total = query.order_by(None).count()
+            db.session.commit()
+
+            def rows():
+                for chunk in iter_export_row_chunks(query):
+                    for row in chunk:
+                        yield dms_export_row_from_projection(row)
+                    job.rows_done += len(chunk)
+                    db.session.commit()
+
+            os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
+            final_path = os.path.join(app.config['EXPORT_FOLDER'], f'export_job_{job.id}.xlsx')
+            temp_path = final_path + '.part'
+            with open(temp_path, 'wb') as f:
+                for chunk in stream_xlsx(DMS_EXPORT_HEADERS, rows(), sheet_title="DMS Export"):
+                    f.write(chunk)
+            os.replace(temp_path, final_path)
+
+            # Only if the job was not failed as abandoned (and possibly re-queued) meanwhile
+            finished = ExportJob.query.filter_by(id=job_id, status='running').update({
+                ExportJob.file_path: final_path,
+                ExportJob.status: 'done',
+                ExportJob.finished_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            if not finished:
+                print(f"WARN: Export job #{job_id} was closed while it ran; discarding its file.")
+                os.remove(final_path)
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR building export job #{job_id}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            job = db.session.get(ExportJob, job_id)
+            if job:
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def export_job_payload(job):
+    """JSON-friendly status of a job, as returned by the polling endpoint."""
+    progress = None
+    if job.rows_total:
+        progress = round(100.0 * job.rows_done / job.rows_total, 1)
+    elif job.status == 'done':
+        progress = 100.0
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'rows_total': job.rows_total,
+        'rows_done': job.rows_done,
+        'progress': progress,
+        'error': job.error
+    }
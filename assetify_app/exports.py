@@ -0,0 +1,292 @@
+from datetime import datetime, timedelta
+from models import db, User, Distributor, AssetRequest, CATEGORIES, STATUS_CODES
+
+EXPORT_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows are pulled from the database in chunks of this size while streaming
+EXPORT_CHUNK_SIZE = 500
+
+DMS_EXPORT_HEADERS = [
+    # --- Original DMS Headers ---
+    "Customer Category", "Customer Name", "Customer Code", "Customer Type",
+    "Customer Address", "Region", "Sales Office", "pincode",
+    "Territory/Cluster", "Contact No 1", "Contact No 2", "Contact No 3",
+    "Email Id 1", "Email Id 2", "Primary Contact Person", "Secondary Contact Person",
+    "Parent Customer Code", "GST No", "GST State Code", "PAN",
+    "Rate Code", "Discount Code", "Remarks", "FSSAI", "BEAT Name",
+
+    # --- NEW TRACKING HEADERS ---
+    "Request ID",
+    "Request Date",
+    "Request Status",
+    "SE (Requester)",
+    "Distributor Name",
+    "BM Approver",
+    "BM Approval Type",
+    "BM Security Amount",
+    "BM FOC Justification",
+    "RH Approver",
+    "Deployed By",
+    "Deployment Date"
+]
+
+
+def _apply_export_filters(query, user, args):
+    """Applies the start_date / end_date / requester / status / category request args."""
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
+    filter_requester_id = args.get('requester')
+    filter_status = args.get('status')
+    filter_category = args.get('category')
+
+    if start_date_str:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        query = query.filter(AssetRequest.request_date >= start_date)
+    if end_date_str:
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        end_date_inclusive = end_date + timedelta(days=1)
+        query = query.filter(AssetRequest.request_date < end_date_inclusive)
+    if filter_requester_id and user.role in ['Admin', 'BM', 'RH', 'DB']:
+        query = query.filter(AssetRequest.requester_id == int(filter_requester_id))
+    if filter_status in STATUS_CODES:
+        query = query.filter(AssetRequest.status_code == STATUS_CODES[filter_status])
+    elif filter_status:
+        query = query.filter(AssetRequest.status == filter_status)
+    if filter_category in CATEGORIES:
+        query = query.filter(AssetRequest.status_category == filter_category)
+    return query
+
+
+def build_export_query(user, args):
+    """
+    Returns the AssetRequest (ORM) query for a DMS export, scoped to the
+    user's role and narrowed by the start_date / end_date / requester /
+    status request args. Raises ValueError for malformed filter values.
+    Kept as the baseline for benchmarks/bench_export.py; the route uses
+    build_export_projection().
+    """
+    base_query = AssetRequest.query
+    if user.role == 'SE':
+        base_query = base_query.filter_by(requester_id=user.id)
+    elif user.role == 'DB':
+        base_query = base_query.filter_by(distributor_id=user.distributor_id)
+    elif user.role == 'BM':
+        base_query = base_query.join(Distributor).filter(
+            Distributor.bm_id == user.id
+        )
+    elif user.role == 'RH':
+        base_query = base_query.join(Distributor).filter(
+            Distributor.rh_id == user.id
+        )
+
+    query = base_query.options(
+        db.joinedload(AssetRequest.distributor),
+        db.joinedload(AssetRequest.requester)
+    ).order_by(AssetRequest.request_date.desc())
+    return _apply_export_filters(query, user, args)
+
+
+def build_export_projection(user, args):
+    """
+    Same rows as build_export_query(), but selects only the exported columns
+    as plain tuples. All user names come from aliased outer joins, so the
+    export is a single SELECT with no ORM hydration and no lazy loads.
+    Raises ValueError for malformed filter values.
+    """
+    Requester = db.aliased(User)
+    BMApprover = db.aliased(User)
+    RHApprover = db.aliased(User)
+    DeployedBy = db.aliased(User)
+
+    query = db.session.query(
+        AssetRequest.id,
+        AssetRequest.category,
+        AssetRequest.retailer_name,
+        AssetRequest.retailer_address,
+        AssetRequest.landmark,
+        AssetRequest.retailer_contact,
+        AssetRequest.retailer_email,
+        AssetRequest.request_date,
+        AssetRequest.status,
+        AssetRequest.bm_approval_type,
+        AssetRequest.bm_security_amount,
+        AssetRequest.bm_foc_justification,
+        AssetRequest.deployment_date,
+        AssetRequest.updated_at,
+        Distributor.city.label('distributor_city'),
+        Distributor.code.label('distributor_code'),
+        Distributor.name.label('distributor_name'),
+        Requester.so.label('requester_so'),
+        Requester.name.label('requester_name'),
+        BMApprover.name.label('bm_approver_name'),
+        RHApprover.name.label('rh_approver_name'),
+        DeployedBy.name.label('deployed_by_name')
+    ).outerjoin(
+        Distributor, AssetRequest.distributor_id == Distributor.id
+    ).outerjoin(
+        Requester, AssetRequest.requester_id == Requester.id
+    ).outerjoin(
+        BMApprover, AssetRequest.bm_approver_id == BMApprover.id
+    ).outerjoin(
+        RHApprover, AssetRequest.rh_approver_id == RHApprover.id
+    ).outerjoin(
+        DeployedBy, AssetRequest.deployed_by_id == DeployedBy.id
+    )
+
+    if user.role == 'SE':
+        query = query.filter(AssetRequest.requester_id == user.id)
+    elif user.role == 'DB':
+        query = query.filter(AssetRequest.distributor_id == user.distributor_id)
+    elif user.role == 'BM':
+        query = query.filter(Distributor.bm_id == user.id)
+    elif user.role == 'RH':
+        query = query.filter(Distributor.rh_id == user.id)
+
+    query = query.order_by(AssetRequest.request_date.desc())
+    return _apply_export_filters(query, user, args)
+
+
+def format_watermark(updated_at, request_id):
+    """Watermark for the changes feed: '<updated_at ISO>_<request id>'."""
+    return f"{updated_at.isoformat()}_{request_id}"
+
+
+def parse_watermark(value):
+    """Returns (updated_at, request_id) for a watermark string. Raises ValueError if malformed."""
+    timestamp, request_id = value.rsplit('_', 1)
+    return datetime.fromisoformat(timestamp), int(request_id)
+
+
+def build_changes_query(user, args, since=None, until=None):
+    """
+    Projection of the requests created or changed after the `since`
+    watermark and no later than `until`, oldest change first, so the last
+    row is the next watermark. Same role scope and filters as the export.
+    """
+    changed = db.tuple_(AssetRequest.updated_at, AssetRequest.id)
+    query = build_export_projection(user, args).order_by(None)
+    query = query.filter(AssetRequest.updated_at.isnot(None))
+    if since is not None:
+        query = query.filter(changed > since)
+    if until is not None:
+        query = query.filter(AssetRequest.updated_at <= until)
+    return query.order_by(AssetRequest.updated_at.asc(), AssetRequest.id.asc())
+
+
+def dms_export_row(req):
+    """Builds one DMS export row from an AssetRequest (ORM path)."""
+    full_address = f"{req.retailer_address or ''} {req.landmark or ''}".strip()
+    return [
+        # --- Original DMS Data ---
+        req.category,
+        req.retailer_name,
+        req.id,
+        "GT",
+        full_address,
+        req.distributor.city if req.distributor else "",
+        req.requester.so if req.requester else "",
+        "", "",
+        req.retailer_contact,
+        "", "",
+        req.retailer_email,
+        "",
+        req.retailer_name,
+        "",
+        req.distributor.code if req.distributor else "",
+        "", "", "",
+        "", "",
+        "", "", "",
+
+        # --- NEW TRACKING DATA ---
+        f"#{req.id}",
+        req.request_date.strftime('%Y-%m-%d') if req.request_date else "N/A",
+        req.status,
+        req.requester.name if req.requester else "N/A",
+        req.distributor.name if req.distributor else "N/A",
+        req.bm_approver.name if req.bm_approver else "N/A",
+        req.bm_approval_type if req.bm_approval_type else "N/A",
+        req.bm_security_amount if req.bm_security_amount else "N/A",
+        req.bm_foc_justification if req.bm_foc_justification else "N/A",
+        req.rh_approver.name if req.rh_approver else "N/A",
+        req.deployed_by.name if req.deployed_by else "N/A",
+        req.deployment_date.strftime('%Y-%m-%d') if req.deployment_date else "N/A"
+    ]
+
+
+def dms_export_row_from_projection(row):
+    """Builds one DMS export row from a build_export_projection() tuple."""
+    full_address = f"{row.retailer_address or ''} {row.landmark or ''}".strip()
+    return [
+        # --- Original DMS Data ---
+        row.category,
+        row.retailer_name,
+        row.id,
+        "GT",
+        full_address,
+        row.distributor_city or "",
+        row.requester_so or "",
+        "", "",
+        row.retailer_contact,
+        "", "",
+        row.retailer_email,
+        "",
+        row.retailer_name,
+        "",
+        row.distributor_code or "",
+        "", "", "",
+        "", "",
+        "", "", "",
+
+        # --- NEW TRACKING DATA ---
+        f"#{row.id}",
+        row.request_date.strftime('%Y-%m-%d') if row.request_date else "N/A",
+        row.status,
+        row.requester_name or "N/A",
+        row.distributor_name or "N/A",
+        row.bm_approver_name or "N/A",
+        row.bm_approval_type if row.bm_approval_type else "N/A",
+        row.bm_security_amount if row.bm_security_amount else "N/A",
+        row.bm_foc_justification if row.bm_foc_justification else "N/A",
+        row.rh_approver_name or "N/A",
+        row.deployed_by_name or "N/A",
+        row.deployment_date.strftime('%Y-%m-%d') if row.deployment_date else "N/A"
+    ]
+
+
+def iter_export_rows(query):
+    """Yields export rows from a build_export_projection() query in EXPORT_CHUNK_SIZE batches."""
+    for row in query.yield_per(EXPORT_CHUNK_SIZE):
+        yield dms_export_row_from_projection(row)
+
+
+def iter_export_row_chunks(query, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields lists of build_export_projection() rows, newest first. Each chunk
+    is its own bounded SELECT (keyset on request_date, id), so no cursor is
+    held open between chunks and the caller may commit in between.
+    """
+    query = query.order_by(None).order_by(AssetRequest.request_date.desc(), AssetRequest.id.desc())
+    last_key = None
+    while True:
+        chunk_query = query
+        if last_key is not None:
+            chunk_query = chunk_query.filter(
+                db.tuple_(AssetRequest.request_date, AssetRequest.id) < last_key
+            )
+        rows = chunk_query.limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_key = (rows[-1].request_date, rows[-1].id)
+
+
+def iter_export_rows_orm(query):
+    """Yields export rows from a build_export_query() query in EXPORT_CHUNK_SIZE batches."""
+    for req in query.yield_per(EXPORT_CHUNK_SIZE):
+        yield dms_export_row(req)
+
+
+def export_filename():
+    return f"hfl_dms_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -0,0 +1,236 @@
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+import openpyxl
+from flask import current_app
+from models import db, ImportJob
+from .org_sync import collect_org_mapping, iter_mapping_chunks, iter_sheet_rows, sync_org_mapping
+
+MAPPING_SHEET_NAME = 'DB wise - SE Mapping'
+REQUIRED_HEADERS = (
+    'Distributor Code', 'Distributor Name', 'Distributor Town',
+    'BM', 'BM Emp Code', 'BM Mail ID', 'RH', 'RH Emp Code', 'RH Mail ID',
+    'SO', 'SE Emp Code', 'SE Name'
+)
+ERROR_REPORT_HEADERS = ['Row', 'Code', 'Error']
+
+# Summary keys that make sense when the sync is applied chunk by chunk
+SUMMARY_KEYS = (
+    'users_added', 'users_updated', 'db_users_added', 'db_users_updated',
+    'distributors_added', 'distributors_updated', 'distributors_reassigned'
+)
+
+_CODE = re.compile(r'^[A-Za-z0-9_-]{1,50}$')
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor(app):
+    """Single worker, so two imports never change the org tables at the same time."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-job')
+    return _executor
+
+
+def validate_mapping_row(row):
+    """Returns a list of problems with one mapping row (empty if it can be imported)."""
+    problems = []
+    dist_code = row.get('Distributor Code', '')
+    if not dist_code or dist_code == 'None':
+        problems.append("Distributor Code is missing.")
+    elif not _CODE.match(dist_code):
+        problems.append(f"Distributor Code '{dist_code}' is not a valid code.")
+    if not row.get('Distributor Name'):
+        problems.append("Distributor Name is missing.")
+    for role in ('BM', 'RH'):
+        code = row.get(f'{role} Emp Code', '')
+        email = row.get(f'{role} Mail ID', '')
+        if not code:
+            problems.append(f"{role} Emp Code is missing.")
+            continue
+        if not _CODE.match(code):
+            problems.append(f"{role} Emp Code '{code}' is not a valid code.")
+        if not row.get(role):
+            problems.append(f"{role} name is missing.")
+        if email and not _EMAIL.match(email):
+            problems.append(f"{role} Mail ID '{email}' is not a valid email address.")
+    se_code = row.get('SE Emp Code', '')
+    if se_code not in ('', '0', 'None') and not _CODE.match(se_code):
+        problems.append(f"SE Emp Code '{se_code}' is not a valid code.")
+    return problems
+
+
+def request_import_job(user, file_storage):
+    """Saves the uploaded workbook and queues an ImportJob for it."""
+    job = ImportJob(
+        original_filename=file_storage.filename or 'mapping.xlsx',
+        status='queued',
+        requested_by_id=user.id
+    )
+    db.session.add(job)
+    db.session.flush()
+    folder = current_app.config['IMPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    job.file_path = os.path.join(folder, f'import_job_{job.id}.xlsx')
+    file_storage.save(job.file_path)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _get_executor(app).submit(run_import_job, app, job.id)
+    return job
+
+
+def _validated_rows(job, rows, row_errors, chunk_size):
+    """
+    Passes valid rows through and records the problems of the others.
+    Invalid rows are replaced by an empty row (which collect_org_mapping
+    ignores) so the row numbers it records stay aligned with the sheet.
+    """
+    for row_number, row in enumerate(rows, start=2):
+        if any(row.values()):
+            problems = validate_mapping_row(row)
+            if problems:
+                row_errors.append([row_number, row.get('Distributor Code', ''), ' '.join(problems)])
+                row = {}
+        yield row
+        job.rows_done = row_number - 1
+        if job.rows_done % chunk_size == 0:
+            db.session.commit()
+
+
+def _short_error(e):
+    """The driver's message for database errors, without the SQL and parameters (which hold password hashes)."""
+    return str(getattr(e, 'orig', None) or e)
+
+
+def _apply_chunk(chunk):
+    """Syncs one chunk in its own transaction. Returns its summary Counter."""
+    summary, _ = sync_org_mapping(chunk)
+    db.session.commit()
+    return summary
+
+
+def _apply_one_by_one(chunk, row_errors):
+    """
+    Fallback after a chunk failed: applies each user / distributor in its
+    own transaction so one bad row only rejects itself.
+    """
+    summary = Counter()
+    for position, entries in enumerate(chunk):
+        for code, data in entries.items():
+            single = [{}, {}, {}, {}]
+            single[position] = {code: data}
+            try:
+                summary.update(_apply_chunk(tuple(single)))
+            except Exception as e:
+                db.session.rollback()
+                row_errors.append([data.get('row'), code, f"Could not be saved: {_short_error(e)}"])
+    return summary
+
+
+def run_import_job(app, job_id):
+    """Validates the uploaded workbook, then applies it in chunked transactions."""
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        if not job or job.status != 'queued':
+            return
+        chunk_size = app.config['IMPORT_CHUNK_SIZE']
+        row_errors = []
+        try:
+            # --- Validate ---
+            try:
+                workbook = openpyxl.load_workbook(job.file_path, read_only=True, data_only=True)
+            except Exception as e:
+                raise ValueError(f"Could not open the file. Is it a valid .xlsx file? ({e})")
+            if MAPPING_SHEET_NAME not in workbook.sheetnames:
+                workbook.close()
+                raise ValueError(f"A sheet named '{MAPPING_SHEET_NAME}' was not found. Sheets: {workbook.sheetnames}")
+            sheet = workbook[MAPPING_SHEET_NAME]
+            headers = [str(value).strip() for value in next(sheet.iter_rows(max_row=1, values_only=True), ())]
+            missing = [header for header in REQUIRED_HEADERS if header not in headers]
+            if missing:
+                workbook.close()
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+            job.status = 'validating'
+            job.rows_total = sheet.max_row - 1 if sheet.max_row else None
+            db.session.commit()
+
+            def warn(row_number, message):
+                row_errors.append([row_number, '', message])
+
+            rows = _validated_rows(job, iter_sheet_rows(workbook, sheet), row_errors, chunk_size)
+            mapping = collect_org_mapping(rows, warn=warn)
+            job.rows_total = job.rows_done
+
+            # --- Apply ---
+            chunks = list(iter_mapping_chunks(mapping, chunk_size))
+            job.status = 'applying'
+            job.entities_total = sum(len(entries) for chunk in chunks for entries in chunk)
+            job.row_errors = json.dumps(row_errors)
+            db.session.commit()
+
+            summary = Counter()
+            for chunk in chunks:
+                try:
+                    summary.update(_apply_chunk(chunk))
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"WARN: Import job #{job_id} chunk failed ({_short_error(e)}); retrying row by row")
+                    summary.update(_apply_one_by_one(chunk, row_errors))
+                job.entities_done += sum(len(entries) for entries in chunk)
+                job.summary = json.dumps({key: summary[key] for key in SUMMARY_KEYS})
+                job.row_errors = json.dumps(row_errors)
+                db.session.commit()
+
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR running import job #{job_id}: {e}")
+            job = db.session.get(ImportJob, job_id)
+            if job:
+                job.status = 'failed'
+                job.error = _short_error(e)
+                job.row_errors = json.dumps(row_errors)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def import_job_errors(job):
+    return json.loads(job.row_errors) if job.row_errors else []
+
+
+def import_job_payload(job):
+    """JSON-friendly status of a job, as returned by the polling endpoint."""
+    progress = None
+    if job.status == 'done':
+        progress = 100.0
+    elif job.status == 'applying' and job.entities_total:
+        # Validation counts as the first half, applying as the second
+        progress = round(50.0 + 50.0 * job.entities_done / job.entities_total, 1)
+    elif job.status == 'validating' and job.rows_total:
+        progress = round(min(50.0, 50.0 * job.rows_done / job.rows_total), 1)
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'rows_total': job.rows_total,
+        'rows_done': job.rows_done,
+        'entities_total': job.entities_total,
+        'entities_done': job.entities_done,
+        'progress': progress,
+        'summary': json.loads(job.summary) if job.summary else None,
+        'error_count': len(import_job_errors(job)),
+        'error': job.error
+    }
@@ -0,0 +1,123 @@
+import queue
+import smtplib
+from threading import Thread
+from flask_mail import BadHeaderError
+
+# Put on the queue once per worker to stop the pool
+_STOP = object()
+
+# The message itself is bad: retrying on a new connection would fail the same way
+_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError,
+    BadHeaderError, AssertionError
+)
+
+
+class MailWorkerPool:
+    """
+    Fixed number of threads that send queued Flask-Mail messages. Each worker
+    keeps one SMTP session open and reuses it for every message it sends,
+    reconnecting after a connection error and closing it after `idle_timeout`
+    seconds without mail. The queue is bounded, so producers wait for a free
+    slot instead of growing it without limit.
+    """
+
+    def __init__(self, app, workers, queue_size, idle_timeout):
+        self.app = app
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = [
+            Thread(target=self._run, name=f'mail-worker-{i}', daemon=True) for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, msg, timeout=None, on_result=None):
+        """
+        Queues msg, waiting up to `timeout` seconds for room (forever if None).
+        on_result(error, retryable) is called from the worker once the message
+        is sent (error None) or has failed. Returns False if the queue stayed full.
+        """
+        try:
+            self.queue.put((msg, on_result), timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def join(self):
+        """Blocks until every queued message has been handled."""
+        self.queue.join()
+
+    def shutdown(self, timeout):
+        """Lets the workers finish the queued mail, then stops them (waits at most `timeout` seconds each)."""
+        for _ in self.threads:
+            try:
+                self.queue.put((_STOP, None), timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _run(self):
+        from assetify_app import mail
+        with self.app.app_context():
+            conn = None
+            while True:
+                try:
+                    msg, on_result = self.queue.get(timeout=self.idle_timeout if conn else None)
+                except queue.Empty:
+                    conn = _close(conn)
+                    continue
+                try:
+                    if msg is _STOP:
+                        _close(conn)
+                        return
+                    conn, error, retryable = _send(mail, conn, msg)
+                    if on_result:
+                        on_result(error, retryable)
+                except Exception as e:
+                    print(f"ERROR in mail worker: {e!r}")
+                finally:
+                    self.queue.task_done()
+
+
+def _send(mail, conn, msg):
+    """
+    Sends msg on conn (opening one if needed), retrying once on a fresh
+    connection. Returns (connection to keep, error or None, retryable);
+    never raises.
+    """
+    for attempt in (1, 2):
+        try:
+            if conn is None:
+                conn = mail.connect()
+                conn.__enter__()
+            conn.send(msg)
+            print(f"Email sent to {msg.recipients}")
+            return conn, None, False
+        except _MESSAGE_ERRORS as e:
+            print(f"ERROR sending email to {msg.recipients}: {e}")
+            return conn, e, False
+        except (smtplib.SMTPException, OSError) as e:
+            conn = _close(conn)
+            if attempt == 2:
+                print(f"ERROR sending email to {msg.recipients}: {e}")
+                return None, e, True
+        except Exception as e:
+            # Anything else (e.g. UnicodeEncodeError from a header) must not
+            # kill the worker: join() would wait forever for its queue items.
+            # The session may be mid-command, so it is dropped.
+            print(f"ERROR sending email to {msg.recipients}: {e!r}")
+            return _close(conn), e, False
+
+
+def _close(conn):
+    """Ends an SMTP session, ignoring errors from an already dead connection. Always returns None."""
+    if conn is not None and conn.host is not None:
+        try:
+            conn.host.quit()
+        except Exception:
+            conn.host.close()
+    return None
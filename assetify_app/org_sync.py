@@ -0,0 +1,314 @@
+"""
+Org hierarchy (SE / BM / RH / distributor) from the mapping workbook.
+
+collect_org_mapping() reduces the sheet rows to the unique users and
+distributors. database_setup.py bulk-inserts them into an empty database;
+sync_org_mapping() diffs them against the current rows by employee code
+and distributor code and applies only the inserts and updates.
+"""
+import os
+import re
+from collections import Counter
+from werkzeug.security import generate_password_hash
+from models import db, User, Distributor
+from .status_counters import reassign_distributor_counters
+
+# Werkzeug's default hash is deliberately slow, so passwords are hashed in parallel
+HASH_WORKERS = os.cpu_count() or 1
+
+
+def iter_sheet_rows(workbook, sheet):
+    """Yields each data row as {header: stripped string}, then closes the workbook."""
+    try:
+        values = sheet.iter_rows(values_only=True)
+        # Read headers from the first row
+        headers = [str(value).strip() for value in next(values, ())]
+        count = 0
+        for row in values:
+            yield {
+                header: str(value).strip() if value is not None else ''
+                for header, value in zip(headers, row)
+            }
+            count += 1
+        print(f"Successfully read {count} data rows from Excel.")
+    finally:
+        workbook.close()
+
+
+def _se_code(row):
+    """SE Emp Code, or a 'vacant_<name>' code for vacant (0 / blank) SE positions."""
+    se_code = row.get('SE Emp Code', '').strip()
+    if se_code == '0' or not se_code or se_code == 'None':
+        se_code = "vacant_" + re.sub(r'[^a-zA-Z0-9]', '_', row.get('SE Name', '').strip()).lower()
+    return se_code
+
+
+def _print_warning(row_number, message):
+    print(f"  [WARN] {message}")
+
+
+def collect_org_mapping(rows, warn=_print_warning):
+    """
+    Consumes the mapping rows in one pass and keeps only the unique SEs,
+    BMs, RHs and distributors (keyed by employee / distributor code, first
+    row wins). Distributors reference their SE / BM / RH by employee code.
+    Each entry records the sheet row it came from in 'row'; skipped
+    duplicates are reported through warn(row_number, message).
+    """
+    unique_ses = {}
+    unique_bms = {}
+    unique_rhs = {}
+    distributors = {}
+    unique_dist_names = set()
+
+    # Row 1 holds the headers
+    for row_number, row in enumerate(rows, start=2):
+        se_code = _se_code(row)
+        se_name = row.get('SE Name', '').strip()
+        if se_code != 'vacant_' and se_code not in unique_ses:
+            unique_ses[se_code] = {
+                'name': se_name,
+                'email': None, 
+                'role': 'SE',
+                'so': row.get('SO', '').strip(),
+                'password': se_code, # Rule: SE Pass = SE Emp Code
+                'row': row_number
+            }
+        
+        bm_code = row.get('BM Emp Code', '').strip()
+        if bm_code and bm_code not in unique_bms:
+            unique_bms[bm_code] = {
+                'code': bm_code, 
+                'password': bm_code, # Rule: BM Pass = BM Emp Code
+                'name': row.get('BM', '').strip(),
+                'email': row.get('BM Mail ID', '').strip().lower(),
+                'role': 'BM',
+                'row': row_number
+            }
+            
+        rh_code = row.get('RH Emp Code', '').strip()
+        if rh_code and rh_code not in unique_rhs:
+            unique_rhs[rh_code] = {
+                'code': rh_code, 
+                'password': rh_code, # Rule: RH Pass = RH Emp Code
+                'name': row.get('RH', '').strip(),
+                'email': row.get('RH Mail ID', '').strip().lower(),
+                'role': 'RH',
+                'row': row_number
+            }
+
+        dist_code = row.get('Distributor Code', '').strip()
+        dist_name = row.get('Distributor Name', 'N/A').strip()
+        if not dist_code or dist_code == 'None' or dist_code in distributors:
+            continue 
+        if dist_name in unique_dist_names:
+            warn(row_number, f"Distributor name '{dist_name}' (Code: {dist_code}) already exists. Skipping duplicate name.")
+            continue 
+        distributors[dist_code] = {
+            'code': dist_code,
+            'name': dist_name,
+            'city': row.get('Distributor Town', '').strip(),
+            'se_code': se_code,
+            'bm_code': bm_code,
+            'rh_code': rh_code,
+            'row': row_number
+        }
+        unique_dist_names.add(dist_name) 
+
+    return unique_ses, unique_bms, unique_rhs, distributors
+
+
+def user_row(employee_code, name, role, password, email=None, so=None, distributor_id=None):
+    """A `user` table row; 'password' is replaced by its hash in insert_users()."""
+    return {
+        'employee_code': employee_code,
+        'name': name,
+        'email': email,
+        'role': role,
+        'so': so,
+        'distributor_id': distributor_id,
+        'password': password
+    }
+
+
+def insert_users(user_rows, pool=None):
+    """
+    Hashes the passwords (on `pool`, a ProcessPoolExecutor, if given) and
+    inserts all rows with one executemany INSERT. Returns {employee_code: id}
+    for the inserted users.
+    """
+    if not user_rows:
+        return {}
+    passwords = [row.pop('password') for row in user_rows]
+    if pool is not None:
+        chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+        hashes = pool.map(generate_password_hash, passwords, chunksize=chunksize)
+    else:
+        hashes = map(generate_password_hash, passwords)
+    for row, password_hash in zip(user_rows, hashes):
+        row['password_hash'] = password_hash
+    db.session.execute(User.__table__.insert(), user_rows)
+    codes = [row['employee_code'] for row in user_rows]
+    return dict(db.session.query(User.employee_code, User.id).filter(User.employee_code.in_(codes)))
+
+
+def insert_distributors(dist_rows):
+    """Inserts all rows with one executemany INSERT. Returns {code: id} for the inserted distributors."""
+    if not dist_rows:
+        return {}
+    db.session.execute(Distributor.__table__.insert(), dist_rows)
+    codes = [row['code'] for row in dist_rows]
+    return dict(db.session.query(Distributor.code, Distributor.id).filter(Distributor.code.in_(codes)))
+
+
+def iter_mapping_chunks(mapping, chunk_size):
+    """
+    Splits a collect_org_mapping() result into smaller mappings that can be
+    synced (and committed) one after another: SEs, BMs and RHs first, then
+    distributors. A code listed under more than one role keeps only its
+    first role (SE, then BM, then RH), as it would in a single sync.
+    """
+    unique_ses, unique_bms, unique_rhs, distributors = mapping
+    bms = {code: data for code, data in unique_bms.items() if code not in unique_ses}
+    rhs = {code: data for code, data in unique_rhs.items() if code not in unique_ses and code not in bms}
+    for position, entries in enumerate((unique_ses, bms, rhs, distributors)):
+        items = list(entries.items())
+        for start in range(0, len(items), chunk_size):
+            chunk = [{}, {}, {}, {}]
+            chunk[position] = dict(items[start:start + chunk_size])
+            yield tuple(chunk)
+
+
+def _changed_fields(current, wanted):
+    return {key: value for key, value in wanted.items() if getattr(current, key) != value}
+
+
+def sync_org_mapping(mapping, pool=None):
+    """
+    Applies a collect_org_mapping() result to the existing users and
+    distributors without deleting anything: new codes are inserted (with
+    the usual code-as-password rule), changed names / emails / SOs / roles
+    and se_id / bm_id / rh_id reassignments are written as batched UPDATEs,
+    and the BM / RH status counters follow the reassigned distributors.
+    Existing passwords, Admin accounts and rows missing from the sheet are
+    left alone. Does not commit. Returns (summary Counter, change lines).
+    """
+    unique_ses, unique_bms, unique_rhs, distributors = mapping
+    summary = Counter()
+    changes = []
+
+    # --- Users: same precedence as the seed (SE, then BM, then RH) ---
+    wanted_users = {}
+    for code, data in unique_ses.items():
+        wanted_users[code] = {'name': data['name'], 'role': 'SE', 'so': data['so']}
+    for managers in (unique_bms, unique_rhs):
+        for code, data in managers.items():
+            if code in wanted_users:
+                continue
+            wanted_users[code] = {'name': data['name'], 'role': data['role']}
+            if data['email']:
+                wanted_users[code]['email'] = data['email']
+
+    existing_users = {
+        row.employee_code: row for row in db.session.query(
+            User.id, User.employee_code, User.name, User.email, User.role, User.so, User.distributor_id
+        )
+    }
+    new_users = []
+    user_updates = []
+    for code, wanted in wanted_users.items():
+        current = existing_users.get(code)
+        if current is None:
+            new_users.append(user_row(code, wanted['name'], wanted['role'], code,
+                                      email=wanted.get('email'), so=wanted.get('so')))
+            changes.append(f"+ user {code} ({wanted['role']}) {wanted['name']}")
+            continue
+        if current.role == 'Admin':
+            continue
+        changed = _changed_fields(current, wanted)
+        if changed:
+            user_updates.append({'id': current.id, **changed})
+            changes.append(f"~ user {code}: " + ", ".join(
+                f"{key} {getattr(current, key)!r} -> {value!r}" for key, value in changed.items()
+            ))
+    user_ids = {code: row.id for code, row in existing_users.items()}
+    user_ids.update(insert_users(new_users, pool))
+    if user_updates:
+        db.session.execute(db.update(User), user_updates)
+    summary['users_added'] = len(new_users)
+    summary['users_updated'] = len(user_updates)
+
+    # --- Distributors ---
+    existing_dists = {
+        row.code: row for row in db.session.query(
+            Distributor.id, Distributor.code, Distributor.name, Distributor.city,
+            Distributor.se_id, Distributor.bm_id, Distributor.rh_id
+        )
+    }
+    code_by_user_id = {user_id: code for code, user_id in user_ids.items()}
+    new_dists = []
+    dist_updates = []
+    reassigned = {}
+    for code, data in distributors.items():
+        wanted = {
+            'name': data['name'],
+            'city': data['city'],
+            'se_id': user_ids.get(data['se_code']),
+            'bm_id': user_ids.get(data['bm_code']),
+            'rh_id': user_ids.get(data['rh_code'])
+        }
+        current = existing_dists.get(code)
+        if current is None:
+            new_dists.append({'code': code, 'state': None, **wanted})
+            changes.append(f"+ distributor {code} {data['name']}")
+            continue
+        changed = _changed_fields(current, wanted)
+        if not changed:
+            continue
+        dist_updates.append({'id': current.id, **changed})
+        if 'bm_id' in changed or 'rh_id' in changed:
+            reassigned[current.id] = (current.bm_id, current.rh_id)
+        changes.append(f"~ distributor {code}: " + ", ".join(
+            f"{key} {code_by_user_id.get(getattr(current, key))!r} -> {code_by_user_id.get(value)!r}"
+            if key.endswith('_id') else f"{key} {getattr(current, key)!r} -> {value!r}"
+            for key, value in changed.items()
+        ))
+    dist_ids = {code: row.id for code, row in existing_dists.items()}
+    dist_ids.update(insert_distributors(new_dists))
+    if dist_updates:
+        db.session.execute(db.update(Distributor), dist_updates)
+    summary['distributors_added'] = len(new_dists)
+    summary['distributors_updated'] = len(dist_updates)
+    summary['distributors_reassigned'] = len(reassigned)
+
+    # --- Status counters follow the new BM / RH ---
+    if reassigned:
+        for dist in Distributor.query.filter(Distributor.id.in_(list(reassigned))):
+            old_bm_id, old_rh_id = reassigned[dist.id]
+            reassign_distributor_counters(dist, old_bm_id, old_rh_id)
+
+    # --- Distributor (DB) logins: code is login and password ---
+    new_db_users = []
+    db_user_updates = []
+    for code, data in distributors.items():
+        wanted = {'name': f"{data['name']} (DB)", 'distributor_id': dist_ids[code]}
+        current = existing_users.get(code)
+        if current is None and code not in wanted_users:
+            new_db_users.append(user_row(code, wanted['name'], 'DB', code, distributor_id=wanted['distributor_id']))
+            changes.append(f"+ user {code} (DB) {wanted['name']}")
+        elif current is not None and current.role == 'DB':
+            changed = _changed_fields(current, wanted)
+            if changed:
+                db_user_updates.append({'id': current.id, **changed})
+                changes.append(f"~ user {code}: " + ", ".join(
+                    f"{key} {getattr(current, key)!r} -> {value!r}" for key, value in changed.items()
+                ))
+    insert_users(new_db_users, pool)
+    if db_user_updates:
+        db.session.execute(db.update(User), db_user_updates)
+    summary['db_users_added'] = len(new_db_users)
+    summary['db_users_updated'] = len(db_user_updates)
+
+    summary['users_not_in_sheet'] = len(set(existing_users) - set(wanted_users) - set(distributors))
+    summary['distributors_not_in_sheet'] = len(set(existing_dists) - set(distributors))
+    return summary, changes
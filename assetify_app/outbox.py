@@ -0,0 +1,166 @@
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app, render_template
+from flask_mail import Message
+from models import db, EmailOutbox
+from .mailer import MailWorkerPool
+
+
+def mail_configured(config):
+    return bool(config['MAIL_USERNAME'] and config['MAIL_PASSWORD'])
+
+
+def queue_email(recipient_email, subject, template, **kwargs):
+    """
+    Renders a notification and adds it to the outbox in the current
+    transaction, so it is only sent if the caller commits its change.
+    No SMTP work happens here; `flask send-outbox` delivers it, and
+    leaves it pending while mail is not configured.
+    """
+    if not recipient_email:
+        print(f"WARN: No recipient email for subject: {subject}")
+        return None
+    try:
+        entry = EmailOutbox(
+            recipient=recipient_email,
+            subject=subject,
+            html=render_template(template, **kwargs)
+        )
+    except Exception as e:
+        print(f"ERROR preparing email: {e}")
+        return None
+    db.session.add(entry)
+    return entry
+
+
+def _retry_delay(attempts, config):
+    """Exponential backoff with a little jitter so failed batches do not retry in lockstep."""
+    delay = min(config['MAIL_OUTBOX_RETRY_SECONDS'] * 2 ** (attempts - 1), config['MAIL_OUTBOX_MAX_RETRY_SECONDS'])
+    return timedelta(seconds=delay + random.uniform(0, delay / 10))
+
+
+def claim_batch(batch_size):
+    """
+    Claims up to batch_size due messages for this sender and counts the
+    attempt. A claim expires after MAIL_OUTBOX_CLAIM_SECONDS, so a batch
+    left in 'sending' by a crashed sender is picked up again (delivery is
+    at-least-once).
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    due = (
+        EmailOutbox.status.in_(('pending', 'sending')),
+        EmailOutbox.next_attempt_at <= now
+    )
+    ids = [
+        row_id for (row_id,) in db.session.query(EmailOutbox.id).filter(*due)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(batch_size)
+    ]
+    if not ids:
+        return []
+    token = str(uuid.uuid4())
+    db.session.execute(
+        db.update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids), *due)
+        .values(
+            status='sending',
+            claim_token=token,
+            attempts=EmailOutbox.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=config['MAIL_OUTBOX_CLAIM_SECONDS'])
+        )
+    )
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claim_token=token).order_by(EmailOutbox.id).all()
+
+
+def _result_recorder(results, entry_id):
+    def on_result(error, retryable):
+        results[entry_id] = (error, retryable)
+    return on_result
+
+
+def release_batch(batch):
+    """Hands a claimed batch back as pending and due now, without counting the attempt."""
+    now = datetime.utcnow()
+    for entry in batch:
+        entry.status = 'pending'
+        entry.claim_token = None
+        entry.attempts -= 1
+        entry.next_attempt_at = now
+    db.session.commit()
+    return Counter(pending=len(batch))
+
+
+def send_batch(pool, batch):
+    """
+    Sends a claimed batch through the pool and records each outcome.
+    Returns a Counter of new statuses. Without mail credentials the batch
+    is released untouched.
+    """
+    config = current_app.config
+    if not mail_configured(config):
+        return release_batch(batch)
+    sender = config['MAIL_DEFAULT_SENDER'] or config['MAIL_USERNAME']
+    results = {}
+    for entry in batch:
+        msg = Message(entry.subject, sender=sender, recipients=[entry.recipient], html=entry.html)
+        pool.submit(msg, on_result=_result_recorder(results, entry.id))
+    pool.join()
+
+    now = datetime.utcnow()
+    outcome = Counter()
+    for entry in batch:
+        error, retryable = results.get(entry.id, (RuntimeError("no result from mail worker"), True))
+        entry.claim_token = None
+        if error is None:
+            entry.status = 'sent'
+            entry.sent_at = now
+            entry.last_error = None
+        elif retryable and entry.attempts < config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            entry.status = 'pending'
+            entry.next_attempt_at = now + _retry_delay(entry.attempts, config)
+            entry.last_error = str(error)
+        else:
+            entry.status = 'dead'
+            entry.last_error = str(error)
+            print(f"ERROR: Gave up on email #{entry.id} to {entry.recipient} after {entry.attempts} attempts: {error}")
+        outcome[entry.status] += 1
+    db.session.commit()
+    return outcome
+
+
+def drain_outbox(batch_size, loop=False, interval=10):
+    """
+    Sends due outbox messages in batches until none are left. With loop=True
+    it keeps polling every `interval` seconds (run it as a worker process).
+    Returns a Counter of the resulting statuses; nothing is claimed while
+    mail is not configured, so the messages stay pending.
+    """
+    app = current_app._get_current_object()
+    if not mail_configured(app.config):
+        print("WARN: Email credentials not configured; outbox messages stay pending.")
+        return Counter()
+    pool = MailWorkerPool(
+        app,
+        workers=app.config['MAIL_WORKERS'],
+        queue_size=max(app.config['MAIL_QUEUE_SIZE'], batch_size),
+        idle_timeout=app.config['MAIL_IDLE_TIMEOUT']
+    )
+    pool.start()
+    totals = Counter()
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if batch:
+                totals.update(send_batch(pool, batch))
+                continue
+            if not loop:
+                break
+            db.session.remove()
+            time.sleep(interval)
+    finally:
+        pool.shutdown(timeout=10)
+    return totals
@@ -0,0 +1,127 @@
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from models import db
+
+
+def cursor_mode_requested():
+    """True when the list should use keyset (cursor) pagination instead of OFFSET."""
+    paging = request.args.get('paging', '').strip().lower()
+    if paging:
+        return paging == 'cursor'
+    return bool(current_app.config.get('CURSOR_PAGINATION'))
+
+
+class KeysetPagination:
+    """
+    Page of results fetched with a (sort column, id) keyset instead of
+    LIMIT/OFFSET. It has no total count; templates check `is_keyset` and
+    use `next_query` / `prev_query` to build the Previous/Next links.
+    """
+    is_keyset = True
+
+    def __init__(self, items, sort_by, order_by, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort_by = sort_by
+        self.order_by = order_by
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _query_for(self, cursor):
+        return urlencode({
+            'sort_by': self.sort_by,
+            'order_by': self.order_by,
+            'cursor': cursor
+        })
+
+    @property
+    def next_query(self):
+        return self._query_for(self.next_cursor)
+
+    @property
+    def prev_query(self):
+        return self._query_for(self.prev_cursor)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def _make_cursor(direction, sort_by, order_by, value, row_id):
+    return _serializer().dumps([direction, sort_by, order_by, _encode_value(value), row_id])
+
+
+def _load_cursor(token, sort_by, order_by):
+    """Returns (direction, value, id) or None for a missing, tampered or stale token."""
+    if not token:
+        return None
+    try:
+        direction, token_sort, token_order, value, row_id = _serializer().loads(token)
+    except (BadSignature, ValueError, TypeError):
+        return None
+    # A cursor only makes sense for the ordering it was issued for.
+    if token_sort != sort_by or token_order != order_by or direction not in ('next', 'prev'):
+        return None
+    return direction, _decode_value(value), row_id
+
+
+def keyset_paginate(query, sort_expr, id_column, sort_by, order_by, per_page, cursor=None):
+    """
+    Fetches one page of `query` ordered by (sort_expr, id_column) using a
+    keyset condition, so page N costs the same as page 1 and no COUNT(*) is
+    issued. `sort_expr` must never be NULL (wrap nullable columns in
+    coalesce), otherwise the tuple comparison drops those rows.
+    """
+    position = _load_cursor(cursor, sort_by, order_by)
+    descending = order_by != 'asc'
+    backwards = position is not None and position[0] == 'prev'
+    # Walking backwards means reading the opposite direction and flipping the page.
+    read_desc = descending != backwards
+
+    query = query.order_by(None).add_columns(sort_expr.label('_keyset_value'))
+    if position is not None:
+        _, value, row_id = position
+        key = db.tuple_(sort_expr, id_column)
+        query = query.filter(key < (value, row_id) if read_desc else key > (value, row_id))
+    if read_desc:
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    next_cursor = prev_cursor = None
+    if rows:
+        first_item, first_value = rows[0][0], rows[0][-1]
+        last_item, last_value = rows[-1][0], rows[-1][-1]
+        if has_more or backwards:
+            next_cursor = _make_cursor('next', sort_by, order_by, last_value, last_item.id)
+        if (has_more and backwards) or (position is not None and not backwards):
+            prev_cursor = _make_cursor('prev', sort_by, order_by, first_value, first_item.id)
+    return KeysetPagination(items, sort_by, order_by, next_cursor, prev_cursor)
@@ -0,0 +1,559 @@
+"""
+Photo uploads.
+
+Photos are stored under their SHA-256 content address in a two-level shard
+layout (UPLOAD_FOLDER/ab/cd/abcd...ef.jpeg), so no directory grows past a
+few hundred entries and identical bytes (e.g. a retried submission) are
+kept once. StoredUpload counts how many request photo columns refer to each
+file; `flask gc-uploads` deletes the files whose count dropped to zero. The
+database keeps only the bare '<sha256>.<ext>' name; files saved before this
+layout keep their flat uuid4 names until `flask migrate-uploads` moves them.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import shutil
+import time
+import uuid
+from flask import abort, current_app, request
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import send_file
+from models import db, AssetRequest, StoredUpload
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: photos are stored as captured, without thumbnails
+    Image = None
+
+# Uploaded files are copied to disk in pieces of this size
+PHOTO_CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each accepted image format -> extension used on disk
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+)
+_SIGNATURE_LENGTH = max(len(signature) for signature, _ in _IMAGE_SIGNATURES)
+
+THUMBNAIL_SUFFIX = '_thumb'
+
+# '<sha256>.<ext>' or '<sha256>_thumb.<ext>'
+_CONTENT_ADDRESS = re.compile(r'^([0-9a-f]{64})(?:' + THUMBNAIL_SUFFIX + r')?\.[a-z]+$')
+
+PHOTO_COLUMNS = (
+    AssetRequest.photo_filename,
+    AssetRequest.deployment_photo1_filename,
+    AssetRequest.deployment_photo2_filename,
+)
+
+
+class PhotoDecodeError(Exception):
+    """The file has an image signature but could not be decoded."""
+
+
+def sniff_image_type(head):
+    """Returns the extension for the image whose first bytes are `head`, or None."""
+    for signature, ext in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def _allowed_type(head):
+    """Extension for `head` if it is a known image type the app accepts, else None."""
+    ext = sniff_image_type(head)
+    if ext and ext in current_app.config['ALLOWED_EXTENSIONS']:
+        return ext
+    return None
+
+
+# --- Storage layout ---
+
+def is_content_addressed(filename):
+    return bool(filename and _CONTENT_ADDRESS.match(filename))
+
+
+def upload_relpath(filename):
+    """Path of a stored file relative to UPLOAD_FOLDER ('ab/cd/<name>' or the legacy flat name)."""
+    match = _CONTENT_ADDRESS.match(filename)
+    if not match:
+        return filename
+    digest = match.group(1)
+    return f"{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def upload_path(filename):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], *upload_relpath(filename).split('/'))
+
+
+def thumbnail_filename(filename):
+    """'<stem>.jpeg' -> '<stem>_thumb.jpeg'"""
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}{THUMBNAIL_SUFFIX}.jpeg"
+
+
+def _temp_path(ext):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}.{ext}.part")
+
+
+def _write_if_absent(filename, data):
+    """Writes data under its content address unless an identical file is already there."""
+    path = upload_path(filename)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _move_if_absent(source_path, filename):
+    """Moves a file to its content address, dropping it if that content is already stored."""
+    path = upload_path(filename)
+    if os.path.exists(path):
+        os.remove(source_path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(source_path, path)
+
+
+def _copy_if_absent(source_path, filename):
+    """Copies a file to its content address unless that content is already stored."""
+    path = upload_path(filename)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, path)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(PHOTO_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _insert(model):
+    dialect = db.session.get_bind().dialect.name
+    return (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(model)
+
+
+def _add_reference(filename, size):
+    """Counts one more reference to a stored file, in the current transaction."""
+    stmt = _insert(StoredUpload).values(filename=filename, size=size, ref_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['filename'],
+        set_={'ref_count': StoredUpload.ref_count + 1}
+    )
+    db.session.execute(stmt)
+
+
+def _release_reference(connection, filename):
+    """Counts one reference less to a stored file; gc-uploads removes it once nothing is left."""
+    if is_content_addressed(filename):
+        connection.execute(
+            db.update(StoredUpload)
+            .where(StoredUpload.filename == filename, StoredUpload.ref_count > 0)
+            .values(ref_count=StoredUpload.ref_count - 1)
+        )
+
+
+# ORM deletes and photo replacements release their files in the same flush.
+# Bulk (Core) statements bypass these; follow them with rebuild_upload_references().
+@event.listens_for(AssetRequest, 'after_delete')
+def _release_deleted_request_photos(mapper, connection, target):
+    for column in PHOTO_COLUMNS:
+        filename = getattr(target, column.key)
+        if filename:
+            _release_reference(connection, filename)
+
+
+def _load_replaced_photo(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history loads the old filename when a photo column of an expired
+# request is assigned, so after_update finds it in the attribute history
+for _column in PHOTO_COLUMNS:
+    event.listen(_column, 'set', _load_replaced_photo, active_history=True)
+
+
+@event.listens_for(AssetRequest, 'after_update')
+def _release_replaced_photos(mapper, connection, target):
+    state = db.inspect(target)
+    for column in PHOTO_COLUMNS:
+        for filename in state.attrs[column.key].history.deleted:
+            if filename:
+                _release_reference(connection, filename)
+
+
+# --- Serving ---
+
+def send_upload(filename, immutable=True):
+    """
+    Response for one stored file. Uploads are never rewritten, so they get a
+    strong ETag (the content hash for content-addressed names), a year-long
+    private immutable Cache-Control and conditional GET. In the default
+    'flask' mode Range requests are answered here. With UPLOAD_SERVE_MODE
+    'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) Flask only
+    checks the login and the ETag, and the proxy sends the bytes (and ranges):
+
+        location /protected-uploads/ { internal; alias /path/to/uploads/; }
+
+    Pass immutable=False for responses whose URL may later point at another
+    file (the original served in place of a missing thumbnail).
+    """
+    path = upload_path(filename)
+    if not os.path.isfile(path):
+        abort(404)
+    config = current_app.config
+    mode = config['UPLOAD_SERVE_MODE']
+    offload = mode in ('x-accel-redirect', 'x-sendfile')
+
+    etag = True
+    if is_content_addressed(filename):
+        etag = os.path.splitext(filename)[0]
+
+    rv = send_file(
+        path,
+        request.environ,
+        etag=etag,
+        max_age=config['UPLOAD_CACHE_MAX_AGE'] if immutable else 0,
+        use_x_sendfile=offload,
+        response_class=current_app.response_class,
+        conditional=not offload
+    )
+    if offload:
+        # No body here: answer 304s, leave ranges to the proxy
+        rv = rv.make_conditional(request.environ)
+        if rv.status_code == 304:
+            rv.headers.pop('X-Sendfile', None)
+        elif mode == 'x-accel-redirect':
+            rv.headers.pop('X-Sendfile', None)
+            rv.headers['X-Accel-Redirect'] = config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + upload_relpath(filename)
+
+    # Photos are behind login: browsers may cache them, shared caches may not
+    rv.cache_control.public = None
+    rv.cache_control.private = True
+    if immutable:
+        rv.cache_control.immutable = True
+    else:
+        rv.cache_control.no_cache = True
+    return rv
+
+
+# --- Processing ---
+
+def _encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _encode_photo(path):
+    """
+    Applies the EXIF orientation, caps the longest side at PHOTO_MAX_DIMENSION
+    and re-encodes the photo as a metadata-free JPEG (no EXIF or GPS) at
+    PHOTO_JPEG_QUALITY. Returns (photo_bytes, thumbnail_bytes).
+    """
+    config = current_app.config
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            max_dimension = config['PHOTO_MAX_DIMENSION']
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            photo = _encode_jpeg(image, config['PHOTO_JPEG_QUALITY'])
+
+            thumb_size = config['PHOTO_THUMBNAIL_SIZE']
+            image.thumbnail((thumb_size, thumb_size), Image.LANCZOS)
+            thumb = _encode_jpeg(image, config['PHOTO_THUMBNAIL_QUALITY'])
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise PhotoDecodeError(str(e)) from e
+    return photo, thumb
+
+
+def _store(temp_path, ext, raw_digest):
+    """
+    Turns a freshly written temp file into a stored, referenced upload:
+    re-encoded with a thumbnail when Pillow is available, as captured
+    otherwise. Returns (filename, error).
+
+    The reference is counted before the file is written: a concurrent
+    gc-uploads either sees the reference and keeps the file, or has
+    already deleted the row and file, which are then created again here.
+    """
+    photo = None
+    try:
+        if Image is None:
+            filename = f"{raw_digest}.{ext}"
+            size = os.path.getsize(temp_path)
+        else:
+            photo, thumb = _encode_photo(temp_path)
+            os.remove(temp_path)
+            filename = f"{hashlib.sha256(photo).hexdigest()}.jpeg"
+            size = len(photo)
+    except PhotoDecodeError as e:
+        print(f"ERROR processing image: {e}")
+        os.remove(temp_path)
+        return None, "Photo could not be read as an image."
+    except OSError as e:
+        print(f"ERROR storing image: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None, "Error processing image file."
+
+    _add_reference(filename, size)
+    try:
+        if photo is None:
+            _move_if_absent(temp_path, filename)
+        else:
+            _write_if_absent(filename, photo)
+            _write_if_absent(thumbnail_filename(filename), thumb)
+    except OSError as e:
+        print(f"ERROR storing image: {e}")
+        _release_reference(db.session, filename)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None, "Error processing image file."
+    return filename, None
+
+
+# --- Saving ---
+
+def save_photo_upload(file_storage):
+    """
+    Streams a multipart file part to disk in PHOTO_CHUNK_SIZE pieces.
+    The type comes from the file's magic bytes; the client's filename and
+    Content-Type are ignored. Returns (filename, error).
+    """
+    stream = file_storage.stream
+    head = stream.read(_SIGNATURE_LENGTH)
+    if not head:
+        return None, "Photo file is empty."
+    ext = _allowed_type(head)
+    if not ext:
+        return None, "Photo is not a valid JPEG or PNG image."
+
+    temp_path = _temp_path(ext)
+    digest = hashlib.sha256(head)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(head)
+            for chunk in iter(lambda: stream.read(PHOTO_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+    except OSError as e:
+        print(f"ERROR saving uploaded image: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None, "Error processing image file."
+    return _store(temp_path, ext, digest.hexdigest())
+
+
+def save_photo_from_data_url(data_url):
+    """Saves a base64 data URL (older clients) as a file. Returns (filename, error)."""
+    if not data_url or not data_url.startswith('data:image'):
+        return None, "Invalid photo data."
+    try:
+        _, encoded = data_url.split(",", 1)
+        data = base64.b64decode(encoded)
+    except (ValueError, binascii.Error):
+        return None, "Invalid photo data."
+    ext = _allowed_type(data[:_SIGNATURE_LENGTH])
+    if not ext:
+        return None, "Photo is not a valid JPEG or PNG image."
+
+    temp_path = _temp_path(ext)
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+    except OSError as e:
+        print(f"ERROR processing image: {e}")
+        return None, "Error processing image file."
+    return _store(temp_path, ext, hashlib.sha256(data).hexdigest())
+
+
+def save_photo(value):
+    """
+    Saves a captured photo field, which holds either an uploaded file part
+    (canvas.toBlob clients) or a base64 data URL. Returns (filename, error).
+    The file's reference is counted in the current transaction, so commit
+    it together with the request that stores the filename.
+    """
+    if isinstance(value, FileStorage):
+        return save_photo_upload(value)
+    return save_photo_from_data_url(value)
+
+
+# --- Migration of flat uuid4 uploads ---
+
+def _copy_legacy_file(legacy_name):
+    """
+    Copies one flat upload (and its thumbnail) to its content address,
+    leaving the original in place. Returns the new name or None if the
+    file is missing.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    legacy_path = os.path.join(upload_folder, legacy_name)
+    if not os.path.isfile(legacy_path):
+        return None
+    ext = os.path.splitext(legacy_name)[1].lstrip('.').lower() or 'jpeg'
+    filename = f"{_file_digest(legacy_path)}.{ext}"
+    _copy_if_absent(legacy_path, filename)
+
+    legacy_thumb = os.path.join(upload_folder, thumbnail_filename(legacy_name))
+    if os.path.isfile(legacy_thumb):
+        _copy_if_absent(legacy_thumb, thumbnail_filename(filename))
+    return filename
+
+
+def _remove_legacy_file(legacy_name):
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    for name in (legacy_name, thumbnail_filename(legacy_name)):
+        path = os.path.join(upload_folder, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def migrate_legacy_uploads(batch_size=500):
+    """
+    Copies every photo still stored under a flat uuid4 name to the sharded
+    content-addressed layout, rewrites the request columns (committing
+    every `batch_size` rewritten filenames) and rebuilds the StoredUpload
+    reference counts. The flat files are deleted only after every column
+    stopped referring to them, so an interrupted run leaves each request
+    pointing at an existing file and can be re-run; flat files it left
+    behind are removed by `flask gc-uploads`. updated_at is left alone so
+    the changes feed does not re-export every request.
+    Returns (files_moved, missing_filenames).
+    """
+    renamed = {}
+    missing = []
+    pending = 0
+    for column in PHOTO_COLUMNS:
+        names = [name for (name,) in db.session.query(column).filter(column.isnot(None)).distinct()]
+        for legacy_name in names:
+            if is_content_addressed(legacy_name):
+                continue
+            if legacy_name not in renamed:
+                renamed[legacy_name] = _copy_legacy_file(legacy_name)
+            if renamed[legacy_name] is None:
+                missing.append(legacy_name)
+                continue
+            db.session.execute(
+                db.update(AssetRequest)
+                .where(column == legacy_name)
+                .values({column: renamed[legacy_name], AssetRequest.updated_at: AssetRequest.updated_at})
+            )
+            pending += 1
+            if pending >= batch_size:
+                db.session.commit()
+                pending = 0
+    db.session.commit()
+
+    for legacy_name, filename in renamed.items():
+        if filename:
+            _remove_legacy_file(legacy_name)
+    rebuild_upload_references()
+    return sum(1 for name in renamed.values() if name), missing
+
+
+def rebuild_upload_references():
+    """
+    Recomputes the StoredUpload counts from the photo columns of
+    asset_request. Rows of files nothing refers to any more are kept with
+    ref_count 0 for gc-uploads. Returns the number of referenced files.
+    """
+    counts = {}
+    for column in PHOTO_COLUMNS:
+        rows = db.session.query(column, db.func.count()).filter(column.isnot(None)).group_by(column)
+        for filename, count in rows:
+            if is_content_addressed(filename):
+                counts[filename] = counts.get(filename, 0) + count
+
+    for upload in db.session.query(StoredUpload):
+        upload.ref_count = counts.pop(upload.filename, 0)
+    for filename, count in counts.items():
+        path = upload_path(filename)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        db.session.add(StoredUpload(filename=filename, size=size, ref_count=count))
+    db.session.commit()
+    return db.session.query(StoredUpload).filter(StoredUpload.ref_count > 0).count()
+
+
+# --- Garbage collection ---
+
+def _adopt_orphan_files(grace_seconds):
+    """
+    Gives content-addressed files that have no StoredUpload row (left by
+    uploads whose request was never committed) a ref_count 0 row, so they
+    are collected like any other unreferenced file; deletes other stray
+    files (flat uploads no request refers to, stale .part files). Only
+    files older than the grace period are touched. Returns the number of
+    stray files deleted.
+    """
+    referenced = {name for (name,) in db.session.query(StoredUpload.filename)}
+    for column in PHOTO_COLUMNS:
+        referenced.update(name for (name,) in db.session.query(column).filter(column.isnot(None)).distinct())
+    keep = referenced | {thumbnail_filename(name) for name in referenced}
+
+    cutoff = time.time() - grace_seconds
+    deleted = 0
+    orphans = set()
+    for dirpath, _, files in os.walk(current_app.config['UPLOAD_FOLDER']):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if name in keep or name.startswith('.') or os.path.getmtime(path) > cutoff:
+                continue
+            if is_content_addressed(name):
+                # A thumbnail belongs to the '<sha256>.jpeg' photo it was made from
+                orphans.add(name.replace(THUMBNAIL_SUFFIX, '') if THUMBNAIL_SUFFIX in name else name)
+            else:
+                os.remove(path)
+                deleted += 1
+    for filename in orphans:
+        # Do nothing if an upload of the same content created the row meanwhile
+        path = upload_path(filename)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        db.session.execute(
+            _insert(StoredUpload).values(filename=filename, size=size, ref_count=0)
+            .on_conflict_do_nothing(index_elements=['filename'])
+        )
+    db.session.commit()
+    return deleted
+
+
+def collect_unreferenced_uploads(grace_minutes=60):
+    """
+    Deletes the files (and thumbnails) of StoredUpload rows whose ref_count
+    is 0, and their rows. Each row is deleted with a conditional DELETE and
+    its files removed before that commits, so an upload of the same
+    content racing with it either keeps the row alive or writes the file
+    again (see _store). Returns (files_collected, stray_files_deleted).
+    """
+    stray = _adopt_orphan_files(grace_minutes * 60)
+    collected = 0
+    unreferenced = db.session.query(StoredUpload.id, StoredUpload.filename).filter(StoredUpload.ref_count <= 0).all()
+    for upload_id, filename in unreferenced:
+        deleted = db.session.query(StoredUpload).filter(
+            StoredUpload.id == upload_id, StoredUpload.ref_count <= 0
+        ).delete(synchronize_session=False)
+        if deleted:
+            for name in (filename, thumbnail_filename(filename)):
+                path = upload_path(name)
+                if os.path.exists(path):
+                    os.remove(path)
+            collected += 1
+        db.session.commit()
+    return collected, stray
@@ -0,0 +1,34 @@
+from functools import wraps
+from flask import current_app
+from .sql_timing import request_query_count
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised (in strict mode) when a view issues more SQL statements than it declared."""
+
+
+def query_budget(max_queries):
+    """
+    Declares the most SQL statements a view may issue per request, including
+    the lazy loads triggered while its template renders. Place it directly
+    under the route decorator so the login check is counted too.
+
+    Statements are counted by the sql_timing engine listeners. In strict
+    mode (QUERY_BUDGET_STRICT, on by default when TESTING) an overrun
+    raises QueryBudgetExceeded so the test run fails (see
+    tests/test_query_budgets.py); otherwise it is logged as a warning.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            start = request_query_count()
+            response = fn(*args, **kwargs)
+            used = request_query_count() - start
+            if used > max_queries:
+                message = f"{fn.__name__} issued {used} SQL queries (budget {max_queries})"
+                if current_app.config.get('QUERY_BUDGET_STRICT', current_app.testing):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        return decorated_view
+    return wrapper
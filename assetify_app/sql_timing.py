@@ -0,0 +1,153 @@
+import json
+import logging
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+# Longest statement text kept for the log line / slow-query warning
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestSqlStats:
+    """SQL statements executed while handling one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+def _short_statement(statement):
+    statement = ' '.join(statement.split())
+    if len(statement) > MAX_STATEMENT_LENGTH:
+        return statement[:MAX_STATEMENT_LENGTH] + '...'
+    return statement
+
+
+def _explain(conn, statement, parameters):
+    """Returns the query plan of `statement` as text lines, using a raw cursor so it is not timed itself."""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [' | '.join(str(value) for value in row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('sql_timing_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('sql_timing_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if not has_app_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if not current_app.config['SQL_TIMING_ENABLED']:
+        return
+    threshold = current_app.config['SQL_SLOW_QUERY_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        where = request.endpoint if has_request_context() else 'background job'
+        message = f"Slow SQL ({elapsed * 1000:.1f} ms) in {where}: {_short_statement(statement)}"
+        if (current_app.config['SQL_EXPLAIN_SLOW_QUERIES'] and not executemany
+                and statement.lstrip().upper().startswith(('SELECT', 'WITH'))):
+            try:
+                message += '\n  plan: ' + '\n  plan: '.join(_explain(conn, statement, parameters))
+            except Exception as e:
+                message += f'\n  (EXPLAIN failed: {e})'
+        current_app.logger.warning(message)
+
+
+def _handle_error(exception_context):
+    """A failed statement never reaches after_cursor_execute; drop its start time."""
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('sql_timing_start'):
+        conn.info['sql_timing_start'].pop()
+
+
+def _start_request():
+    g.sql_stats = RequestSqlStats()
+
+
+def request_query_count():
+    """SQL statements executed so far in the current request (read by @query_budget)."""
+    stats = g.get('sql_stats')
+    return stats.count if stats is not None else 0
+
+
+def _finish_request(response):
+    """
+    Logs one JSON line per request at DEBUG (so it stays out of the INFO
+    file log) and, with SQL_TIMING_HEADER, adds the Server-Timing header.
+    Streamed bodies (Excel exports) keep querying after this runs, so the
+    log line is written when the response is closed and covers them too;
+    the header can only show what ran before the first byte.
+    """
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    if current_app.config['SQL_TIMING_HEADER']:
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.count} queries"',
+            f'db-slowest;dur={stats.slowest_seconds * 1000:.1f}',
+            f'app;dur={(time.perf_counter() - stats.started) * 1000:.1f}',
+        ])
+
+    logger = current_app.logger
+    if not logger.isEnabledFor(logging.DEBUG):
+        return response
+    line = {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+    }
+
+    def log_line():
+        line.update({
+            'queries': stats.count,
+            'db_ms': round(stats.db_seconds * 1000, 1),
+            'slowest_ms': round(stats.slowest_seconds * 1000, 1),
+            'slowest_sql': stats.slowest_statement and _short_statement(stats.slowest_statement),
+            'total_ms': round((time.perf_counter() - stats.started) * 1000, 1),
+        })
+        logger.debug('sql_timing ' + json.dumps(line))
+
+    response.call_on_close(log_line)
+    return response
+
+
+def init_sql_timing(app, db):
+    """
+    Times every SQL statement on the app's engine and keeps per-request
+    stats in `g.sql_stats` (the statement count also backs @query_budget,
+    so the listeners are always installed). With SQL_TIMING_ENABLED the
+    stats are logged as a `sql_timing {...}` DEBUG line (and sent as a
+    Server-Timing header with SQL_TIMING_HEADER), and statements slower
+    than SQL_SLOW_QUERY_MS are logged as warnings with their query plan.
+    """
+    with app.app_context():
+        engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    if app.config['SQL_TIMING_ENABLED']:
+        app.after_request(_finish_request)
@@ -0,0 +1,236 @@
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, Distributor, AssetRequest, RequestStatusCounter, STATUS_CATEGORIES
+
+# --- Counter scopes ---
+SCOPE_ALL = 'all'
+SCOPE_REQUESTER = 'requester'
+SCOPE_DISTRIBUTOR = 'distributor'
+SCOPE_BM = 'bm'
+SCOPE_RH = 'rh'
+# Written by rebuild_status_counters() only: the counters are complete
+SCOPE_REBUILT = 'rebuilt'
+
+
+def _stats_from_status_counts(counts):
+    """Build the dashboard stats dict from a {status: count} mapping."""
+    by_category = {}
+    for status, count in counts.items():
+        category = STATUS_CATEGORIES.get(status)
+        by_category[category] = by_category.get(category, 0) + count
+    return {
+        'total_requests': sum(counts.values()),
+        'pending_requests': by_category.get('pending', 0),
+        'approved_requests': by_category.get('approved', 0),
+        'deployed_requests': by_category.get('deployed', 0),
+        'rejected_requests': by_category.get('rejected', 0),
+        'pending_bm_count': counts.get('Pending BM Approval', 0),
+        'pending_rh_count': counts.get('Pending RH Approval', 0)
+    }
+
+
+def aggregate_status_stats(query):
+    """
+    Computes the dashboard stats for an AssetRequest query in a single pass
+    using conditional aggregation (one SELECT instead of one COUNT per card).
+    """
+    status = AssetRequest.status
+    category = AssetRequest.status_category
+
+    def count_where(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+    row = query.order_by(None).with_entities(
+        db.func.count(AssetRequest.id),
+        count_where(category == 'pending'),
+        count_where(category == 'approved'),
+        count_where(category == 'deployed'),
+        count_where(category == 'rejected'),
+        count_where(status == 'Pending BM Approval'),
+        count_where(status == 'Pending RH Approval')
+    ).one()
+    keys = ('total_requests', 'pending_requests', 'approved_requests', 'deployed_requests',
+            'rejected_requests', 'pending_bm_count', 'pending_rh_count')
+    return dict(zip(keys, (int(v or 0) for v in row)))
+
+
+def _scopes_for_user(user):
+    """Returns the (scope, scope_id) pairs whose counters make up a user's dashboard."""
+    if user.role in ('SE', 'DB'):
+        return [(SCOPE_REQUESTER, user.id)]
+    if user.role == 'BM':
+        return [(SCOPE_BM, user.id), (SCOPE_REQUESTER, user.id)]
+    if user.role == 'RH':
+        return [(SCOPE_RH, user.id), (SCOPE_REQUESTER, user.id)]
+    return [(SCOPE_ALL, 0)]
+
+
+def status_counters_ready():
+    """
+    True once rebuild_status_counters() has run on this database (it
+    writes a marker row). Until then the dashboard falls back to
+    aggregate_status_stats and status changes are not counted: counts
+    started on a database that already has requests would be partial.
+    Cached per app once true.
+    """
+    extensions = current_app.extensions
+    if not extensions.get('status_counters_ready'):
+        ready = db.session.query(
+            RequestStatusCounter.query.filter_by(scope=SCOPE_REBUILT).exists()
+        ).scalar()
+        if not ready and not extensions.get('status_counters_warned'):
+            print("WARN: Status counters have not been built; run `flask rebuild-status-counters`.")
+            extensions['status_counters_warned'] = True
+        extensions['status_counters_ready'] = ready
+    return extensions['status_counters_ready']
+
+
+def counter_stats_for_user(user):
+    """
+    Reads the dashboard stats for a user from the status counter table.
+    BM/RH scopes are summed with the user's own requester scope, which
+    matches the dashboard filter because BMs and RHs cannot raise requests.
+    """
+    scope_filters = [
+        db.and_(RequestStatusCounter.scope == scope, RequestStatusCounter.scope_id == scope_id)
+        for scope, scope_id in _scopes_for_user(user)
+    ]
+    rows = db.session.query(RequestStatusCounter.status, RequestStatusCounter.count).filter(
+        db.or_(*scope_filters)
+    ).all()
+    counts = {}
+    for status, count in rows:
+        counts[status] = counts.get(status, 0) + count
+    return _stats_from_status_counts(counts)
+
+
+def _scope_keys(requester_id, distributor_id, bm_id, rh_id):
+    keys = [(SCOPE_ALL, 0), (SCOPE_REQUESTER, requester_id), (SCOPE_DISTRIBUTOR, distributor_id)]
+    if bm_id:
+        keys.append((SCOPE_BM, bm_id))
+    if rh_id:
+        keys.append((SCOPE_RH, rh_id))
+    return keys
+
+
+def _add_to_counter(scope, scope_id, status, delta):
+    """Portable get-or-create for dialects without INSERT ... ON CONFLICT."""
+    counter = RequestStatusCounter.query.filter_by(scope=scope, scope_id=scope_id, status=status)
+    increment = {RequestStatusCounter.count: RequestStatusCounter.count + delta}
+    if counter.update(increment, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(RequestStatusCounter(scope=scope, scope_id=scope_id, status=status, count=delta))
+    except IntegrityError:
+        # Another transaction created the row since the UPDATE above
+        counter.update(increment, synchronize_session=False)
+
+
+def _upsert_counter(scope, scope_id, status, delta):
+    """Adds delta to one counter row, creating it if needed, in the current transaction."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        insert = postgresql.insert
+    elif dialect == 'sqlite':
+        insert = sqlite.insert
+    else:
+        _add_to_counter(scope, scope_id, status, delta)
+        return
+    stmt = insert(RequestStatusCounter).values(scope=scope, scope_id=scope_id, status=status, count=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['scope', 'scope_id', 'status'],
+        set_={'count': RequestStatusCounter.count + delta}
+    )
+    db.session.execute(stmt)
+
+
+def record_status_change(asset_request, old_status, new_status, distributor=None):
+    """
+    Moves an AssetRequest from old_status to new_status in every counter scope
+    it belongs to. Call it before db.session.commit() so the counters are
+    committed (or rolled back) together with the status change itself.
+    Pass old_status=None for a newly created request and new_status=None
+    for one that is being deleted. Does nothing until the counters have
+    been built (see status_counters_ready).
+    """
+    if old_status == new_status or not status_counters_ready():
+        return
+    distributor = distributor or asset_request.distributor
+    keys = _scope_keys(
+        asset_request.requester_id,
+        distributor.id,
+        distributor.bm_id,
+        distributor.rh_id
+    )
+    for scope, scope_id in keys:
+        if old_status:
+            _upsert_counter(scope, scope_id, old_status, -1)
+        if new_status:
+            _upsert_counter(scope, scope_id, new_status, 1)
+
+
+def reassign_distributor_counters(distributor, old_bm_id, old_rh_id):
+    """
+    Moves a distributor's request counts between BM/RH scopes after an admin
+    reassigns its bm_id / rh_id. Uses the distributor scope counters, so the
+    cost depends on the number of statuses, not on the number of requests.
+    """
+    if (old_bm_id == distributor.bm_id and old_rh_id == distributor.rh_id) or not status_counters_ready():
+        return
+    rows = db.session.query(RequestStatusCounter.status, RequestStatusCounter.count).filter_by(
+        scope=SCOPE_DISTRIBUTOR, scope_id=distributor.id
+    ).all()
+    for status, count in rows:
+        if not count:
+            continue
+        if old_bm_id != distributor.bm_id:
+            if old_bm_id:
+                _upsert_counter(SCOPE_BM, old_bm_id, status, -count)
+            if distributor.bm_id:
+                _upsert_counter(SCOPE_BM, distributor.bm_id, status, count)
+        if old_rh_id != distributor.rh_id:
+            if old_rh_id:
+                _upsert_counter(SCOPE_RH, old_rh_id, status, -count)
+            if distributor.rh_id:
+                _upsert_counter(SCOPE_RH, distributor.rh_id, status, count)
+
+
+def rebuild_status_counters():
+    """
+    Recomputes every counter row from asset_request and marks the
+    counters as complete. Run once after deploying the counter table (the
+    dashboard and the status changes ignore the counters until then), or
+    whenever they are suspected to have drifted (e.g. after manual SQL
+    edits).
+    """
+    RequestStatusCounter.query.delete()
+    status = AssetRequest.status
+    grouped = [
+        (SCOPE_ALL, db.session.query(db.literal(0), status, db.func.count()).group_by(status)),
+        (SCOPE_REQUESTER, db.session.query(AssetRequest.requester_id, status, db.func.count())
+            .group_by(AssetRequest.requester_id, status)),
+        (SCOPE_DISTRIBUTOR, db.session.query(AssetRequest.distributor_id, status, db.func.count())
+            .group_by(AssetRequest.distributor_id, status)),
+        (SCOPE_BM, db.session.query(Distributor.bm_id, status, db.func.count())
+            .join(Distributor, AssetRequest.distributor_id == Distributor.id)
+            .filter(Distributor.bm_id.isnot(None))
+            .group_by(Distributor.bm_id, status)),
+        (SCOPE_RH, db.session.query(Distributor.rh_id, status, db.func.count())
+            .join(Distributor, AssetRequest.distributor_id == Distributor.id)
+            .filter(Distributor.rh_id.isnot(None))
+            .group_by(Distributor.rh_id, status)),
+    ]
+    total_rows = 0
+    for scope, query in grouped:
+        rows = [
+            {'scope': scope, 'scope_id': scope_id, 'status': status_value, 'count': count}
+            for scope_id, status_value, count in query.all()
+        ]
+        if rows:
+            db.session.execute(db.insert(RequestStatusCounter), rows)
+            total_rows += len(rows)
+    db.session.add(RequestStatusCounter(scope=SCOPE_REBUILT, scope_id=0, status='', count=0))
+    db.session.commit()
+    return total_rows
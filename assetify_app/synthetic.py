@@ -0,0 +1,323 @@
+"""
+Synthetic org tree and asset requests for load tests, benchmarks and
+query-plan checks (`flask generate-data`).
+
+Everything is drawn from one random.Random(seed), so the same options on an
+empty database always produce the same rows. All codes start with 'SYN' so
+the data can be told apart from (and removed without touching) real rows.
+"""
+import base64
+import io
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from models import db, User, Distributor, AssetRequest
+from .photos import rebuild_upload_references, save_photo_from_data_url
+from .status_counters import rebuild_status_counters
+
+CODE_PREFIX = 'SYN'
+
+# City centres the regions are spread over (lat, long)
+CITY_CENTRES = [
+    ('Hyderabad', 17.385, 78.487), ('Vijayawada', 16.506, 80.648), ('Visakhapatnam', 17.687, 83.218),
+    ('Bengaluru', 12.972, 77.595), ('Chennai', 13.083, 80.271), ('Pune', 18.520, 73.857),
+    ('Mumbai', 19.076, 72.878), ('Nagpur', 21.146, 79.088), ('Warangal', 17.969, 79.594),
+    ('Tirupati', 13.629, 79.419), ('Kurnool', 15.828, 78.037), ('Coimbatore', 11.017, 76.956),
+]
+
+# (status, weight, typical age in days of a request in that status)
+STATUS_MIX = [
+    ('Deployed', 38, 120),
+    ('Approved', 12, 40),
+    ('Pending BM Approval', 14, 6),
+    ('Pending RH Approval', 9, 10),
+    ('Rejected by BM', 14, 90),
+    ('Rejected by RH', 9, 90),
+    ('Rejected by Admin', 4, 90),
+]
+
+ASSET_MODELS = [('300 GT', 30), ('400 GT', 25), ('500 HT', 15), ('500 GT', 20), ('Glycol (PC)', 10)]
+CATEGORIES = [
+    ('Kirana Store', 30), ('General Store', 18), ('Bakery', 12), ('Sweet Shop', 8),
+    ('Hotel, Restaurant & Coffee Shop', 8), ('Convience Store', 6), ('Stationary Shop', 4),
+    ('School/Collage Canteen', 3), ('Office Canteen', 3), ('MRF', 2), ('Ecom/Qcom', 2),
+    ('PC', 1), ('HDC', 1), ('Others', 2),
+]
+BRANDS = ['Amul', 'Kwality Walls', 'Arun', 'Vadilal', 'Havmor', 'Cream Bell', 'Dairy Day']
+SHOP_WORDS = ['Sri', 'Lakshmi', 'Balaji', 'Sai', 'Venkateswara', 'Ganesh', 'Durga', 'Krishna', 'Ravi', 'Anjali']
+SHOP_KINDS = ['Stores', 'Traders', 'General Stores', 'Bakery', 'Kirana', 'Enterprises', 'Sweets', 'Mart']
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _placeholder_photos(rng, count):
+    """Stores `count` small solid-colour JPEGs through the normal photo path. Returns their filenames."""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("WARN: Pillow is not installed; synthetic requests get no photos.")
+        return []
+    filenames = []
+    for _ in range(count):
+        colour = (rng.randint(40, 220), rng.randint(40, 220), rng.randint(40, 220))
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), colour).save(buffer, 'JPEG', quality=70)
+        filename, error = save_photo_from_data_url(
+            'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        )
+        if error:
+            print(f"WARN: Could not store placeholder photo: {error}")
+            continue
+        filenames.append(filename)
+    db.session.commit()
+    return filenames
+
+
+def synthetic_data_exists():
+    return db.session.query(
+        User.query.filter(User.employee_code.like(f'{CODE_PREFIX}%')).exists()
+    ).scalar()
+
+
+def delete_synthetic_data():
+    """
+    Removes every SYN* user and distributor and the requests that belong
+    to them, then rebuilds the status counters (a bulk delete bypasses
+    record_status_change).
+    """
+    dist_ids = db.session.query(Distributor.id).filter(Distributor.code.like(f'{CODE_PREFIX}%'))
+    user_ids = db.session.query(User.id).filter(User.employee_code.like(f'{CODE_PREFIX}%'))
+    deleted = db.session.query(AssetRequest).filter(
+        db.or_(AssetRequest.distributor_id.in_(dist_ids), AssetRequest.requester_id.in_(user_ids))
+    ).delete(synchronize_session=False)
+    db.session.query(User).filter(User.employee_code.like(f'{CODE_PREFIX}%')).update(
+        {User.distributor_id: None}, synchronize_session=False
+    )
+    db.session.query(Distributor).filter(Distributor.code.like(f'{CODE_PREFIX}%')).delete(synchronize_session=False)
+    db.session.query(User).filter(User.employee_code.like(f'{CODE_PREFIX}%')).delete(synchronize_session=False)
+    db.session.commit()
+    rebuild_status_counters()
+    rebuild_upload_references()
+    return deleted
+
+
+def _rh_code(r):
+    return f'{CODE_PREFIX}RH{r:03d}'
+
+
+def _bm_code(r, b):
+    return f'{CODE_PREFIX}BM{r:03d}{b:03d}'
+
+
+def _se_code(r, b, d, distributors_per_se):
+    return f'{CODE_PREFIX}SE{r:03d}{b:03d}{(d - 1) // distributors_per_se + 1:03d}'
+
+
+def _distributor_code(r, b, d):
+    return f'{CODE_PREFIX}D{r:03d}{b:03d}{d:03d}'
+
+
+def synthetic_account_codes(regions, bms_per_region, distributors_per_bm, distributors_per_se):
+    """The employee codes generate_org_tree creates for these options, as {role: [codes]}."""
+    codes = {'RH': [], 'BM': [], 'SE': [], 'DB': []}
+    for r in range(1, regions + 1):
+        codes['RH'].append(_rh_code(r))
+        for b in range(1, bms_per_region + 1):
+            codes['BM'].append(_bm_code(r, b))
+            for d in range(1, distributors_per_bm + 1):
+                if (d - 1) % distributors_per_se == 0:
+                    codes['SE'].append(_se_code(r, b, d, distributors_per_se))
+                codes['DB'].append(_distributor_code(r, b, d))
+    return codes
+
+
+def generate_org_tree(rng, regions, bms_per_region, distributors_per_bm, distributors_per_se, password):
+    """
+    Inserts RHs -> BMs -> distributors, one SE per `distributors_per_se`
+    distributors of a BM and one DB login per distributor. Every account
+    gets the same password, hashed once. Returns the distributor rows
+    (dicts with id, se_id, bm_id, rh_id, db_user_id, centre).
+    """
+    password_hash = generate_password_hash(password)
+    cities = CITY_CENTRES[:]
+    rng.shuffle(cities)
+
+    def account(code, name, role, email=None, so=None, distributor_id=None):
+        return {'employee_code': code, 'name': name, 'role': role, 'email': email, 'so': so,
+                'distributor_id': distributor_id, 'password_hash': password_hash}
+
+    managers = []
+    for r in range(1, regions + 1):
+        rh_code = _rh_code(r)
+        managers.append(account(rh_code, f'Synthetic RH {r}', 'RH', email=f'{rh_code.lower()}@example.com'))
+        for b in range(1, bms_per_region + 1):
+            bm_code = _bm_code(r, b)
+            managers.append(account(bm_code, f'Synthetic BM {r}-{b}', 'BM', email=f'{bm_code.lower()}@example.com'))
+    db.session.execute(User.__table__.insert(), managers)
+    ids = dict(db.session.query(User.employee_code, User.id).filter(User.employee_code.like(f'{CODE_PREFIX}%')))
+
+    ses = []
+    dists = []
+    for r in range(1, regions + 1):
+        city, lat, lng = cities[(r - 1) % len(cities)]
+        rh_id = ids[_rh_code(r)]
+        for b in range(1, bms_per_region + 1):
+            bm_id = ids[_bm_code(r, b)]
+            # Each BM covers one part of the region's city
+            bm_lat, bm_lng = rng.gauss(lat, 0.08), rng.gauss(lng, 0.08)
+            for d in range(1, distributors_per_bm + 1):
+                se_code = _se_code(r, b, d, distributors_per_se)
+                if (d - 1) % distributors_per_se == 0:
+                    ses.append(account(se_code, f'Synthetic SE {r}-{b}-{(d - 1) // distributors_per_se + 1}', 'SE',
+                                       so=f'{CODE_PREFIX}-SO-{r:03d}{b:03d}'))
+                dists.append({
+                    'code': _distributor_code(r, b, d),
+                    'name': f'Synthetic Distributor {r}-{b}-{d}',
+                    'city': city,
+                    'state': None,
+                    'se_code': se_code,
+                    'bm_id': bm_id,
+                    'rh_id': rh_id,
+                    'centre': (rng.gauss(bm_lat, 0.03), rng.gauss(bm_lng, 0.03)),
+                })
+    db.session.execute(User.__table__.insert(), ses)
+    ids.update(db.session.query(User.employee_code, User.id).filter(User.employee_code.like(f'{CODE_PREFIX}SE%')))
+
+    for dist in dists:
+        dist['se_id'] = ids[dist['se_code']]
+    db.session.execute(Distributor.__table__.insert(), [
+        {key: dist[key] for key in ('code', 'name', 'city', 'state', 'se_id', 'bm_id', 'rh_id')} for dist in dists
+    ])
+    dist_ids = dict(db.session.query(Distributor.code, Distributor.id).filter(Distributor.code.like(f'{CODE_PREFIX}%')))
+    for dist in dists:
+        dist['id'] = dist_ids[dist['code']]
+
+    db.session.execute(User.__table__.insert(), [
+        account(dist['code'], f"{dist['name']} (DB)", 'DB', distributor_id=dist['id']) for dist in dists
+    ])
+    db_ids = dict(db.session.query(User.employee_code, User.id).filter(User.role == 'DB', User.employee_code.like(f'{CODE_PREFIX}D%')))
+    for dist in dists:
+        dist['db_user_id'] = db_ids[dist['code']]
+    db.session.commit()
+    return dists
+
+
+def _request_row(rng, number, dist, now, days, photos):
+    status = _weighted(rng, [(status, weight) for status, weight, _ in STATUS_MIX])
+    typical_age = next(age for s, _, age in STATUS_MIX if s == status)
+    # Older statuses sit further back; nothing is older than `days`
+    age_days = min(rng.expovariate(1.0 / typical_age), days - 1)
+    request_date = now - timedelta(days=age_days, hours=rng.uniform(0, 9), minutes=rng.uniform(0, 60))
+    # Requests are raised in shop hours (09:00-19:00)
+    request_date = request_date.replace(hour=9 + int(rng.uniform(0, 10)))
+
+    selling = rng.random() < 0.6
+    decided = request_date + timedelta(hours=rng.uniform(4, 72))
+    row = {
+        'requester_id': dist['se_id'] if rng.random() < 0.85 else dist['db_user_id'],
+        'distributor_id': dist['id'],
+        'request_date': request_date,
+        'status': status,
+        'asset_model': _weighted(rng, ASSET_MODELS),
+        'category': _weighted(rng, CATEGORIES),
+        'placement_date': (request_date + timedelta(days=rng.randint(3, 30))).date(),
+        'latitude': round(rng.gauss(dist['centre'][0], 0.01), 6),
+        'longitude': round(rng.gauss(dist['centre'][1], 0.01), 6),
+        'retailer_name': f"{rng.choice(SHOP_WORDS)} {rng.choice(SHOP_KINDS)} {number}",
+        'retailer_contact': f'6{number:09d}',
+        'area_town': dist['city'],
+        'landmark': None,
+        'retailer_address': f"Shop {rng.randint(1, 400)}, {dist['city']}",
+        'retailer_email': None,
+        'selling_ice_cream': 'yes' if selling else 'no',
+        'monthly_sales': rng.randrange(5000, 150000, 500) if selling else None,
+        'ice_cream_brands': ', '.join(rng.sample(BRANDS, rng.randint(1, 3))) if selling else None,
+        'competitor_assets': rng.choice(['Yes', 'No']) if selling else None,
+        'signage_availability': rng.choice(['Yes', 'No']) if selling else None,
+        'willing_for_signage': rng.choice(['Yes', 'Yes', 'No']),
+        'photo_filename': rng.choice(photos) if photos else None,
+        'bm_approver_id': None, 'rh_approver_id': None,
+        'bm_remarks': None, 'rh_remarks': None,
+        'bm_approval_type': None, 'bm_security_amount': None, 'bm_foc_justification': None,
+        'deployed_make': None, 'deployed_serial_no': None,
+        'deployment_photo1_filename': None, 'deployment_photo2_filename': None,
+        'deployment_date': None, 'deployed_by_id': None,
+        'updated_at': request_date,
+    }
+    if status in ('Pending RH Approval', 'Approved', 'Deployed', 'Rejected by RH'):
+        row['bm_approver_id'] = dist['bm_id']
+        if rng.random() < 0.7:
+            row['bm_approval_type'] = 'Free of Cost'
+            row['bm_foc_justification'] = 'High footfall outlet'
+        else:
+            row['bm_approval_type'] = 'With Security'
+            row['bm_security_amount'] = rng.randrange(2000, 20001, 1000)
+        row['updated_at'] = decided
+    if status in ('Approved', 'Deployed', 'Rejected by RH'):
+        row['rh_approver_id'] = dist['rh_id']
+        decided += timedelta(hours=rng.uniform(4, 72))
+        row['updated_at'] = decided
+    if status == 'Rejected by BM':
+        row['bm_approver_id'] = dist['bm_id']
+        row['bm_remarks'] = 'Outlet too close to an existing asset'
+        row['updated_at'] = decided
+    if status == 'Rejected by RH':
+        row['rh_remarks'] = 'Budget exhausted for this quarter'
+    if status == 'Rejected by Admin':
+        row['updated_at'] = decided
+    if status == 'Deployed':
+        deployed = decided + timedelta(days=rng.uniform(1, 15))
+        row.update({
+            'deployed_make': rng.choice(['Western', 'Rockwell', 'Elanpro']),
+            'deployed_serial_no': f'{CODE_PREFIX}-SN-{number:09d}',
+            'deployment_photo1_filename': rng.choice(photos) if photos else None,
+            'deployment_photo2_filename': rng.choice(photos) if photos else None,
+            'deployment_date': deployed,
+            'deployed_by_id': row['requester_id'],
+            'updated_at': deployed,
+        })
+    # Requests are never dated in the future
+    row['updated_at'] = min(row['updated_at'], now)
+    if row['deployment_date']:
+        row['deployment_date'] = min(row['deployment_date'], now)
+    return row
+
+
+def generate_requests(rng, dists, count, days, batch_size, photos, now, progress=None):
+    """
+    Bulk-inserts `count` requests in batches of `batch_size`, committing
+    after each batch. Busy distributors get many more requests than quiet
+    ones (log-normal weights), as in production.
+    """
+    weights = [rng.lognormvariate(0, 0.9) for _ in dists]
+    done = 0
+    while done < count:
+        size = min(batch_size, count - done)
+        picks = rng.choices(dists, weights=weights, k=size)
+        rows = [_request_row(rng, done + i + 1, dist, now, days, photos) for i, dist in enumerate(picks)]
+        db.session.execute(AssetRequest.__table__.insert(), rows)
+        db.session.commit()
+        done += size
+        if progress:
+            progress(done)
+    return done
+
+
+def generate_synthetic_data(seed, regions, bms_per_region, distributors_per_bm, distributors_per_se,
+                            requests, days, batch_size, password, end_date, photos=8, progress=None):
+    """
+    Generates the org tree and requests dated up to `end_date`, then
+    rebuilds the derived counter tables. Returns (distributors, requests).
+    """
+    rng = random.Random(seed)
+    now = datetime.combine(end_date, datetime.min.time())
+    dists = generate_org_tree(rng, regions, bms_per_region, distributors_per_bm, distributors_per_se, password)
+    photo_names = _placeholder_photos(rng, photos)
+    created = generate_requests(rng, dists, requests, days, batch_size, photo_names, now, progress=progress)
+    rebuild_status_counters()
+    if photo_names:
+        rebuild_upload_references()
+    return len(dists), created
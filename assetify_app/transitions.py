@@ -0,0 +1,177 @@
+"""
+Asset request status transitions (BM -> RH -> Approved -> Deployed and the
+rejections), each applied as one conditional UPDATE:
+
+    UPDATE asset_request SET status = :to, ... WHERE id = :id AND status = :from
+    RETURNING <the columns notifications and the status counters need>
+
+Two users acting on the same request cannot both win: the second UPDATE
+matches no row and gets None back (a lost race) instead of overwriting
+the first decision. The status counters are moved in the same
+transaction; callers commit.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+from models import db, User, Distributor, AssetRequest, STATUS_CATEGORIES, STATUS_CODES
+from .status_counters import record_status_change
+
+PENDING_BM = 'Pending BM Approval'
+PENDING_RH = 'Pending RH Approval'
+
+
+# RETURNING subqueries are correlated explicitly to the updated row. SQLite
+# renders that row's columns unqualified there, so an outer column is only
+# referenced from a table that has no column of the same name (distributor
+# for distributor_id, user for requester_id); the RH's user row is looked
+# up from inside the distributor subquery.
+def _distributor_column(column):
+    return (db.select(column).where(Distributor.id == AssetRequest.distributor_id)
+            .correlate(AssetRequest).scalar_subquery())
+
+
+def _regional_head_column(column):
+    regional_head = db.select(column).where(User.id == Distributor.rh_id).correlate(Distributor).scalar_subquery()
+    return _distributor_column(regional_head)
+
+
+def _returning_columns():
+    return (
+        AssetRequest.id, AssetRequest.status, AssetRequest.requester_id, AssetRequest.distributor_id,
+        AssetRequest.asset_model, AssetRequest.retailer_name,
+        _distributor_column(Distributor.name).label('distributor_name'),
+        _distributor_column(Distributor.bm_id).label('bm_id'),
+        _distributor_column(Distributor.rh_id).label('rh_id'),
+        db.select(User.name).where(User.id == AssetRequest.requester_id)
+            .correlate(AssetRequest).scalar_subquery().label('requester_name'),
+        _regional_head_column(User.name).label('rh_name'),
+        _regional_head_column(User.email).label('rh_email'),
+        _regional_head_column(User.notification_mode).label('rh_notification_mode'),
+    )
+
+
+class TransitionResult:
+    """
+    The request after a transition, with just enough of its distributor,
+    requester and RH for record_status_change and the approval emails.
+    """
+
+    def __init__(self, row, old_status):
+        self.id = row.id
+        self.old_status = old_status
+        self.status = row.status
+        self.requester_id = row.requester_id
+        self.asset_model = row.asset_model
+        self.retailer_name = row.retailer_name
+        self.distributor = SimpleNamespace(
+            id=row.distributor_id, name=row.distributor_name, bm_id=row.bm_id, rh_id=row.rh_id
+        )
+        self.requester = SimpleNamespace(id=row.requester_id, name=row.requester_name)
+        self.regional_head = None
+        if row.rh_id:
+            self.regional_head = SimpleNamespace(
+                id=row.rh_id, name=row.rh_name, email=row.rh_email, notification_mode=row.rh_notification_mode
+            )
+
+
+def transition_request(request_id, from_status, to_status, scope=None, **values):
+    """
+    Moves a request from `from_status` to `to_status`, setting `values`
+    in the same UPDATE, and updates the status counters. `scope` is an
+    extra WHERE condition (e.g. the approver's distributors). Returns a
+    TransitionResult, or None if the request was not (or no longer) in
+    `from_status` for this user.
+    """
+    stmt = db.update(AssetRequest).where(AssetRequest.id == request_id, AssetRequest.status == from_status)
+    if scope is not None:
+        stmt = stmt.where(scope)
+    stmt = stmt.values(
+        status=to_status, status_category=STATUS_CATEGORIES[to_status], status_code=STATUS_CODES[to_status], **values
+    ).returning(*_returning_columns()).execution_options(synchronize_session=False)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None
+    result = TransitionResult(row, from_status)
+    record_status_change(result, from_status, to_status, distributor=result.distributor)
+    return result
+
+
+def current_status(request_id):
+    """The request's status now (None if it does not exist), for explaining a lost race."""
+    return db.session.query(AssetRequest.status).filter(AssetRequest.id == request_id).scalar()
+
+
+def _approver_scope(user):
+    """BMs and RHs may only act on requests of their own distributors."""
+    column = Distributor.bm_id if user.role == 'BM' else Distributor.rh_id
+    return AssetRequest.distributor_id.in_(db.select(Distributor.id).where(column == user.id))
+
+
+# --- Approvals ---
+
+def approve_as_bm(request_id, user, approval_type, security_amount=None, justification=None):
+    """BM approval ('With Security' or 'Free of Cost'); forwards the request to the RH."""
+    return transition_request(
+        request_id, PENDING_BM, PENDING_RH, scope=_approver_scope(user),
+        bm_approver_id=user.id, bm_remarks=None, bm_approval_type=approval_type,
+        bm_security_amount=security_amount, bm_foc_justification=justification
+    )
+
+
+def approve_as_rh(request_id, user, remarks=''):
+    values = {'rh_approver_id': user.id}
+    if remarks:
+        values['rh_remarks'] = remarks
+    return transition_request(request_id, PENDING_RH, 'Approved', scope=_approver_scope(user), **values)
+
+
+def _admin_override(request_id, user, to_status, remarks, verb, always_remark, **values):
+    """
+    Admin decision on a request at either pending stage: tries the BM
+    stage, then the RH stage (one conditional UPDATE each), so the
+    approver columns match the stage the request was actually in.
+    """
+    for stage in (PENDING_BM, PENDING_RH):
+        stage_values = dict(values, rh_approver_id=user.id)
+        if remarks or always_remark:
+            stage_values['rh_remarks'] = f"{verb} by Admin: {remarks}"
+        if stage == PENDING_BM:
+            stage_values['bm_approver_id'] = user.id
+            if remarks or always_remark:
+                stage_values['bm_remarks'] = f"{verb} by Admin: {remarks}"
+        result = transition_request(request_id, stage, to_status, **stage_values)
+        if result:
+            return result
+    return None
+
+
+def approve_as_admin(request_id, user, remarks=''):
+    return _admin_override(request_id, user, 'Approved', remarks, 'Approved', False,
+                           bm_approval_type='Admin Override')
+
+
+# --- Rejections ---
+
+def reject(request_id, user, remarks):
+    """Rejection by the BM / RH at their stage, or by an Admin at either pending stage."""
+    if user.role == 'BM':
+        return transition_request(request_id, PENDING_BM, 'Rejected by BM', scope=_approver_scope(user),
+                                  bm_approver_id=user.id, bm_remarks=remarks)
+    if user.role == 'RH':
+        return transition_request(request_id, PENDING_RH, 'Rejected by RH', scope=_approver_scope(user),
+                                  rh_approver_id=user.id, rh_remarks=remarks)
+    if user.role == 'Admin':
+        return _admin_override(request_id, user, 'Rejected by Admin', remarks, 'Rejected', True)
+    return None
+
+
+# --- Deployment ---
+
+def deploy(request_id, user, make, serial_no, photo1_filename, photo2_filename):
+    """Closes an approved request with the installed asset's details."""
+    scope = None if user.role == 'Admin' else AssetRequest.requester_id == user.id
+    return transition_request(
+        request_id, 'Approved', 'Deployed', scope=scope,
+        deployed_make=make, deployed_serial_no=serial_no,
+        deployment_photo1_filename=photo1_filename, deployment_photo2_filename=photo2_filename,
+        deployed_by_id=user.id, deployment_date=datetime.utcnow()
+    )
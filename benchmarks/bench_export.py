@@ -0,0 +1,118 @@
+"""
+Benchmark: DMS export fetch paths (ORM hydration vs column projection).
+
+Seeds a throwaway SQLite database with N asset requests and measures
+rows/sec for building every export row through
+  - build_export_query()      (AssetRequest objects + lazy-loaded approvers)
+  - build_export_projection() (one SELECT of plain tuples)
+
+Usage: python benchmarks/bench_export.py [--sizes 10000 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from assetify_app import db
+from models import User, Distributor, AssetRequest
+from assetify_app.exports import (
+    build_export_query, build_export_projection, iter_export_rows, iter_export_rows_orm
+)
+
+STATUSES = ['Pending BM Approval', 'Pending RH Approval', 'Approved', 'Deployed', 'Rejected by BM']
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_requests, n_distributors=200, n_users=400):
+    """Bulk-inserts users, distributors and n_requests asset requests."""
+    rng = random.Random(42)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'employee_code': f'U{i}', 'name': f'User {i}', 'role': 'SE', 'so': f'SO{i % 20}'}
+        for i in range(1, n_users + 1)
+    ])
+    db.session.execute(db.insert(Distributor), [
+        {'id': i, 'code': f'D{i}', 'name': f'Distributor {i}', 'city': f'City {i % 50}',
+         'se_id': rng.randint(1, n_users), 'bm_id': rng.randint(1, n_users), 'rh_id': rng.randint(1, n_users)}
+        for i in range(1, n_distributors + 1)
+    ])
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(1, n_requests + 1):
+        status = rng.choice(STATUSES)
+        approved = status in ('Approved', 'Deployed')
+        batch.append({
+            'id': i,
+            'requester_id': rng.randint(1, n_users),
+            'distributor_id': rng.randint(1, n_distributors),
+            'request_date': start + timedelta(minutes=i),
+            'status': status,
+            'asset_model': '300 GT',
+            'category': 'Bakery',
+            'retailer_name': f'Retailer {i}',
+            'retailer_contact': f'{9000000000 + i}',
+            'retailer_address': f'{i} Main Road',
+            'bm_approver_id': rng.randint(1, n_users) if status != 'Pending BM Approval' else None,
+            'rh_approver_id': rng.randint(1, n_users) if approved else None,
+            'deployed_by_id': rng.randint(1, n_users) if status == 'Deployed' else None,
+            'deployment_date': start + timedelta(days=30) if status == 'Deployed' else None,
+            'bm_approval_type': 'Free of Cost' if status != 'Pending BM Approval' else None,
+        })
+        if len(batch) == 10000:
+            db.session.execute(db.insert(AssetRequest), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(AssetRequest), batch)
+    db.session.commit()
+
+
+def time_path(build, iterate, user):
+    db.session.expunge_all()
+    started = time.perf_counter()
+    count = sum(1 for _ in iterate(build(user, {})))
+    elapsed = time.perf_counter() - started
+    db.session.rollback()
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    admin = SimpleNamespace(id=0, role='Admin', distributor_id=None)
+    print(f"{'rows':>8} {'path':<12} {'seconds':>8} {'rows/sec':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, 'bench.db'))
+            with app.app_context():
+                db.create_all()
+                seed(size)
+                results = {}
+                for name, build, iterate in [
+                    ('orm', build_export_query, iter_export_rows_orm),
+                    ('projection', build_export_projection, iter_export_rows),
+                ]:
+                    count, elapsed = time_path(build, iterate, admin)
+                    results[name] = elapsed
+                    print(f"{count:>8} {name:<12} {elapsed:>8.2f} {count / elapsed:>10.0f}")
+                print(f"{'':>8} speedup x{results['orm'] / results['projection']:.1f}")
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
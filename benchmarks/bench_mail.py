@@ -0,0 +1,181 @@
+"""
+Benchmark: email delivery (thread + new SMTP session per message vs the
+MailWorkerPool reusing one session per worker).
+
+Starts a minimal local SMTP server as a stand-in for the real relay. It
+delays every new connection by --connect-ms to model the TCP + STARTTLS +
+AUTH handshake that each fresh session pays, and every message by
+--message-ms. Like hosted relays it refuses sessions beyond
+--max-sessions concurrent connections (421), so unbounded senders lose
+mail. Reports delivered messages/sec and how many SMTP sessions were opened.
+
+Usage: python benchmarks/bench_mail.py [--messages 200] [--workers 2 4 8]
+"""
+import argparse
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from flask_mail import Mail, Message
+from assetify_app import mailer
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Accepts any mail and only counts it."""
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 512
+
+    def __init__(self, connect_delay, message_delay, max_sessions):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connect_delay = connect_delay
+        self.message_delay = message_delay
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.open_sessions = 0
+        self.sessions = 0
+        self.refused = 0
+        self.messages = 0
+
+    def reset(self):
+        with self.lock:
+            self.sessions = 0
+            self.refused = 0
+            self.messages = 0
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            if server.open_sessions >= server.max_sessions:
+                server.refused += 1
+                self.reply('421 Too many concurrent SMTP connections')
+                return
+            server.open_sessions += 1
+            server.sessions += 1
+        try:
+            self.converse()
+        finally:
+            with server.lock:
+                server.open_sessions -= 1
+
+    def converse(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        self.reply('220 stand-in ESMTP')
+        for raw in self.rfile:
+            command = raw.decode('ascii', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stand-in')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                time.sleep(server.message_delay)
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 Queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+def make_app(port, workers):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+        MAIL_DEFAULT_SENDER='bench@example.com',
+        MAIL_WORKERS=workers, MAIL_QUEUE_SIZE=200, MAIL_IDLE_TIMEOUT=30
+    )
+    Mail(app)
+    return app
+
+
+def make_messages(n):
+    return [
+        Message(f'Request #{i} for approval', recipients=[f'bm{i % 20}@example.com'],
+                html='<p>' + 'x' * 2000 + '</p>')
+        for i in range(n)
+    ]
+
+
+def run_thread_per_message(app, messages):
+    """The old send_email path: one daemon thread and one mail.send() (new session) per message."""
+    mail = app.extensions['mail']
+
+    def send(msg):
+        with app.app_context():
+            try:
+                mail.send(msg)
+            except (smtplib.SMTPException, OSError):
+                pass  # the old send_async_email only printed the error
+
+    threads = [threading.Thread(target=send, args=[msg], daemon=True) for msg in messages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_pool(app, messages):
+    pool = mailer.MailWorkerPool(
+        app, workers=app.config['MAIL_WORKERS'], queue_size=app.config['MAIL_QUEUE_SIZE'],
+        idle_timeout=app.config['MAIL_IDLE_TIMEOUT']
+    )
+    pool.start()
+    for msg in messages:
+        pool.submit(msg)
+    pool.join()
+    pool.shutdown(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--connect-ms', type=float, default=150.0)
+    parser.add_argument('--message-ms', type=float, default=5.0)
+    parser.add_argument('--max-sessions', type=int, default=10)
+    args = parser.parse_args()
+
+    server = SMTPStandIn(args.connect_ms / 1000.0, args.message_ms / 1000.0, args.max_sessions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    # Keep the per-message "Email sent" lines out of the results
+    mailer.print = lambda *a, **k: None
+
+    print(f"{'path':<22} {'sent':>6} {'delivered':>9} {'sessions':>8} {'refused':>7} {'seconds':>8} {'msg/sec':>8}")
+    runs = [('thread-per-message', 1, run_thread_per_message)]
+    runs += [(f'pool ({workers} workers)', workers, run_pool) for workers in args.workers]
+    for name, workers, run in runs:
+        app = make_app(port, workers)
+        with app.app_context():
+            messages = make_messages(args.messages)
+        server.reset()
+        started = time.perf_counter()
+        run(app, messages)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<22} {len(messages):>6} {server.messages:>9} {server.sessions:>8} {server.refused:>7} "
+              f"{elapsed:>8.2f} {server.messages / elapsed:>8.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmark: the hot routes (dashboard, export_excel, new_request,
+approve_request, /api/distributors) through the Flask test client, as
+each role (SE, DB, BM, RH, Admin), against synthetic datasets of several
+sizes built by assetify_app.synthetic (same generator as
+`flask generate-data`).
+
+For every size / route / role it reports p50 and p95 latency, SQL
+statements per request (streamed export bodies included) and the
+process's peak RSS so far. Datasets are cached in --data-dir by size and
+seed, and every run works on a fresh copy, so runs are comparable.
+
+Results are written to --output as JSON. With --baseline the run is
+compared against a saved result file, and the script exits with status 1
+when a p95 grew by more than --tolerance (and --min-delta-ms) or a
+route issues more queries.
+
+Usage: python benchmarks/bench_routes.py [--sizes 1000 100000 1000000]
+           [--iterations 30] [--output routes.json] [--baseline base.json]
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from sqlalchemy import event
+from assetify_app import create_app, db
+from assetify_app.synthetic import generate_synthetic_data
+from models import User, Distributor, AssetRequest
+
+SEED = 42
+END_DATE = date(2026, 1, 1)
+PASSWORD = 'synthetic'
+ADMIN_CODE = 'SYNADMIN001'
+ROLES = ('SE', 'DB', 'BM', 'RH', 'Admin')
+
+# (name, roles, method, url)
+ROUTES = [
+    ('dashboard', ROLES, 'GET', '/dashboard'),
+    ('dashboard_pending', ROLES, 'GET', '/dashboard?status=Pending%20BM%20Approval'),
+    ('api_distributors', ROLES, 'GET', '/api/distributors'),
+    ('export_excel', ROLES, 'GET', '/export/excel'),
+    ('new_request', ('SE', 'DB'), 'POST', '/new_request'),
+    ('approve_request', ('BM', 'RH', 'Admin'), 'POST', '/approve/{id}'),
+]
+
+
+def make_app(db_path, work_dir):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+        'UPLOAD_FOLDER': os.path.join(work_dir, 'uploads'),
+        'EXPORT_FOLDER': os.path.join(work_dir, 'exports'),
+        'IMPORT_FOLDER': os.path.join(work_dir, 'imports'),
+        'WTF_CSRF_ENABLED': False,
+        'QUERY_BUDGET_STRICT': False,
+    })
+
+
+def dataset(data_dir, size):
+    """Returns the cached dataset directory for `size`, generating it first if needed."""
+    path = os.path.join(data_dir, f'routes_{size}_seed{SEED}')
+    if os.path.exists(os.path.join(path, 'bench.db')):
+        return path
+    os.makedirs(path, exist_ok=True)
+    print(f"Generating {size} requests into {path} ...")
+    started = time.perf_counter()
+    app = make_app(os.path.join(path, 'bench.db.tmp'), path)
+    with app.app_context():
+        db.create_all()
+        generate_synthetic_data(SEED, regions=4, bms_per_region=6, distributors_per_bm=25, distributors_per_se=3,
+                                requests=size, days=730, batch_size=5000, password=PASSWORD, end_date=END_DATE)
+        admin = User(employee_code=ADMIN_CODE, name='Synthetic Admin', role='Admin')
+        admin.set_password(PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+    os.replace(os.path.join(path, 'bench.db.tmp'), os.path.join(path, 'bench.db'))
+    print(f"  done in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def pick_users():
+    """The first generated account of each role (the same one on every run)."""
+    users = {}
+    for role in ROLES:
+        users[role] = User.query.filter(User.role == role, User.employee_code.like('SYN%')) \
+            .order_by(User.employee_code).first()
+    return users
+
+
+def pending_ids(user, limit):
+    """Requests `user` can approve right now, oldest first."""
+    query = AssetRequest.query.join(Distributor, AssetRequest.distributor_id == Distributor.id)
+    if user.role == 'BM':
+        query = query.filter(Distributor.bm_id == user.id, AssetRequest.status == 'Pending BM Approval')
+    elif user.role == 'RH':
+        query = query.filter(Distributor.rh_id == user.id, AssetRequest.status == 'Pending RH Approval')
+    else:
+        query = query.filter(AssetRequest.status.in_(['Pending BM Approval', 'Pending RH Approval']))
+    return [req.id for req in query.order_by(AssetRequest.id).limit(limit)]
+
+
+def make_photos(count):
+    """
+    `count` distinct ~300 KB 1280x960 JPEGs, like the app's canvas captures
+    (content-addressed uploads would dedupe identical ones).
+    """
+    from PIL import Image, ImageFilter
+    base = Image.effect_noise((1280, 960), 64).convert('RGB').filter(ImageFilter.GaussianBlur(1))
+    photos = []
+    for i in range(count):
+        image = base.copy()
+        image.putpixel((i % 1280, i // 1280), (255, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def request_plan(route, role, user, iterations, photos):
+    """Yields (method, url, form data, expected status) for each timed call of one route / role."""
+    name, _, method, url = route
+    if name == 'new_request':
+        distributor = Distributor.query.filter(
+            Distributor.se_id == user.id if role == 'SE' else Distributor.id == user.distributor_id
+        ).order_by(Distributor.name).first()
+        for i in range(iterations):
+            yield method, url, {
+                'distributor_name': distributor.name, 'asset_model': '300 GT', 'category': 'Bakery',
+                'placement_date': '2026-02-01', 'latitude': '17.385', 'longitude': '78.487',
+                'retailer_name': f'Bench Retailer {i}', 'retailer_contact': f'7{role == "DB":d}{i:08d}',
+                'area_town': 'Hyderabad', 'landmark': '', 'retailer_address': '', 'retailer_email': '',
+                'selling_ice_cream': 'no', 'willing_for_signage': 'Yes', 'captured_photo': (io.BytesIO(photos[i % len(photos)]), 'capture.jpg', 'image/jpeg'),
+            }, 200
+    elif name == 'approve_request':
+        form = {'approval_type': 'foc', 'foc_justification': 'benchmark'} if role == 'BM' else {'remarks': 'benchmark'}
+        for request_id in pending_ids(user, iterations):
+            yield method, url.format(id=request_id), form, 302
+    else:
+        for _ in range(iterations):
+            yield method, url, None, 200
+
+
+def bench_size(size, data_dir, iterations, export_iterations, photos):
+    source = dataset(data_dir, size)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, 'bench.db')
+        shutil.copyfile(os.path.join(source, 'bench.db'), db_path)
+        shutil.copytree(os.path.join(source, 'uploads'), os.path.join(work_dir, 'uploads'))
+        app = make_app(db_path, work_dir)
+        client = app.test_client()
+        queries = [0]
+
+        def count_query(*args):
+            queries[0] += 1
+
+        # Requests must not run inside an outer app context: it would share `g`
+        # (and Flask-Login's cached user) between them
+        with app.app_context():
+            engine = db.engine
+            users = pick_users()
+        event.listen(engine, 'before_cursor_execute', count_query)
+        for route in ROUTES:
+            name, roles, method, _ = route
+            for role in roles:
+                user = users[role]
+                client.get('/logout')
+                client.post('/login', data={'employee_code': user.employee_code, 'password': PASSWORD})
+                runs = export_iterations if name == 'export_excel' else iterations
+                with app.app_context():
+                    plan = list(request_plan(route, role, user, runs, photos))
+                if method == 'GET' and plan:
+                    client.get(plan[0][1]).close()  # warm-up, untimed
+                timings, counts, errors = [], [], 0
+                for method_, url, form, expected in plan:
+                    before = queries[0]
+                    started = time.perf_counter()
+                    response = client.open(url, method=method_, data=form)
+                    response.get_data()
+                    timings.append(time.perf_counter() - started)
+                    response.close()
+                    counts.append(queries[0] - before)
+                    errors += response.status_code != expected
+                if not timings:
+                    print(f"{size:>8} {name:<18} {role:<6} (nothing to run)")
+                    continue
+                result = {
+                    'size': size, 'route': name, 'role': role, 'n': len(timings),
+                    'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+                    'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+                    'queries_per_request': round(sum(counts) / len(counts), 1),
+                    'errors': errors,
+                    'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                }
+                results.append(result)
+                print(f"{size:>8} {name:<18} {role:<6} {result['n']:>4} {result['p50_ms']:>9.1f} "
+                      f"{result['p95_ms']:>9.1f} {result['queries_per_request']:>8.1f} {errors:>6} "
+                      f"{result['peak_rss_mb']:>8.0f}")
+        event.remove(engine, 'before_cursor_execute', count_query)
+        engine.dispose()
+    return results
+
+
+def compare(results, baseline_path, tolerance, min_delta_ms):
+    """Prints p95 / query deltas against a saved run. Returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r['size'], r['route'], r['role']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n{'size':>8} {'route':<18} {'role':<6} {'p95 base':>9} {'p95 now':>9} {'change':>8}  queries")
+    for result in results:
+        base = baseline.get((result['size'], result['route'], result['role']))
+        if not base:
+            continue
+        change = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        flags = []
+        if change > tolerance and result['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            flags.append('SLOWER')
+        if result['queries_per_request'] > base['queries_per_request']:
+            flags.append('MORE QUERIES')
+        regressions += bool(flags)
+        print(f"{result['size']:>8} {result['route']:<18} {result['role']:<6} {base['p95_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {change:>+8.0%}  {base['queries_per_request']:.1f} -> "
+              f"{result['queries_per_request']:.1f} {' '.join(flags)}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--iterations', type=int, default=30, help='Timed calls per route and role.')
+    parser.add_argument('--export-iterations', type=int, default=3, help='Timed calls of export_excel per role.')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'assetify-bench'),
+                        help='Where generated datasets are cached.')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--baseline', help='A previous --output file to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='Allowed p95 growth before flagging (0.20 = 20%%).')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Ignore p95 growth smaller than this (timer noise on fast routes).')
+    args = parser.parse_args()
+
+    photos = make_photos(args.iterations)
+    print(f"{'size':>8} {'route':<18} {'role':<6} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} "
+          f"{'errors':>6} {'rss MB':>8}")
+    results = []
+    for size in args.sizes:
+        results.extend(bench_size(size, args.data_dir, args.iterations, args.export_iterations, photos))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': datetime.utcnow().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'iterations': args.iterations,
+            'export_iterations': args.export_iterations,
+            'results': results,
+        }, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance, args.min_delta_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""
+Load test: replays a weighted field-force traffic mix against a running
+Assetify server, e.g. the morning rush of SEs submitting photo-heavy
+requests while BMs and RHs refresh their dashboards and approve.
+
+Every virtual user logs in as its own seeded account (data from
+`flask generate-data`; pass the same org-size options here) over one
+keep-alive connection, then loops: pick an action by its weight in the
+role's scenario, run it, wait an exponential think time.
+
+Actions:
+  new_request         multipart POST with a ~300 KB 1280x960 JPEG
+  check_phone         /api/check_phone/<number> (known and new numbers)
+  dashboard           first page of /dashboard
+  dashboard_filtered  /dashboard filtered by status (BM/RH: their pending stage)
+  view_request        a request from the role's dashboard
+  approve             POST /approve/<id> for a request pending on the user
+
+Reports requests, throughput, error rate and p50/p95/p99 latency per
+endpoint; --output also writes them as JSON. Override the traffic mix with
+--scenario file.json ({"SE": {"new_request": 40, ...}, ...}).
+
+Usage: python benchmarks/loadtest.py --base-url http://127.0.0.1:5000
+           [--se 200] [--db 20] [--bm 24] [--rh 4] [--duration 120]
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.client import HTTPConnection, HTTPSConnection
+from http.cookies import SimpleCookie
+from urllib.parse import quote, urlencode, urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from assetify_app.synthetic import synthetic_account_codes
+
+# role -> {action: weight}
+SCENARIO = {
+    'SE': {'new_request': 35, 'check_phone': 35, 'dashboard': 20, 'dashboard_filtered': 10},
+    'DB': {'new_request': 30, 'check_phone': 30, 'dashboard': 40},
+    'BM': {'dashboard': 35, 'dashboard_filtered': 25, 'view_request': 15, 'approve': 25},
+    'RH': {'dashboard': 35, 'dashboard_filtered': 25, 'view_request': 15, 'approve': 25},
+}
+PENDING_STAGE = {'BM': 'Pending BM Approval', 'RH': 'Pending RH Approval'}
+FILTER_STATUSES = ['Pending BM Approval', 'Pending RH Approval', 'Approved', 'Deployed', 'Rejected by BM']
+
+_CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+_REQUEST_LINK = re.compile(r'/request/(\d+)"')
+
+
+class Stats:
+    """Latencies and errors per endpoint label, shared by all virtual users."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def record(self, label, seconds, error=None):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if error:
+                self.errors[label] += 1
+                self.error_samples.setdefault(label, error)
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index, role, code, args, stats, photos, stop_at):
+        super().__init__(daemon=True, name=f'vu-{role}-{index}')
+        self.index = index
+        self.role = role
+        self.code = code
+        self.args = args
+        self.stats = stats
+        self.photos = photos
+        self.stop_at = stop_at
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.url = urlsplit(args.base_url)
+        self.conn = None
+        self.cookies = {}
+        self.csrf_token = None
+        self.distributors = []
+        self.request_ids = []
+        self.pending_ids = []
+        self.submitted = 0
+        actions = args.scenario[role]
+        self.actions, self.weights = list(actions), list(actions.values())
+
+    # --- HTTP ---
+
+    def _connect(self):
+        connection_class = HTTPSConnection if self.url.scheme == 'https' else HTTPConnection
+        self.conn = connection_class(self.url.hostname, self.url.port, timeout=self.args.timeout)
+
+    def request(self, label, method, path, body=None, content_type=None, expect=(200,)):
+        """Sends one request on the keep-alive connection. Returns (status, text) or (None, None) on failure."""
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if content_type:
+            headers['Content-Type'] = content_type
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self._connect()
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            text = response.read().decode('utf-8', 'replace')
+        except Exception as e:
+            self.stats.record(label, time.perf_counter() - started, f'{type(e).__name__}: {e}')
+            if self.conn:
+                self.conn.close()
+            self.conn = None
+            return None, None
+        elapsed = time.perf_counter() - started
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        error = None if response.status in expect else f'HTTP {response.status}: {text[:200]}'
+        self.stats.record(label, elapsed, error)
+        return response.status, text
+
+    def _multipart(self, fields, file_field, filename, data):
+        boundary = uuid.uuid4().hex
+        body = io.BytesIO()
+        for name, value in fields.items():
+            body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                   f'filename="{filename}"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+        body.write(data)
+        body.write(f'\r\n--{boundary}--\r\n'.encode())
+        return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+    # --- Session ---
+
+    def login(self):
+        status, page = self.request('login', 'GET', '/login')
+        match = page and _CSRF.search(page)
+        if not match:
+            return False
+        self.csrf_token = match.group(1)
+        status, _ = self.request('login', 'POST', '/login', body=urlencode({
+            'employee_code': self.code, 'password': self.args.password, 'csrf_token': self.csrf_token
+        }), content_type='application/x-www-form-urlencoded', expect=(302,))
+        if status != 302:
+            return False
+        if 'new_request' in self.actions:
+            status, text = self.request('api_distributors', 'GET', '/api/distributors')
+            if status == 200:
+                self.distributors = [d['name'] for d in json.loads(text).get('distributors', [])]
+        return True
+
+    def _request_ids(self, page):
+        """Request ids linked from a dashboard page (each appears in the table and the mobile cards)."""
+        return list(dict.fromkeys(int(i) for i in _REQUEST_LINK.findall(page or '')))
+
+    # --- Actions ---
+
+    def new_request(self):
+        if not self.distributors:
+            return self.dashboard()
+        self.submitted += 1
+        fields = {
+            'csrf_token': self.csrf_token,
+            'distributor_name': self.rng.choice(self.distributors),
+            'asset_model': self.rng.choice(['300 GT', '400 GT', '500 HT', '500 GT']),
+            'category': self.rng.choice(['Kirana Store', 'General Store', 'Bakery', 'Sweet Shop']),
+            'placement_date': '2026-12-01',
+            'latitude': f'{17.385 + self.rng.uniform(-0.2, 0.2):.6f}',
+            'longitude': f'{78.487 + self.rng.uniform(-0.2, 0.2):.6f}',
+            'retailer_name': f'Load Test Retailer {self.index}-{self.submitted}',
+            # 8 + virtual user + counter: unique per run for up to 9999 users x 99999 submissions
+            'retailer_contact': f'8{self.index % 10000:04d}{self.submitted % 100000:05d}',
+            'area_town': 'Hyderabad', 'landmark': '', 'retailer_address': '', 'retailer_email': '',
+            'selling_ice_cream': 'no', 'willing_for_signage': 'Yes',
+        }
+        body, content_type = self._multipart(fields, 'captured_photo', 'capture.jpg', self.rng.choice(self.photos))
+        self.request('new_request', 'POST', '/new_request', body=body, content_type=content_type)
+
+    def check_phone(self):
+        if self.rng.random() < 0.5:
+            number = f'6{self.rng.randint(1, self.args.known_phones):09d}'  # generated requests use 6000000001...
+        else:
+            number = f'9{self.rng.randint(0, 10 ** 9 - 1):09d}'
+        self.request('check_phone', 'GET', f'/api/check_phone/{number}')
+
+    def dashboard(self):
+        _, page = self.request('dashboard', 'GET', '/dashboard')
+        self.request_ids = self._request_ids(page) or self.request_ids
+
+    def dashboard_filtered(self):
+        status = PENDING_STAGE.get(self.role) or self.rng.choice(FILTER_STATUSES)
+        _, page = self.request('dashboard_filtered', 'GET', f'/dashboard?status={quote(status)}')
+        if self.role in PENDING_STAGE:
+            self.pending_ids = self._request_ids(page)
+
+    def view_request(self):
+        if not self.request_ids:
+            return self.dashboard()
+        self.request('view_request', 'GET', f'/request/{self.rng.choice(self.request_ids)}')
+
+    def approve(self):
+        if not self.pending_ids:
+            # Refill from the user's pending stage
+            self.dashboard_filtered()
+            if not self.pending_ids:
+                return
+        form = {'approval_type': 'foc', 'foc_justification': 'Load test'} if self.role == 'BM' else {'remarks': 'Load test'}
+        self.request('approve', 'POST', f'/approve/{self.pending_ids.pop()}', body=urlencode(form),
+                     content_type='application/x-www-form-urlencoded', expect=(302,))
+
+    def run(self):
+        # Spread logins over the ramp-up period
+        time.sleep(self.rng.uniform(0, self.args.ramp_up))
+        if not self.login():
+            return
+        while time.monotonic() < self.stop_at:
+            getattr(self, self.rng.choices(self.actions, weights=self.weights)[0])()
+            time.sleep(min(self.rng.expovariate(1.0 / self.args.think_time), 10 * self.args.think_time))
+        if self.conn:
+            self.conn.close()
+
+
+def make_photos(count, seed):
+    """`count` distinct ~300 KB 1280x960 JPEGs, like the app's canvas captures."""
+    from PIL import Image, ImageFilter
+    rng = random.Random(seed)
+    base = Image.effect_noise((1280, 960), 64).convert('RGB').filter(ImageFilter.GaussianBlur(1))
+    photos = []
+    for _ in range(count):
+        image = base.copy()
+        image.putpixel((rng.randrange(1280), rng.randrange(960)), (255, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def report(stats, seconds):
+    rows = []
+    print(f"\n{'endpoint':<20} {'requests':>9} {'req/s':>8} {'errors':>7} {'err %':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label in sorted(stats.latencies):
+        latencies = stats.latencies[label]
+        row = {
+            'endpoint': label,
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / seconds, 2),
+            'errors': stats.errors[label],
+            'error_rate': round(stats.errors[label] / len(latencies), 4),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1),
+        }
+        rows.append(row)
+        print(f"{label:<20} {row['requests']:>9} {row['throughput_rps']:>8.1f} {row['errors']:>7} "
+              f"{row['error_rate']:>6.1%} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+              f"{row['max_ms']:>8.1f}")
+    total = sum(row['requests'] for row in rows)
+    print(f"{'total':<20} {total:>9} {total / seconds:>8.1f} {sum(row['errors'] for row in rows):>7}")
+    for label, sample in stats.error_samples.items():
+        print(f"  first {label} error: {sample}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--se', type=int, default=200, help='Virtual SEs.')
+    parser.add_argument('--db', type=int, default=20, help='Virtual distributor (DB) logins.')
+    parser.add_argument('--bm', type=int, default=24, help='Virtual BMs.')
+    parser.add_argument('--rh', type=int, default=4, help='Virtual RHs.')
+    parser.add_argument('--duration', type=float, default=120, help='Seconds to run after the ramp-up starts.')
+    parser.add_argument('--ramp-up', type=float, default=30, help='Logins are spread over this many seconds.')
+    parser.add_argument('--think-time', type=float, default=2.0, help='Mean pause between a user\'s actions.')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--scenario', help='JSON file with {role: {action: weight}} overrides.')
+    parser.add_argument('--photos', type=int, default=20, help='Distinct photos to rotate through.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the per-endpoint results as JSON.')
+    group = parser.add_argument_group('seeded data (same values as passed to `flask generate-data`)')
+    group.add_argument('--password', default='synthetic')
+    group.add_argument('--regions', type=int, default=4)
+    group.add_argument('--bms-per-region', type=int, default=6)
+    group.add_argument('--distributors-per-bm', type=int, default=25)
+    group.add_argument('--distributors-per-se', type=int, default=3)
+    group.add_argument('--known-phones', type=int, default=200000, help='Generated request count (--requests).')
+    args = parser.parse_args()
+
+    args.scenario_file, args.scenario = args.scenario, {role: dict(actions) for role, actions in SCENARIO.items()}
+    if args.scenario_file:
+        with open(args.scenario_file) as f:
+            for role, actions in json.load(f).items():
+                args.scenario[role] = actions
+
+    codes = synthetic_account_codes(args.regions, args.bms_per_region, args.distributors_per_bm,
+                                    args.distributors_per_se)
+    photos = make_photos(args.photos, args.seed)
+    stats = Stats()
+    started = time.monotonic()
+    stop_at = started + args.duration
+    users = []
+    for role, count in (('SE', args.se), ('DB', args.db), ('BM', args.bm), ('RH', args.rh)):
+        for i in range(count):
+            # More virtual users than accounts: accounts are shared round-robin
+            users.append(VirtualUser(len(users), role, codes[role][i % len(codes[role])], args, stats, photos, stop_at))
+    print(f"{len(users)} virtual users against {args.base_url} for {args.duration:.0f}s "
+          f"(SE {args.se}, DB {args.db}, BM {args.bm}, RH {args.rh})")
+    for user in users:
+        user.start()
+    for user in users:
+        user.join(timeout=max(0, stop_at - time.monotonic()) + args.timeout)
+
+    rows = report(stats, time.monotonic() - started)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'base_url': args.base_url, 'duration': args.duration, 'users': {
+                'SE': args.se, 'DB': args.db, 'BM': args.bm, 'RH': args.rh
+            }, 'scenario': args.scenario, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
+import argparse
 import os
-import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 import openpyxl  # <-- THIS IS THE FIX: Use Excel reader
-from app import app, db
-from models import User, Distributor, AssetRequest
+from app import app
+from assetify_app import db
+from assetify_app.org_sync import (
+    HASH_WORKERS, collect_org_mapping, insert_distributors, insert_users, iter_sheet_rows,
+    sync_org_mapping, user_row
+)
+from assetify_app.status_counters import rebuild_status_counters
+from models import User, Distributor, AssetRequest, RequestStatusCounter, StoredUpload, EmailOutbox, ImportJob
 
 # --- CONFIGURATION ---
 # --- THIS IS THE FIX: Point to your .xlsx file ---
-EXCEL_FILE_PATH = 'DB vs EMP Mapping (1).xlsx'
+EXCEL_FILE_PATH = os.environ.get('MAPPING_XLSX', 'DB vs EMP Mapping (1).xlsx')
 SHEET_NAME = 'DB wise - SE Mapping' # Assuming this is the sheet name
 # --- END OF FIX ---
 
@@ -16,11 +24,13 @@ ADMIN_PASSWORD = 'adminpass' # A default password for the main admin account
 
 def load_data_from_excel(file_path, sheet_name):
     """
-    Loads data from an Excel .xlsx file and returns a list of dictionaries.
+    Opens an Excel .xlsx file in read-only mode and returns a generator of
+    row dictionaries (None if the file or sheet cannot be opened). Rows are
+    parsed as they are read, so the sheet is never held in memory.
     """
     print(f"Reading data from Excel file: {file_path} (Sheet: {sheet_name})")
     try:
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     except FileNotFoundError:
         print(f"--- ERROR ---")
         print(f"File not found: {file_path}")
@@ -37,160 +47,105 @@ def load_data_from_excel(file_path, sheet_name):
         print(f"--- ERROR ---")
         print(f"A sheet named '{sheet_name}' was not found in the Excel file.")
         print(f"Available sheets: {workbook.sheetnames}")
+        workbook.close()
         return None
 
-    rows = []
-    # Read headers from the first row
-    headers = [str(cell.value).strip() for cell in sheet[1]]
-    
-    # Read data from all subsequent rows
-    for row in sheet.iter_rows(min_row=2):
-        row_data = {}
-        for header, cell in zip(headers, row):
-            row_data[header] = str(cell.value).strip() if cell.value is not None else ''
-        rows.append(row_data)
-        
-    print(f"Successfully read {len(rows)} data rows from Excel.")
-    return rows
+    return iter_sheet_rows(workbook, sheet)
+
+
+SYNC_SUMMARY_LABELS = [
+    ('users_added', 'Users added (SE, BM, RH)'),
+    ('users_updated', 'Users updated'),
+    ('db_users_added', 'Distributor (DB) users added'),
+    ('db_users_updated', 'Distributor (DB) users updated'),
+    ('distributors_added', 'Distributors added'),
+    ('distributors_updated', 'Distributors updated'),
+    ('distributors_reassigned', '  of which SE/BM/RH reassigned'),
+    ('users_not_in_sheet', 'Users not in sheet (left as is)'),
+    ('distributors_not_in_sheet', 'Distributors not in sheet (left as is)'),
+]
+
+
+def _print_timings(timings):
+    total = sum(seconds for _, seconds in timings)
+    print("\n--- TIMINGS ---")
+    for stage, seconds in timings:
+        print(f"  {stage:<36} {seconds:8.2f}s")
+    print(f"  {'Total':<36} {total:8.2f}s")
+
 
 def setup_database():
     """
     Clears and seeds the database from the provided Excel file.
     """
     
+    timings = []
+    stage_started = time.perf_counter()
     # --- THIS IS THE FIX: Call the new Excel function ---
     rows = load_data_from_excel(EXCEL_FILE_PATH, SHEET_NAME)
     # --- END OF FIX ---
     
     if rows is None:
         return 
+    # Read the whole sheet before anything is deleted
+    unique_ses, unique_bms, unique_rhs, distributors_to_create = collect_org_mapping(rows)
+    timings.append(('Read Excel file', time.perf_counter() - stage_started))
 
-    with app.app_context():
+    with app.app_context(), ProcessPoolExecutor(max_workers=HASH_WORKERS) as pool:
         # --- STAGE 1: Clear existing data ---
+        stage_started = time.perf_counter()
         try:
             print("Clearing existing data...")
             db.session.query(AssetRequest).delete()
+            db.session.query(RequestStatusCounter).delete()
+            db.session.query(StoredUpload).delete()
+            db.session.query(EmailOutbox).delete()
+            db.session.query(ImportJob).delete()
             
-            for user in User.query.all():
-                user.distributor_id = None
-            db.session.commit()
-            
-            for dist in Distributor.query.all():
-                dist.se_id = None
-                dist.bm_id = None
-                dist.rh_id = None
+            db.session.query(User).update({User.distributor_id: None})
+            db.session.query(Distributor).update({
+                Distributor.se_id: None,
+                Distributor.bm_id: None,
+                Distributor.rh_id: None
+            })
             db.session.commit()
             
             db.session.query(User).delete()
             db.session.query(Distributor).delete()
             db.session.commit()
+            # No requests are left, so the (empty) counters are complete
+            rebuild_status_counters()
             print("Existing data cleared.")
         except Exception as e:
             db.session.rollback()
             print(f"ERROR clearing data: {e}")
             return
+        timings.append(('Clear existing data', time.perf_counter() - stage_started))
 
         # --- STAGE 2: Create all User accounts (SE, BM, RH, Admin) ---
+        stage_started = time.perf_counter()
         print("Finding and creating all unique User accounts...")
         try:
-            unique_ses = {}
-            unique_bms = {}
-            unique_rhs = {}
-            
-            for row in rows:
-                se_code = row.get('SE Emp Code', '').strip()
-                se_name = row.get('SE Name', '').strip()
-                
-                if (se_code == '0' or not se_code or se_code == 'None') and se_name:
-                    se_code = "vacant_" + re.sub(r'[^a-zA-Z0-9]', '_', se_name).lower()
-
-                if se_code and se_code not in unique_ses:
-                    unique_ses[se_code] = {
-                        'name': se_name,
-                        'email': None, 
-                        'role': 'SE',
-                        'so': row.get('SO', '').strip(),
-                        'password': se_code # Rule: SE Pass = SE Emp Code
-                    }
-                
-                bm_code = row.get('BM Emp Code', '').strip()
-                if bm_code and bm_code not in unique_bms:
-                    unique_bms[bm_code] = {
-                        'code': bm_code, 
-                        'password': bm_code, # Rule: BM Pass = BM Emp Code
-                        'name': row.get('BM', '').strip(),
-                        'email': row.get('BM Mail ID', '').strip().lower(),
-                        'role': 'BM'
-                    }
-                    
-                rh_code = row.get('RH Emp Code', '').strip()
-                if rh_code and rh_code not in unique_rhs:
-                    unique_rhs[rh_code] = {
-                        'code': rh_code, 
-                        'password': rh_code, # Rule: RH Pass = RH Emp Code
-                        'name': row.get('RH', '').strip(),
-                        'email': row.get('RH Mail ID', '').strip().lower(),
-                        'role': 'RH'
-                    }
-            
-            user_map_by_emp_code = {} 
-            all_users_to_create = []
-
-            admin_user = User(
-                employee_code='admin', 
-                name='Admin User',
-                email='admin@example.com',
-                role='Admin'
-            )
-            admin_user.set_password(ADMIN_PASSWORD)
-            all_users_to_create.append(admin_user)
-            user_map_by_emp_code[admin_user.employee_code] = admin_user
+            all_users_to_create = {
+                'admin': user_row('admin', 'Admin User', 'Admin', ADMIN_PASSWORD, email='admin@example.com')
+            }
             
             # Process SEs
             for code, data in unique_ses.items():
-                if code in user_map_by_emp_code: continue
-                user = User(
-                    employee_code=code,
-                    name=data['name'],
-                    email=data['email'],
-                    role=data['role'],
-                    so=data['so']
-                )
-                user.set_password(data['password'])
-                all_users_to_create.append(user)
-                user_map_by_emp_code[code] = user
-
-            # Process BMs
-            for code, data in unique_bms.items():
-                if code in user_map_by_emp_code:
-                    print(f"  [WARN] User code {code} (BM) already exists. Skipping.")
-                    continue
-                user = User(
-                    employee_code=code,
-                    name=data['name'],
-                    email=data['email'],
-                    role=data['role']
-                )
-                user.set_password(data['password'])
-                all_users_to_create.append(user)
-                user_map_by_emp_code[code] = user
-                
-            # Process RHs
-            for code, data in unique_rhs.items():
-                if code in user_map_by_emp_code:
-                    print(f"  [WARN] User code {code} (RH) already exists. Skipping.")
-                    continue
-                user = User(
-                    employee_code=code,
-                    name=data['name'],
-                    email=data['email'],
-                    role=data['role']
-                )
-                user.set_password(data['password'])
-                all_users_to_create.append(user)
-                user_map_by_emp_code[code] = user
-
-            db.session.add_all(all_users_to_create)
+                if code in all_users_to_create: continue
+                all_users_to_create[code] = user_row(code, data['name'], data['role'], data['password'],
+                                                      email=data['email'], so=data['so'])
+
+            # Process BMs and RHs
+            for managers in (unique_bms, unique_rhs):
+                for code, data in managers.items():
+                    if code in all_users_to_create:
+                        print(f"  [WARN] User code {code} ({data['role']}) already exists. Skipping.")
+                        continue
+                    all_users_to_create[code] = user_row(code, data['name'], data['role'], data['password'],
+                                                          email=data['email'])
+
+            user_ids_by_emp_code = insert_users(list(all_users_to_create.values()), pool)
             db.session.commit()
             print(f"Successfully created {len(all_users_to_create)} unique users (Admin, SE, BM, RH).")
 
@@ -201,67 +156,44 @@ def setup_database():
             import traceback
             traceback.print_exc()
             return
+        timings.append(('Create users (Admin, SE, BM, RH)', time.perf_counter() - stage_started))
             
         # --- STAGE 3: Create Distributors and DB Users ---
+        stage_started = time.perf_counter()
         print("Creating and linking distributors...")
         try:
-            distributors_to_create = {}
             db_users_to_create = []
-            unique_dist_names = set()
-
-            for row in rows:
-                dist_code = row.get('Distributor Code', '').strip()
-                dist_name = row.get('Distributor Name', 'N/A').strip()
-                
-                if not dist_code or dist_code == 'None' or dist_code in distributors_to_create:
-                    continue 
-                
-                if dist_name in unique_dist_names:
-                    print(f"  [WARN] Distributor name '{dist_name}' (Code: {dist_code}) already exists. Skipping duplicate name.")
-                    continue 
-                
-                se_code = row.get('SE Emp Code', '').strip()
-                if (se_code == '0' or not se_code or se_code == 'None'):
-                    se_code = "vacant_" + re.sub(r'[^a-zA-Z0-9]', '_', row.get('SE Name', '')).lower()
-                se_user = user_map_by_emp_code.get(se_code)
-                
-                bm_user = user_map_by_emp_code.get(row.get('BM Emp Code', '').strip())
-                rh_user = user_map_by_emp_code.get(row.get('RH Emp Code', '').strip())
-
-                dist = Distributor(
-                    code=dist_code,
-                    name=dist_name,
-                    city=row.get('Distributor Town', '').strip(),
-                    state=None,
-                    se_id=se_user.id if se_user else None,
-                    bm_id=bm_user.id if bm_user else None,
-                    rh_id=rh_user.id if rh_user else None
-                )
-                distributors_to_create[dist_code] = dist
-                unique_dist_names.add(dist_name) 
-                db.session.add(dist)
-
-            db.session.commit()
+            dist_rows = [
+                {
+                    'code': data['code'],
+                    'name': data['name'],
+                    'city': data['city'],
+                    'state': None,
+                    'se_id': user_ids_by_emp_code.get(data['se_code']),
+                    'bm_id': user_ids_by_emp_code.get(data['bm_code']),
+                    'rh_id': user_ids_by_emp_code.get(data['rh_code'])
+                }
+                for data in distributors_to_create.values()
+            ]
+
+            dist_ids_by_code = insert_distributors(dist_rows)
             print(f"Successfully created {len(distributors_to_create)} distributors.")
             
             print("Creating Distributor (DB) user accounts...")
-            for dist_code, dist_obj in distributors_to_create.items():
-                if dist_code in user_map_by_emp_code:
+            for dist_code, dist_data in distributors_to_create.items():
+                if dist_code in user_ids_by_emp_code:
                     print(f"  [WARN] User with code '{dist_code}' already exists (likely an SE). Skipping DB user creation.")
                     continue
 
-                db_user = User(
-                    employee_code=dist_code, # Rule: DB Login = Dist Code
-                    name=f"{dist_obj.name} (DB)",
-                    role='DB',
-                    email=None,
-                    distributor_id=dist_obj.id
-                )
-                db_user.set_password(dist_code) # Rule: DB Pass = Dist Code
-                db_users_to_create.append(db_user)
-                user_map_by_emp_code[dist_code] = db_user
+                db_users_to_create.append(user_row(
+                    dist_code, # Rule: DB Login = Dist Code
+                    f"{dist_data['name']} (DB)",
+                    'DB',
+                    dist_code, # Rule: DB Pass = Dist Code
+                    distributor_id=dist_ids_by_code[dist_code]
+                ))
             
-            db.session.add_all(db_users_to_create)
+            user_ids_by_emp_code.update(insert_users(db_users_to_create, pool))
             db.session.commit()
             print(f"Successfully created {len(db_users_to_create)} Distributor (DB) user accounts.")
             
@@ -272,59 +204,39 @@ def setup_database():
             import traceback
             traceback.print_exc()
             return
+        timings.append(('Create distributors and DB users', time.perf_counter() - stage_started))
 
         # --- STAGE 4: Create Test Users ---
+        stage_started = time.perf_counter()
         print("Creating test users...")
         try:
-            test_users = []
-            test_distributors = []
-
-            # Test Admins
-            test_admin_1 = User(employee_code='testadmin1', name='Test Admin 1', role='Admin', email='admin1@test.com')
-            test_admin_1.set_password('testadmin1')
-            test_admin_2 = User(employee_code='testadmin2', name='Test Admin 2', role='Admin', email='admin2@test.com')
-            test_admin_2.set_password('testadmin2')
-            test_users.extend([test_admin_1, test_admin_2])
-
-            # Test SEs
-            test_se_1 = User(employee_code='testse1', name='Test SE 1', role='SE', so='TEST-SO')
-            test_se_1.set_password('testse1')
-            test_se_2 = User(employee_code='testse2', name='Test SE 2', role='SE', so='TEST-SO')
-            test_se_2.set_password('testse2')
-            test_users.extend([test_se_1, test_se_2])
-
-            # Test BMs
-            test_bm_1 = User(employee_code='testbm1', name='Test BM 1', role='BM', email='bm1@test.com')
-            test_bm_1.set_password('testbm1')
-            test_bm_2 = User(employee_code='testbm2', name='Test BM 2', role='BM', email='bm2@test.com')
-            test_bm_2.set_password('testbm2')
-            test_users.extend([test_bm_1, test_bm_2])
-
-            # Test RHs
-            test_rh_1 = User(employee_code='testrh1', name='Test RH 1', role='RH', email='rh1@test.com')
-            test_rh_1.set_password('testrh1')
-            test_rh_2 = User(employee_code='testrh2', name='Test RH 2', role='RH', email='rh2@test.com')
-            test_rh_2.set_password('testrh2')
-            test_users.extend([test_rh_1, test_rh_2])
-            
-            db.session.add_all(test_users)
-            db.session.commit() # Commit users first to get IDs
+            # Test Admins, SEs, BMs and RHs (Username is Password)
+            test_users = [
+                user_row('testadmin1', 'Test Admin 1', 'Admin', 'testadmin1', email='admin1@test.com'),
+                user_row('testadmin2', 'Test Admin 2', 'Admin', 'testadmin2', email='admin2@test.com'),
+                user_row('testse1', 'Test SE 1', 'SE', 'testse1', so='TEST-SO'),
+                user_row('testse2', 'Test SE 2', 'SE', 'testse2', so='TEST-SO'),
+                user_row('testbm1', 'Test BM 1', 'BM', 'testbm1', email='bm1@test.com'),
+                user_row('testbm2', 'Test BM 2', 'BM', 'testbm2', email='bm2@test.com'),
+                user_row('testrh1', 'Test RH 1', 'RH', 'testrh1', email='rh1@test.com'),
+                user_row('testrh2', 'Test RH 2', 'RH', 'testrh2', email='rh2@test.com'),
+            ]
+            test_ids = insert_users(test_users, pool)
 
             # Test Distributors (linked to test managers)
-            test_dist_1 = Distributor(code='TESTDIST1', name='Test Distributor 1', city='Test City', se_id=test_se_1.id, bm_id=test_bm_1.id, rh_id=test_rh_1.id)
-            test_dist_2 = Distributor(code='TESTDIST2', name='Test Distributor 2', city='Test City', se_id=test_se_2.id, bm_id=test_bm_2.id, rh_id=test_rh_2.id)
-            test_distributors.extend([test_dist_1, test_dist_2])
-            
-            db.session.add_all(test_distributors)
-            db.session.commit() # Commit distributors to get IDs
+            test_distributors = [
+                {'code': f'TESTDIST{n}', 'name': f'Test Distributor {n}', 'city': 'Test City', 'state': None,
+                 'se_id': test_ids[f'testse{n}'], 'bm_id': test_ids[f'testbm{n}'], 'rh_id': test_ids[f'testrh{n}']}
+                for n in (1, 2)
+            ]
+            test_dist_ids = insert_distributors(test_distributors)
 
             # Test DB Users (linked to test distributors)
-            test_db_1 = User(employee_code='testdb1', name='Test DB User 1', role='DB', distributor_id=test_dist_1.id)
-            test_db_1.set_password('testdb1')
-            test_db_2 = User(employee_code='testdb2', name='Test DB User 2', role='DB', distributor_id=test_dist_2.id)
-            test_db_2.set_password('testdb2')
-
-            db.session.add_all([test_db_1, test_db_2])
+            insert_users([
+                user_row(f'testdb{n}', f'Test DB User {n}', 'DB', f'testdb{n}',
+                         distributor_id=test_dist_ids[f'TESTDIST{n}'])
+                for n in (1, 2)
+            ], pool)
             db.session.commit()
             
             print(f"Successfully created {len(test_users) + 2} test users and {len(test_distributors)} test distributors.")
@@ -335,6 +247,7 @@ def setup_database():
             print(f"An error occurred: {e}")
             import traceback
             traceback.print_exc()
+        timings.append(('Create test users', time.perf_counter() - stage_started))
 
         # --- STAGE 5: Final Summary ---
         print("\n" + "="*60)
@@ -363,7 +276,7 @@ def setup_database():
         print("  (Distributor Code is Employee Code AND Password)")
         for code, data in distributors_to_create.items(): 
             if code not in unique_ses:
-                print(f"  - {code} ({data.name})")
+                print(f"  - {code} ({data['name']})")
         
         print("\n" + "="*60)
         print("\n--- TEST USER LOGIN CREDENTIALS ---")
@@ -384,7 +297,60 @@ def setup_database():
         print("  - testdb1 / testdb1")
         print("  - testdb2 / testdb2")
         
+        _print_timings(timings)
         print("="*60)
 
+def sync_database(dry_run=False):
+    """
+    Applies only the differences between the Excel file and the current
+    users / distributors. Nothing is deleted, so requests are kept and the
+    script can be run against production.
+    """
+    timings = []
+    stage_started = time.perf_counter()
+    rows = load_data_from_excel(EXCEL_FILE_PATH, SHEET_NAME)
+    if rows is None:
+        return
+    mapping = collect_org_mapping(rows)
+    timings.append(('Read Excel file', time.perf_counter() - stage_started))
+
+    with app.app_context(), ProcessPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        stage_started = time.perf_counter()
+        print("Syncing users and distributors...")
+        try:
+            summary, changes = sync_org_mapping(mapping, pool)
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"--- ERROR Syncing Org Mapping ---")
+            print(f"An error occurred: {e}")
+            import traceback
+            traceback.print_exc()
+            return
+        timings.append(('Sync users and distributors', time.perf_counter() - stage_started))
+
+    print("\n" + "="*60)
+    print("DRY RUN - NOTHING WAS SAVED" if dry_run else "ORG MAPPING SYNCED")
+    print("="*60)
+    for line in changes:
+        print(f"  {line}")
+    print("\n--- CHANGE SUMMARY ---")
+    for key, label in SYNC_SUMMARY_LABELS:
+        print(f"  {label:<40} {summary[key]:>6}")
+    _print_timings(timings)
+    print("="*60)
+
+
 if __name__ == '__main__':
-    setup_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed or sync users and distributors from the mapping Excel file.")
+    parser.add_argument('--sync', action='store_true',
+                        help="Apply only the changes instead of wiping and reloading the database.")
+    parser.add_argument('--dry-run', action='store_true', help="With --sync: report the changes without saving them.")
+    args = parser.parse_args()
+    if args.sync:
+        sync_database(dry_run=args.dry_run)
+    else:
+        setup_database()
\ No newline at end of file
@@ -5,6 +5,16 @@ from wtforms.validators import DataRequired, Length, Optional, Email
 from flask_wtf.file import FileField, FileRequired, FileAllowed
 
 
+class CapturedPhotoField(HiddenField):
+    """
+    Camera photo: a multipart file part (canvas.toBlob) or, from older
+    clients, a base64 data URL in the hidden input.
+    """
+    def _value(self):
+        # Never echo an uploaded file back into the hidden input
+        return self.data if isinstance(self.data, str) else ''
+
+
 # --- UPDATED LoginForm ---
 class LoginForm(FlaskForm):
     """Form for user login."""
@@ -48,6 +58,13 @@ class UserForm(FlaskForm):
                              ])
     confirm_password = PasswordField('Confirm Password')
     distributor_id = SelectField('Assign to Distributor (if role is "Distributor")', coerce=int, validators=[Optional()])
+    notification_mode = SelectField('Approval Emails',
+                                    choices=[
+                                        ('immediate', 'Immediate (one email per request)'),
+                                        ('digest', 'Digest (periodic summary of waiting requests)')
+                                    ],
+                                    default='immediate',
+                                    validators=[DataRequired()])
     submit = SubmitField('Save User')
 
 
@@ -111,7 +128,7 @@ class AssetRequestForm(FlaskForm):
     willing_for_signage = SelectField('Willing for HFL Signage?',
                                       choices=[('', 'Select'), ('Yes', 'Yes'), ('No', 'No')],
                                       validators=[DataRequired(message="Please select an option.")])
-    captured_photo = HiddenField('Captured Photo Data', validators=[DataRequired(message="Please capture a photo.")])
+    captured_photo = CapturedPhotoField('Captured Photo Data', validators=[DataRequired(message="Please capture a photo.")])
     distributor_code_hidden = HiddenField("Distributor Code")
     distributor_town_hidden = HiddenField("Distributor Town")
     bm_email_hidden = HiddenField("BM Email")
@@ -122,7 +139,7 @@ class AssetRequestForm(FlaskForm):
     longitude = HiddenField('Longitude', validators=[
         DataRequired(message="Geolocation is required. Please use the 'Get Location' button.")
     ])
-    captured_photo = HiddenField('Shop Photo', validators=[
+    captured_photo = CapturedPhotoField('Shop Photo', validators=[
         DataRequired(message="A shop photo is required. Please use the camera.")
     ])
     submit = SubmitField('Submit Request')
@@ -143,11 +160,20 @@ class DistributorForm(FlaskForm):
     submit = SubmitField('Save Distributor')
 
 
+class MappingImportForm(FlaskForm):
+    """Form for admins to upload the DB vs EMP mapping workbook."""
+    mapping_file = FileField('Mapping Workbook (.xlsx)', validators=[
+        FileRequired(message="Please choose a file."),
+        FileAllowed(['xlsx'], 'Only .xlsx files are allowed.')
+    ])
+    submit = SubmitField('Upload and Import')
+
+
 # DeploymentForm remains the same
 class DeploymentForm(FlaskForm):
     """Form for SE to confirm asset deployment."""
     deployed_make = StringField('Asset Make/Manufacturer', validators=[DataRequired(), Length(max=100)])
     deployed_serial_no = StringField('Asset Serial Number', validators=[DataRequired(), Length(max=100)])
-    deployment_photo1 = HiddenField('Photo 1 Data', validators=[DataRequired(message="Please capture the first photo.")])
-    deployment_photo2 = HiddenField('Photo 2 Data', validators=[DataRequired(message="Please capture the second photo.")])
+    deployment_photo1 = CapturedPhotoField('Photo 1 Data', validators=[DataRequired(message="Please capture the first photo.")])
+    deployment_photo2 = CapturedPhotoField('Photo 2 Data', validators=[DataRequired(message="Please capture the second photo.")])
     submit = SubmitField('Confirm Deployment')
\ No newline at end of file
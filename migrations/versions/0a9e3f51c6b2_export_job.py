@@ -0,0 +1,57 @@
+"""export_job
+
+Background Excel exports. The partial unique index allows one active job
+per filter and data snapshot.
+
+Revision ID: 0a9e3f51c6b2
+Revises: f2c6d9a07b48
+Create Date: 2026-10-17 08:03:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9e3f51c6b2'
+down_revision = 'f2c6d9a07b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('export_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('filter_hash', sa.String(length=64), nullable=False),
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('data_fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('rows_total', sa.Integer(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.String(length=300), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('requested_by_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['requested_by_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_export_job_filter_hash'), ['filter_hash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_export_job_requested_by_id'), ['requested_by_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_export_job_status'), ['status'], unique=False)
+        batch_op.create_index('uq_export_job_active', ['filter_hash', 'data_fingerprint'], unique=True,
+                              sqlite_where=sa.text("status IN ('queued', 'running', 'done')"),
+                              postgresql_where=sa.text("status IN ('queued', 'running', 'done')"))
+
+
+def downgrade():
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.drop_index('uq_export_job_active')
+        batch_op.drop_index(batch_op.f('ix_export_job_status'))
+        batch_op.drop_index(batch_op.f('ix_export_job_requested_by_id'))
+        batch_op.drop_index(batch_op.f('ix_export_job_filter_hash'))
+
+    op.drop_table('export_job')
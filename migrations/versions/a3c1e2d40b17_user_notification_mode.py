@@ -0,0 +1,32 @@
+"""user notification_mode / digest_sent_at
+
+Approval email preference of BMs / RHs and when their last digest was
+queued. Existing users get 'immediate', the behaviour before digests.
+
+Revision ID: a3c1e2d40b17
+Revises: 893366dfded0
+Create Date: 2026-10-17 07:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c1e2d40b17'
+down_revision = '893366dfded0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notification_mode', sa.String(length=20), nullable=False,
+                                      server_default='immediate'))
+        batch_op.add_column(sa.Column('digest_sent_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('digest_sent_at')
+        batch_op.drop_column('notification_mode')
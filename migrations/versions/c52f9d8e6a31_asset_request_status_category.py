@@ -0,0 +1,104 @@
+"""asset_request updated_at, status_category / status_code
+
+updated_at is the last-modified watermark of the incremental export feed;
+existing rows get their last known change, coalesce(deployment_date,
+request_date). status_category / status_code are derived from the
+free-text status, so the dashboard "all pending" / "all
+rejected" filters and counts are index range scans instead of LIKE
+'%...%' scans. Existing rows are backfilled from status; the columns
+become NOT NULL once every row has a value (rows with a status missing
+from the maps below are reported and keep the columns nullable).
+
+Revision ID: c52f9d8e6a31
+Revises: a3c1e2d40b17
+Create Date: 2026-10-17 07:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52f9d8e6a31'
+down_revision = 'a3c1e2d40b17'
+branch_labels = None
+depends_on = None
+
+# models.STATUS_CATEGORIES / STATUS_CODES as of this revision
+STATUS_CATEGORIES = {
+    'Pending BM Approval': 'pending',
+    'Pending RH Approval': 'pending',
+    'Approved': 'approved',
+    'Deployed': 'deployed',
+    'Rejected by BM': 'rejected',
+    'Rejected by RH': 'rejected',
+    'Rejected by Admin': 'rejected',
+}
+STATUS_CODES = {
+    'Pending BM Approval': 1,
+    'Pending RH Approval': 2,
+    'Approved': 3,
+    'Deployed': 4,
+    'Rejected by BM': 5,
+    'Rejected by RH': 6,
+    'Rejected by Admin': 7,
+}
+
+asset_request = sa.table(
+    'asset_request',
+    sa.column('status', sa.String),
+    sa.column('status_category', sa.String),
+    sa.column('status_code', sa.SmallInteger),
+    sa.column('request_date', sa.DateTime),
+    sa.column('deployment_date', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('asset_request', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('status_category', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('status_code', sa.SmallInteger(), nullable=True))
+
+    op.execute(asset_request.update().values(
+        updated_at=sa.func.coalesce(asset_request.c.deployment_date, asset_request.c.request_date)
+    ))
+    status = asset_request.c.status
+    op.execute(
+        asset_request.update()
+        .where(status.in_(list(STATUS_CODES)))
+        .values(status_category=sa.case(STATUS_CATEGORIES, value=status),
+                status_code=sa.case(STATUS_CODES, value=status))
+    )
+    unknown = op.get_bind().execute(
+        sa.select(status).distinct().where(status.notin_(list(STATUS_CODES)))
+    ).scalars().all()
+
+    with op.batch_alter_table('asset_request', schema=None) as batch_op:
+        if unknown:
+            print(f"WARN: Statuses {unknown} have no category; status_category / status_code stay nullable.")
+        else:
+            batch_op.alter_column('status_category', existing_type=sa.String(length=10), nullable=False)
+            batch_op.alter_column('status_code', existing_type=sa.SmallInteger(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_asset_request_updated_at'), ['updated_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_asset_request_status_category'), ['status_category'], unique=False)
+        batch_op.create_index(batch_op.f('ix_asset_request_status_code'), ['status_code'], unique=False)
+        batch_op.create_index('ix_asset_request_category_date', ['status_category', 'request_date'], unique=False)
+        batch_op.create_index('ix_asset_request_distributor_category_date',
+                              ['distributor_id', 'status_category', 'request_date'], unique=False)
+        batch_op.create_index('ix_asset_request_requester_category_date',
+                              ['requester_id', 'status_category', 'request_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('asset_request', schema=None) as batch_op:
+        batch_op.drop_index('ix_asset_request_requester_category_date')
+        batch_op.drop_index('ix_asset_request_distributor_category_date')
+        batch_op.drop_index('ix_asset_request_category_date')
+        batch_op.drop_index(batch_op.f('ix_asset_request_status_code'))
+        batch_op.drop_index(batch_op.f('ix_asset_request_status_category'))
+        batch_op.drop_index(batch_op.f('ix_asset_request_updated_at'))
+        batch_op.drop_column('status_code')
+        batch_op.drop_column('status_category')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,35 @@
+"""request_status_counter
+
+Per-scope request counts for the dashboard. The table starts empty and
+the dashboard ignores it until `flask rebuild-status-counters` has run.
+
+Revision ID: d17a4b3c9e02
+Revises: c52f9d8e6a31
+Create Date: 2026-10-17 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd17a4b3c9e02'
+down_revision = 'c52f9d8e6a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('request_status_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=20), nullable=False),
+    sa.Column('scope_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scope', 'scope_id', 'status', name='uq_status_counter_scope_status')
+    )
+
+
+def downgrade():
+    op.drop_table('request_status_counter')
@@ -0,0 +1,35 @@
+"""stored_upload
+
+Reference counts of content-addressed photo files. `flask migrate-uploads`
+moves flat uploads into that layout and fills the table.
+
+Revision ID: e84b20f6a1d5
+Revises: d17a4b3c9e02
+Create Date: 2026-10-17 08:01:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e84b20f6a1d5'
+down_revision = 'd17a4b3c9e02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_upload',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=80), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('filename')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_upload')
@@ -1,8 +1,44 @@
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash
 from assetify_app import db  # Use the db instance from the app factory
 
+# --- Status categories ---
+# Every request status belongs to one category. asset_request.status_category
+# stores it, indexed together with the scope columns, so "all pending" /
+# "all rejected" filters and counts are index range scans.
+STATUS_CATEGORIES = {
+    'Pending BM Approval': 'pending',
+    'Pending RH Approval': 'pending',
+    'Approved': 'approved',
+    'Deployed': 'deployed',
+    'Rejected by BM': 'rejected',
+    'Rejected by RH': 'rejected',
+    'Rejected by Admin': 'rejected',
+}
+CATEGORIES = ('pending', 'approved', 'deployed', 'rejected')
+
+# Compact code of each status (asset_request.status_code), used by the exact
+# status filters. Stored in the database: never renumber, only append.
+STATUS_CODES = {
+    'Pending BM Approval': 1,
+    'Pending RH Approval': 2,
+    'Approved': 3,
+    'Deployed': 4,
+    'Rejected by BM': 5,
+    'Rejected by RH': 6,
+    'Rejected by Admin': 7,
+}
+
+
+def _from_status(mapping):
+    """Insert default: `mapping` applied to the row's status (ORM and bulk Core inserts)."""
+    def default(context):
+        return mapping.get(context.get_current_parameters().get('status'))
+    return default
+
+
 class User(UserMixin, db.Model):
     """User model for authentication and roles."""
     id = db.Column(db.Integer, primary_key=True)
@@ -21,6 +57,10 @@ class User(UserMixin, db.Model):
     
     # --- ADDED index=True (Foreign Key) ---
     distributor_id = db.Column(db.Integer, db.ForeignKey('distributor.id'), nullable=True, index=True)
+
+    # --- Approval emails: 'immediate' (one per request) or 'digest' (periodic summary) ---
+    notification_mode = db.Column(db.String(20), nullable=False, default='immediate', server_default='immediate')
+    digest_sent_at = db.Column(db.DateTime, nullable=True)
     
     requests = db.relationship('AssetRequest', foreign_keys='AssetRequest.requester_id', backref='requester', lazy=True)
     assigned_distributors = db.relationship('Distributor', foreign_keys='Distributor.se_id', backref='sales_executive', lazy=True)
@@ -73,6 +113,10 @@ class AssetRequest(db.Model):
     
     # --- ADDED index=True (Common Filter) ---
     status = db.Column(db.String(50), nullable=False, default='Pending BM Approval', index=True)
+    # Derived from status (see STATUS_CATEGORIES / STATUS_CODES); ORM assignments keep
+    # them in step, bulk UPDATEs of status must set them too
+    status_category = db.Column(db.String(10), nullable=False, index=True, default=_from_status(STATUS_CATEGORIES))
+    status_code = db.Column(db.SmallInteger, nullable=False, index=True, default=_from_status(STATUS_CODES))
     
     asset_model = db.Column(db.String(100), nullable=False)
     category = db.Column(db.String(100), nullable=False)
@@ -117,9 +161,147 @@ class AssetRequest(db.Model):
     # --- ADDED index=True (Foreign Key) ---
     deployed_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     
+    # --- Last-modified timestamp (drives the incremental DMS export feed) ---
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
     bm_approver = db.relationship('User', foreign_keys=[bm_approver_id])
     rh_approver = db.relationship('User', foreign_keys=[rh_approver_id])
     deployed_by = db.relationship('User', foreign_keys=[deployed_by_id])
 
+    # Dashboard / export scopes filtered by category, newest first
+    __table_args__ = (
+        db.Index('ix_asset_request_distributor_category_date', 'distributor_id', 'status_category', 'request_date'),
+        db.Index('ix_asset_request_requester_category_date', 'requester_id', 'status_category', 'request_date'),
+        db.Index('ix_asset_request_category_date', 'status_category', 'request_date'),
+    )
+
+    def __repr__(self):
+        return f'<AssetRequest ID: {self.id} for {self.distributor.name}>'
+
+
+@event.listens_for(AssetRequest.status, 'set')
+def _set_status_category(target, value, oldvalue, initiator):
+    target.status_category = STATUS_CATEGORIES.get(value)
+    target.status_code = STATUS_CODES.get(value)
+
+class RequestStatusCounter(db.Model):
+    """Per-scope request counts by status, updated with every status change."""
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # 'all', 'requester', 'distributor', 'bm' or 'rh'
+    scope = db.Column(db.String(20), nullable=False)
+    scope_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_id', 'status', name='uq_status_counter_scope_status'),
+    )
+
+    def __repr__(self):
+        return f'<RequestStatusCounter {self.scope}:{self.scope_id} {self.status}={self.count}>'
+
+
+class StoredUpload(db.Model):
+    """One content-addressed file in UPLOAD_FOLDER and how many request photo columns point at it."""
+    id = db.Column(db.Integer, primary_key=True)
+
+    # '<sha256>.<ext>', the value stored in photo_filename / deployment_photo*_filename
+    filename = db.Column(db.String(80), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredUpload {self.filename} refs={self.ref_count}>'
+
+
+class EmailOutbox(db.Model):
+    """A rendered notification email, written in the same transaction as the change it reports."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+
+    # 'pending', 'sending', 'sent' or 'dead' (gave up; see last_error)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Earliest time of the next attempt (for 'sending', when the claim expires)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(36), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox #{self.id} {self.status} to {self.recipient}>'
+
+
+class ExportJob(db.Model):
+    """Background DMS export, reused while the matching requests are unchanged."""
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # sha256 of (role scope, start_date, end_date, requester, status, category)
+    filter_hash = db.Column(db.String(64), nullable=False, index=True)
+    scope = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON: scope user + filter args
+    
+    # Snapshot of the matching AssetRequest rows when the job was queued
+    data_fingerprint = db.Column(db.String(64), nullable=False)
+    
+    # queued -> running -> done / failed
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    rows_total = db.Column(db.Integer, nullable=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(300), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Bumped by every progress commit; a queued/running job that stops moving was abandoned
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    requested_by = db.relationship('User', foreign_keys=[requested_by_id])
+
+    __table_args__ = (
+        # At most one queued, running or reusable job per filter + data snapshot
+        db.Index(
+            'uq_export_job_active', 'filter_hash', 'data_fingerprint', unique=True,
+            sqlite_where=db.text("status IN ('queued', 'running', 'done')"),
+            postgresql_where=db.text("status IN ('queued', 'running', 'done')")
+        ),
+    )
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.status}>'
+
+
+class ImportJob(db.Model):
+    """Background import of an uploaded org mapping workbook (users and distributors)."""
+    id = db.Column(db.Integer, primary_key=True)
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(300), nullable=True)
+
+    # queued -> validating -> applying -> done / failed
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    rows_total = db.Column(db.Integer, nullable=True)  # data rows in the sheet (estimate until validated)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    entities_total = db.Column(db.Integer, nullable=True)  # unique users + distributors to apply
+    entities_done = db.Column(db.Integer, nullable=False, default=0)
+    summary = db.Column(db.Text, nullable=True)  # JSON: counts from sync_org_mapping()
+    row_errors = db.Column(db.Text, nullable=True)  # JSON: [[sheet row, code, message], ...]
+    error = db.Column(db.Text, nullable=True)
+
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    requested_by = db.relationship('User', foreign_keys=[requested_by_id])
+
     def __repr__(self):
-        return f'<AssetRequest ID: {self.id} for {self.distributor.name}>'
\ No newline at end of file
+        return f'<ImportJob {self.id} {self.status}>'
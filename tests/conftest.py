@@ -0,0 +1,67 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('SECRET_KEY', 'test')
+
+from assetify_app import create_app, db
+from assetify_app.synthetic import generate_synthetic_data
+from models import User
+
+PASSWORD = 'synthetic'
+ADMIN_CODE = 'SYNADMIN001'
+ROLES = ('SE', 'DB', 'BM', 'RH', 'Admin')
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """One app on a small seeded synthetic dataset, with query budgets enforced."""
+    work_dir = tmp_path_factory.mktemp('assetify')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(work_dir / 'test.db'),
+        'UPLOAD_FOLDER': str(work_dir / 'uploads'),
+        'EXPORT_FOLDER': str(work_dir / 'exports'),
+        'IMPORT_FOLDER': str(work_dir / 'imports'),
+        'WTF_CSRF_ENABLED': False,
+        'QUERY_BUDGET_STRICT': True,
+    })
+    with app.app_context():
+        db.create_all()
+        generate_synthetic_data(7, regions=2, bms_per_region=2, distributors_per_bm=4, distributors_per_se=2,
+                                requests=300, days=90, batch_size=100, password=PASSWORD,
+                                end_date=date(2026, 1, 1), photos=2)
+        admin = User(employee_code=ADMIN_CODE, name='Synthetic Admin', role='Admin')
+        admin.set_password(PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+        db.session.remove()
+    return app
+
+
+@pytest.fixture(scope='session')
+def users(app):
+    """The first synthetic account of each role, as {role: (id, employee_code)}."""
+    with app.app_context():
+        return {
+            role: db.session.query(User.id, User.employee_code).filter(User.role == role)
+            .order_by(User.employee_code).first()
+            for role in ROLES
+        }
+
+
+@pytest.fixture(params=ROLES)
+def role(request):
+    return request.param
+
+
+@pytest.fixture
+def client(app, users, role):
+    """A test client logged in as `role`."""
+    client = app.test_client()
+    response = client.post('/login', data={'employee_code': users[role].employee_code, 'password': PASSWORD})
+    assert response.status_code == 302
+    return client
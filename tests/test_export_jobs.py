@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from assetify_app import export_jobs
+from assetify_app.export_jobs import fail_abandoned_export_jobs, request_export_job
+from conftest import PASSWORD
+from models import db, Distributor, ExportJob, User
+
+
+@pytest.fixture
+def admin(app, users):
+    with app.app_context():
+        yield db.session.get(User, users['Admin'].id)
+
+
+def test_same_filters_reuse_one_job(app, admin):
+    first = request_export_job(admin, {'status': 'Approved'})
+    second = request_export_job(admin, {'status': 'Approved'})
+    assert second.id == first.id
+
+
+def test_renamed_distributor_retires_the_reused_file(app, admin, monkeypatch):
+    monkeypatch.setattr(export_jobs, '_get_executor', lambda app: _DeadPool())
+    job = request_export_job(admin, {'status': 'Rejected by RH'})
+    job.status = 'done'
+    db.session.commit()
+
+    distributor = db.session.query(Distributor).order_by(Distributor.id).first()
+    old_name = distributor.name
+    distributor.name = f'{old_name} (renamed)'
+    db.session.commit()
+    try:
+        rebuilt = request_export_job(admin, {'status': 'Rejected by RH'})
+        assert rebuilt.id != job.id
+        assert rebuilt.data_fingerprint != job.data_fingerprint
+        assert db.session.get(ExportJob, job.id).status == 'failed'
+    finally:
+        distributor.name = old_name
+        db.session.commit()
+
+
+def test_racing_requests_share_the_job_that_won(app, admin, monkeypatch):
+    winner = request_export_job(admin, {'status': 'Deployed'})
+    lookups = []
+    real_active_job = export_jobs._active_job
+
+    def active_job_missed_by_the_first_lookup(filter_hash, fingerprint):
+        # The losing request looked before the winner committed
+        lookups.append(filter_hash)
+        return None if len(lookups) == 1 else real_active_job(filter_hash, fingerprint)
+
+    monkeypatch.setattr(export_jobs, '_active_job', active_job_missed_by_the_first_lookup)
+    loser = request_export_job(admin, {'status': 'Deployed'})
+    assert loser.id == winner.id
+    assert ExportJob.query.filter_by(filter_hash=winner.filter_hash).count() == 1
+
+
+def test_only_one_active_job_per_filter_and_snapshot(app, admin):
+    job = request_export_job(admin, {'status': 'Rejected by BM'})
+    db.session.add(ExportJob(filter_hash=job.filter_hash, scope=job.scope, params=job.params,
+                             data_fingerprint=job.data_fingerprint, status='queued', requested_by_id=admin.id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+class _DeadPool:
+    """Stands in for an export pool whose process died before running anything."""
+
+    def submit(self, fn, *args):
+        pass
+
+
+def test_abandoned_job_is_failed_and_requeued(app, admin, monkeypatch):
+    monkeypatch.setattr(export_jobs, '_get_executor', lambda app: _DeadPool())
+    job_id = request_export_job(admin, {'status': 'Pending RH Approval'}).id
+    long_ago = datetime.utcnow() - timedelta(minutes=app.config['EXPORT_JOB_STALE_MINUTES'] + 1)
+    ExportJob.query.filter_by(id=job_id).update(
+        {ExportJob.status: 'running', ExportJob.updated_at: long_ago}, synchronize_session=False
+    )
+    db.session.commit()
+
+    assert fail_abandoned_export_jobs() == 1
+    assert db.session.get(ExportJob, job_id).status == 'failed'
+    monkeypatch.undo()
+    assert request_export_job(admin, {'status': 'Pending RH Approval'}).id != job_id
+
+
+def test_poll_reports_an_abandoned_job_as_failed(app, admin, monkeypatch):
+    monkeypatch.setattr(export_jobs, '_get_executor', lambda app: _DeadPool())
+    job_id = request_export_job(admin, {'status': 'Approved', 'category': 'approved'}).id
+    long_ago = datetime.utcnow() - timedelta(minutes=app.config['EXPORT_JOB_STALE_MINUTES'] + 1)
+    ExportJob.query.filter_by(id=job_id).update({ExportJob.updated_at: long_ago}, synchronize_session=False)
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'employee_code': admin.employee_code, 'password': PASSWORD})
+    payload = client.get(f'/export/jobs/{job_id}').get_json()
+    assert payload['status'] == 'failed'
@@ -0,0 +1,129 @@
+import openpyxl
+import pytest
+
+from assetify_app import db, import_jobs
+from assetify_app.import_jobs import MAPPING_SHEET_NAME, REQUIRED_HEADERS, import_job_payload
+from conftest import PASSWORD
+from models import Distributor, ImportJob, User
+
+
+class _CapturingPool:
+    """Holds the submitted import so the test runs it synchronously."""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, args))
+
+
+def _mapping_row(dist_code, dist_name, bm_email='imp.bm1@example.com'):
+    return {
+        'Distributor Code': dist_code, 'Distributor Name': dist_name, 'Distributor Town': 'Importville',
+        'BM': 'Import BM', 'BM Emp Code': 'IMPBM1', 'BM Mail ID': bm_email,
+        'RH': 'Import RH', 'RH Emp Code': 'IMPRH1', 'RH Mail ID': 'imp.rh1@example.com',
+        'SO': 'Import SO', 'SE Emp Code': 'IMPSE1', 'SE Name': 'Import SE'
+    }
+
+
+def _workbook(path, rows, sheet_title=MAPPING_SHEET_NAME, headers=REQUIRED_HEADERS):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = sheet_title
+    sheet.append(list(headers))
+    for row in rows:
+        sheet.append([row.get(header, '') for header in headers])
+    workbook.save(path)
+    return path
+
+
+@pytest.fixture
+def admin_client(app, users):
+    client = app.test_client()
+    client.post('/login', data={'employee_code': users['Admin'].employee_code, 'password': PASSWORD})
+    return client
+
+
+def _run_import(app, client, path, monkeypatch):
+    """Uploads the workbook, runs the queued job in this thread and returns its status payload."""
+    pool = _CapturingPool()
+    monkeypatch.setattr(import_jobs, '_get_executor', lambda app: pool)
+    with open(path, 'rb') as f:
+        response = client.post('/admin/import', data={'mapping_file': (f, 'mapping.xlsx')},
+                               content_type='multipart/form-data')
+    assert response.status_code == 302
+    (fn, args), = pool.calls
+    fn(*args)
+    job_id = args[1]
+    payload = client.get(f'/admin/import/{job_id}/status').get_json()
+    assert payload['ok'] and payload['job_id'] == job_id
+    return payload
+
+
+def test_bad_rows_are_reported_and_the_rest_applied(app, admin_client, tmp_path, monkeypatch, capsys):
+    with app.app_context():
+        taken_name = db.session.query(Distributor.name).order_by(Distributor.id).limit(1).scalar()
+    path = _workbook(tmp_path / 'mapping.xlsx', [
+        _mapping_row('IMP-D1', 'Import Distributor One'),
+        _mapping_row('IMP-D2', 'Import Distributor Two', bm_email='not-an-email'),
+        _mapping_row('IMP-D3', taken_name),  # passes validation, fails the unique name on insert
+        _mapping_row('IMP-D4', 'Import Distributor Four'),
+    ])
+
+    payload = _run_import(app, admin_client, path, monkeypatch)
+    assert payload['status'] == 'done' and payload['progress'] == 100.0
+    assert (payload['rows_total'], payload['rows_done']) == (4, 4)
+    assert payload['entities_done'] == payload['entities_total']
+    assert payload['summary']['distributors_added'] == 2
+    assert payload['error_count'] == 2
+
+    # The distributor chunk failed as a whole and was retried entry by entry
+    assert 'retrying row by row' in capsys.readouterr().out
+    with app.app_context():
+        job = db.session.get(ImportJob, payload['job_id'])
+        errors = {row: (code, message) for row, code, message in import_jobs.import_job_errors(job)}
+        assert errors[3][0] == 'IMP-D2' and "BM Mail ID 'not-an-email'" in errors[3][1]
+        assert errors[4][0] == 'IMP-D3' and errors[4][1].startswith('Could not be saved:')
+
+        imported = {d.code: d for d in Distributor.query.filter(Distributor.code.like('IMP-D%'))}
+        assert set(imported) == {'IMP-D1', 'IMP-D4'}
+        bm = User.query.filter_by(employee_code='IMPBM1').one()
+        assert (bm.role, bm.email) == ('BM', 'imp.bm1@example.com')
+        assert imported['IMP-D1'].bm_id == bm.id
+        assert User.query.filter_by(employee_code='IMP-D4', role='DB').one().distributor_id == imported['IMP-D4'].id
+
+
+def test_missing_columns_fail_the_job(app, admin_client, tmp_path, monkeypatch):
+    headers = [header for header in REQUIRED_HEADERS if header not in ('SO', 'SE Name')]
+    path = _workbook(tmp_path / 'mapping.xlsx', [_mapping_row('IMP-H1', 'Import Header')], headers=headers)
+
+    payload = _run_import(app, admin_client, path, monkeypatch)
+    assert payload['status'] == 'failed'
+    assert payload['error'] == 'Missing columns: SO, SE Name'
+    with app.app_context():
+        assert Distributor.query.filter_by(code='IMP-H1').first() is None
+
+
+def test_missing_sheet_fails_the_job(app, admin_client, tmp_path, monkeypatch):
+    path = _workbook(tmp_path / 'mapping.xlsx', [_mapping_row('IMP-S1', 'Import Sheet')], sheet_title='Sheet1')
+
+    payload = _run_import(app, admin_client, path, monkeypatch)
+    assert payload['status'] == 'failed'
+    assert f"A sheet named '{MAPPING_SHEET_NAME}' was not found" in payload['error']
+    assert "['Sheet1']" in payload['error']
+
+
+@pytest.mark.parametrize('fields, progress', [
+    ({'status': 'queued'}, None),
+    ({'status': 'validating', 'rows_total': 120, 'rows_done': 30}, 12.5),
+    ({'status': 'validating', 'rows_total': 100, 'rows_done': 130}, 50.0),  # rows_total was an estimate
+    ({'status': 'applying', 'entities_total': 8, 'entities_done': 6}, 87.5),
+    ({'status': 'done'}, 100.0),
+    ({'status': 'failed', 'error': 'Missing columns: SO'}, None),
+])
+def test_progress_payload(fields, progress):
+    job = ImportJob(id=1, original_filename='mapping.xlsx', **{'rows_done': 0, 'entities_done': 0, **fields})
+    payload = import_job_payload(job)
+    assert payload['progress'] == progress
+    assert payload['status'] == fields['status']
+    assert payload['error_count'] == 0 and payload['summary'] is None
@@ -0,0 +1,38 @@
+from flask_mail import Message
+
+from assetify_app import mail
+from assetify_app.mailer import MailWorkerPool
+
+
+class _FakeConnection:
+    """Stands in for a Flask-Mail connection; send() raises for the subjects in `failing`."""
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.host = None
+        self.sent = []
+
+    def __enter__(self):
+        return self
+
+    def send(self, msg):
+        if msg.subject in self.failing:
+            raise self.failing[msg.subject]
+        self.sent.append(msg.subject)
+
+
+def test_unexpected_send_error_does_not_stop_the_worker(app, monkeypatch):
+    bad_header = UnicodeEncodeError('ascii', 'Zoë', 2, 3, 'ordinal not in range(128)')
+    connection = _FakeConnection({'bad': bad_header})
+    monkeypatch.setattr(mail, 'connect', lambda: connection)
+    results = []
+    pool = MailWorkerPool(app, workers=1, queue_size=4, idle_timeout=1)
+    pool.start()
+    for subject in ('bad', 'good'):
+        msg = Message(subject, sender='assetify@example.com', recipients=['se@example.com'])
+        pool.submit(msg, on_result=lambda error, retryable, s=subject: results.append((s, error, retryable)))
+    pool.join()
+    pool.shutdown(timeout=1)
+
+    assert results == [('bad', bad_header, False), ('good', None, False)]
+    assert connection.sent == ['good']
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+BASELINE = '893366dfded0'
+
+
+def _flask_db(db_path, *args):
+    """Runs `flask db <args>` on the SQLite file (in a subprocess: Alembic's env.py reconfigures logging)."""
+    env = dict(os.environ, FLASK_APP='app.py', SECRET_KEY='test', DATABASE_URL='sqlite:///' + str(db_path))
+    result = subprocess.run([sys.executable, '-m', 'flask', 'db', *args], cwd=REPO, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """A database at the baseline schema with one user and one distributor."""
+    db_path = tmp_path / 'upgrade.db'
+    _flask_db(db_path, 'upgrade', BASELINE)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO user (id, employee_code, name, role) VALUES (1, 'SE1', 'SE One', 'SE')")
+        conn.execute("INSERT INTO distributor (id, code, name, se_id) VALUES (1, 'D1', 'Dist One', 1)")
+    return db_path
+
+
+def test_existing_users_get_immediate_notifications(baseline_db):
+    _flask_db(baseline_db, 'upgrade', 'a3c1e2d40b17')
+    with sqlite3.connect(baseline_db) as conn:
+        assert conn.execute("SELECT notification_mode, digest_sent_at FROM user").fetchall() == [('immediate', None)]
+
+
+def _add_requests(db_path, *rows):
+    """rows: (id, status, request_date, deployment_date)"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO asset_request (id, requester_id, distributor_id, request_date, status, asset_model, category,"
+            " retailer_name, retailer_contact, deployment_date) VALUES (?, 1, 1, ?, ?, 'M', 'C', 'R', ?, ?)",
+            [(id_, request_date, status, f'90000000{id_:02d}', deployment_date)
+             for id_, status, request_date, deployment_date in rows]
+        )
+
+
+def _columns(conn, table):
+    return {row[1]: row for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _indexes(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA index_list({table})")}
+
+
+def test_asset_request_columns_are_backfilled_and_indexed(baseline_db):
+    _add_requests(
+        baseline_db,
+        (1, 'Pending RH Approval', '2026-01-01 10:00:00', None),
+        (2, 'Deployed', '2026-01-02 10:00:00', '2026-01-05 09:00:00'),
+        (3, 'Rejected by Admin', '2026-01-03 10:00:00', None),
+    )
+    _flask_db(baseline_db, 'upgrade', 'c52f9d8e6a31')
+    with sqlite3.connect(baseline_db) as conn:
+        assert conn.execute("SELECT id, status_category, status_code FROM asset_request ORDER BY id").fetchall() == [
+            (1, 'pending', 2), (2, 'deployed', 4), (3, 'rejected', 7)
+        ]
+        assert conn.execute("SELECT updated_at FROM asset_request ORDER BY id").fetchall() == [
+            ('2026-01-01 10:00:00',), ('2026-01-05 09:00:00',), ('2026-01-03 10:00:00',)
+        ]
+        columns = _columns(conn, 'asset_request')
+        assert columns['status_category'][3] == 1 and columns['status_code'][3] == 1
+        assert {
+            'ix_asset_request_updated_at', 'ix_asset_request_status_category', 'ix_asset_request_status_code', 'ix_asset_request_category_date',
+            'ix_asset_request_distributor_category_date', 'ix_asset_request_requester_category_date',
+        } <= _indexes(conn, 'asset_request')
+
+    _flask_db(baseline_db, 'downgrade', 'a3c1e2d40b17')
+    with sqlite3.connect(baseline_db) as conn:
+        assert not {'updated_at', 'status_category', 'status_code'} & set(_columns(conn, 'asset_request'))
+
+
+def test_unknown_status_keeps_the_columns_nullable(baseline_db):
+    _add_requests(baseline_db, (1, 'On Hold', '2026-01-01 10:00:00', None))
+    output = _flask_db(baseline_db, 'upgrade', 'c52f9d8e6a31')
+    assert "Statuses ['On Hold'] have no category" in output
+    with sqlite3.connect(baseline_db) as conn:
+        assert conn.execute("SELECT status_category, status_code FROM asset_request").fetchall() == [(None, None)]
+        assert _columns(conn, 'asset_request')['status_category'][3] == 0
+
+
+def test_head_matches_the_models(app, tmp_path):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from assetify_app import db
+
+    db_path = tmp_path / 'head.db'
+    _flask_db(db_path, 'upgrade')
+    engine = db.create_engine('sqlite:///' + str(db_path))
+    try:
+        with engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), db.metadata) == []
+    finally:
+        engine.dispose()
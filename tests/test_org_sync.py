@@ -0,0 +1,96 @@
+from assetify_app import db
+from assetify_app.org_sync import collect_org_mapping, sync_org_mapping
+from assetify_app.status_counters import SCOPE_BM, rebuild_status_counters
+from models import AssetRequest, Distributor, RequestStatusCounter, User
+
+
+def _row(dist_code, dist_name, bm_code='ORGBM1', se_code='ORGSE1', se_name='Org SE'):
+    return {
+        'Distributor Code': dist_code, 'Distributor Name': dist_name, 'Distributor Town': 'Synctown',
+        'BM': f'BM {bm_code}', 'BM Emp Code': bm_code, 'BM Mail ID': f'{bm_code.lower()}@example.com',
+        'RH': 'Org RH', 'RH Emp Code': 'ORGRH1', 'RH Mail ID': 'orgrh1@example.com',
+        'SO': 'Org SO', 'SE Emp Code': se_code, 'SE Name': se_name
+    }
+
+
+def _sync(rows):
+    summary, changes = sync_org_mapping(collect_org_mapping(rows))
+    db.session.commit()
+    return summary, changes
+
+
+def _bm_count(bm_code):
+    bm_id = db.session.query(User.id).filter(User.employee_code == bm_code).scalar()
+    return db.session.query(db.func.coalesce(db.func.sum(RequestStatusCounter.count), 0)).filter(
+        RequestStatusCounter.scope == SCOPE_BM, RequestStatusCounter.scope_id == bm_id
+    ).scalar()
+
+
+def test_sync_applies_only_the_changes(app):
+    with app.app_context():
+        seed = [
+            _row('ORG-D1', 'Org Distributor One'),
+            _row('ORG-D2', 'Org Distributor Two', bm_code='ORGBM2'),
+        ]
+        summary, _ = _sync(seed)
+        assert (summary['users_added'], summary['distributors_added'], summary['db_users_added']) == (4, 2, 2)
+
+        # Two requests on ORG-D1, counted under ORGBM1
+        d1 = Distributor.query.filter_by(code='ORG-D1').one()
+        se = User.query.filter_by(employee_code='ORGSE1').one()
+        requests = [
+            AssetRequest(requester_id=se.id, distributor_id=d1.id, asset_model='Visi Cooler', category='Cooler',
+                         retailer_name=f'Org Retailer {n}', retailer_contact=f'90000000{n}')
+            for n in range(2)
+        ]
+        db.session.add_all(requests)
+        db.session.commit()
+        rebuild_status_counters()
+        assert (_bm_count('ORGBM1'), _bm_count('ORGBM2')) == (2, 0)
+
+        summary, changes = _sync([
+            _row('ORG-D1', 'Org Distributor One', bm_code='ORGBM2'),  # reassigned
+            _row('ORG-D2', 'Org Distributor Two (Renamed)', bm_code='ORGBM2'),
+            _row('ORG-D3', 'Org Distributor Three'),
+        ])
+        assert {key: summary[key] for key in (
+            'users_added', 'users_updated', 'distributors_added', 'distributors_updated',
+            'distributors_reassigned', 'db_users_added', 'db_users_updated'
+        )} == {
+            'users_added': 0, 'users_updated': 0, 'distributors_added': 1, 'distributors_updated': 2,
+            'distributors_reassigned': 1, 'db_users_added': 1, 'db_users_updated': 1
+        }
+        assert "~ distributor ORG-D1: bm_id 'ORGBM1' -> 'ORGBM2'" in changes
+        assert "~ distributor ORG-D2: name 'Org Distributor Two' -> 'Org Distributor Two (Renamed)'" in changes
+
+        bm2 = User.query.filter_by(employee_code='ORGBM2').one()
+        rows = {d.code: d for d in Distributor.query.filter(Distributor.code.like('ORG-D%'))}
+        assert rows['ORG-D1'].bm_id == bm2.id
+        assert rows['ORG-D2'].name == 'Org Distributor Two (Renamed)'
+        assert rows['ORG-D3'].se_id == se.id
+        assert User.query.filter_by(employee_code='ORG-D2').one().name == 'Org Distributor Two (Renamed) (DB)'
+        assert User.query.filter_by(employee_code='ORG-D3', role='DB').one().distributor_id == rows['ORG-D3'].id
+
+        # The counters followed ORG-D1 to its new BM
+        assert (_bm_count('ORGBM1'), _bm_count('ORGBM2')) == (0, 2)
+
+        for req in requests:
+            db.session.delete(req)
+        db.session.commit()
+        rebuild_status_counters()
+
+
+def test_blank_vacant_se_is_skipped(app):
+    with app.app_context():
+        _, changes = _sync([
+            _row('ORG-V1', 'Org Vacant One', se_code='0', se_name=''),
+            _row('ORG-V2', 'Org Vacant Two', se_code='', se_name='Ravi K'),
+        ])
+        # A vacant position with no name maps to the bare 'vacant_' code, which is not created
+        assert User.query.filter(User.employee_code.in_(['0', 'vacant_'])).count() == 0
+        assert Distributor.query.filter_by(code='ORG-V1').one().se_id is None
+
+        named = User.query.filter_by(employee_code='vacant_ravi_k').one()
+        assert (named.role, named.name) == ('SE', 'Ravi K')
+        assert Distributor.query.filter_by(code='ORG-V2').one().se_id == named.id
+        assert "+ user vacant_ravi_k (SE) Ravi K" in changes
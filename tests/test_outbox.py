@@ -0,0 +1,22 @@
+from assetify_app import db
+from assetify_app.outbox import claim_batch, drain_outbox, queue_email, send_batch
+from models import EmailOutbox
+
+
+def test_email_is_queued_and_stays_pending_without_credentials(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_USERNAME', None)
+    monkeypatch.setitem(app.config, 'MAIL_PASSWORD', None)
+    with app.test_request_context():
+        entry = queue_email('rh@example.com', 'Outbox test', 'email/approval_digest.html', items=[], recipient_name='RH')
+        db.session.commit()
+        entry_id = entry.id
+
+        assert drain_outbox(10) == {}
+        batch = claim_batch(10)
+        assert [queued.id for queued in batch] == [entry_id]
+        assert send_batch(None, batch) == {'pending': 1}
+
+        entry = db.session.get(EmailOutbox, entry_id)
+        assert (entry.status, entry.attempts, entry.claim_token) == ('pending', 0, None)
+        db.session.delete(entry)
+        db.session.commit()
@@ -0,0 +1,50 @@
+"""
+Cursor (keyset) pagination: every dashboard sort, in both directions,
+for every role, walked to the last page and compared with the rows the
+same role sees with offset paging.
+"""
+import html
+import re
+
+import pytest
+
+SORT_KEYS = ['id', 'date', 'asset', 'status', 'requester', 'distributor']
+REQUEST_LINK = re.compile(r'<td[^>]*>\s*<a href="/request/(\d+)"')
+NEXT_LINK = re.compile(r'<a href="([^"]*cursor=[^"]*)"[^>]*>\s*Next')
+
+
+def page_ids(body):
+    return [int(request_id) for request_id in REQUEST_LINK.findall(body)]
+
+
+def walk(client, url, max_pages=100):
+    """Request ids on every page reached by following the Next links from `url`."""
+    ids = []
+    for _ in range(max_pages):
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        ids.extend(page_ids(body))
+        match = NEXT_LINK.search(body)
+        if not match:
+            return ids
+        url = html.unescape(match.group(1))
+    raise AssertionError(f'more than {max_pages} pages from {url}')
+
+
+@pytest.mark.parametrize('order_by', ['asc', 'desc'])
+@pytest.mark.parametrize('sort_by', SORT_KEYS)
+def test_dashboard_cursor_paging_matches_offset(client, sort_by, order_by):
+    offset_ids = []
+    for page in range(1, 100):
+        response = client.get(f'/dashboard?paging=offset&sort_by={sort_by}&order_by={order_by}&page={page}')
+        assert response.status_code == 200
+        ids = page_ids(response.get_data(as_text=True))
+        if not ids:
+            break
+        offset_ids.extend(ids)
+
+    assert offset_ids
+    cursor_ids = walk(client, f'/dashboard?paging=cursor&sort_by={sort_by}&order_by={order_by}')
+    assert len(cursor_ids) == len(set(cursor_ids))
+    assert sorted(cursor_ids) == sorted(offset_ids)
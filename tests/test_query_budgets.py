@@ -0,0 +1,59 @@
+"""
+Hits every @query_budget view as every role that can open it. The app
+fixture runs with QUERY_BUDGET_STRICT, so a view that issues more SQL
+statements than its budget raises QueryBudgetExceeded and fails here.
+"""
+import pytest
+
+from models import db, Distributor, AssetRequest
+
+DASHBOARD_URLS = [
+    '/dashboard',
+    '/dashboard?page=2',
+    '/dashboard?category=pending',
+    '/dashboard?status=Approved',
+    '/dashboard?distributor=Synthetic',
+    '/dashboard?sort_by=requester&order_by=asc',
+    '/dashboard?sort_by=distributor',
+]
+ADMIN_URLS = [
+    '/admin/users',
+    '/admin/users?page=2',
+    '/admin/distributors',
+    '/admin/distributors?sort_by=bm',
+]
+
+
+def visible_request_id(user_id, role):
+    """A request the user may open on the detail page."""
+    query = db.session.query(AssetRequest.id).join(Distributor, AssetRequest.distributor_id == Distributor.id)
+    if role in ('SE', 'DB'):
+        query = query.filter(AssetRequest.requester_id == user_id)
+    elif role == 'BM':
+        query = query.filter(Distributor.bm_id == user_id)
+    elif role == 'RH':
+        query = query.filter(Distributor.rh_id == user_id)
+    return query.order_by(AssetRequest.id).limit(1).scalar()
+
+
+@pytest.mark.parametrize('url', DASHBOARD_URLS)
+def test_dashboard_within_budget(client, url):
+    assert client.get(url).status_code == 200
+
+
+def test_view_request_within_budget(app, client, users, role):
+    with app.app_context():
+        request_id = visible_request_id(users[role].id, role)
+    if request_id is None:
+        pytest.skip(f'no request visible to the synthetic {role}')
+    assert client.get(f'/request/{request_id}').status_code == 200
+
+
+def test_api_distributors_within_budget(client):
+    assert client.get('/api/distributors').status_code == 200
+
+
+@pytest.mark.parametrize('url', ADMIN_URLS)
+@pytest.mark.parametrize('role', ['Admin'])
+def test_admin_lists_within_budget(client, url):
+    assert client.get(url).status_code == 200
@@ -0,0 +1,29 @@
+import logging
+
+from conftest import ADMIN_CODE, PASSWORD
+
+
+def _admin_client(app):
+    client = app.test_client()
+    client.post('/login', data={'employee_code': ADMIN_CODE, 'password': PASSWORD})
+    return client
+
+
+def test_server_timing_header_is_opt_in(app, monkeypatch):
+    client = _admin_client(app)
+    assert 'Server-Timing' not in client.get('/dashboard').headers
+
+    monkeypatch.setitem(app.config, 'SQL_TIMING_HEADER', True)
+    assert client.get('/dashboard').headers['Server-Timing'].startswith('db;dur=')
+
+
+def test_request_line_is_logged_at_debug(app, caplog):
+    client = _admin_client(app)
+    with caplog.at_level(logging.INFO, logger=app.logger.name):
+        client.get('/dashboard').close()
+    assert not [r for r in caplog.records if r.getMessage().startswith('sql_timing')]
+
+    with caplog.at_level(logging.DEBUG, logger=app.logger.name):
+        client.get('/dashboard').close()
+    lines = [r for r in caplog.records if r.getMessage().startswith('sql_timing')]
+    assert lines and lines[-1].levelno == logging.DEBUG
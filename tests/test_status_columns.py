@@ -0,0 +1,23 @@
+from assetify_app import db
+from assetify_app.exports import _apply_export_filters
+from models import AssetRequest, User, STATUS_CATEGORIES, STATUS_CODES
+
+
+def test_derived_status_columns_match_status(app):
+    with app.app_context():
+        rows = db.session.query(
+            AssetRequest.status, AssetRequest.status_category, AssetRequest.status_code
+        ).distinct().all()
+        assert rows
+        for status, category, code in rows:
+            assert (category, code) == (STATUS_CATEGORIES[status], STATUS_CODES[status])
+
+
+def test_status_filter_uses_the_status_code(app, users):
+    with app.app_context():
+        admin = db.session.get(User, users['Admin'].id)
+        query = _apply_export_filters(db.session.query(AssetRequest), admin, {'status': 'Pending RH Approval'})
+        assert 'status_code' in str(query.statement)
+        assert query.count() == db.session.query(AssetRequest).filter(
+            AssetRequest.status == 'Pending RH Approval'
+        ).count() > 0
@@ -0,0 +1,77 @@
+from assetify_app import db
+from assetify_app.status_counters import (
+    SCOPE_REBUILT, counter_stats_for_user, reassign_distributor_counters, rebuild_status_counters,
+    record_status_change, status_counters_ready
+)
+from assetify_app.transitions import PENDING_BM, PENDING_RH, approve_as_bm, approve_as_rh, reject
+from models import AssetRequest, Distributor, RequestStatusCounter, User
+
+
+def _counters():
+    rows = db.session.query(
+        RequestStatusCounter.scope, RequestStatusCounter.scope_id, RequestStatusCounter.status,
+        RequestStatusCounter.count
+    ).filter(RequestStatusCounter.scope != SCOPE_REBUILT, RequestStatusCounter.count != 0)
+    return {(scope, scope_id, status): count for scope, scope_id, status, count in rows}
+
+
+def _scope_total(counters, scope, scope_id):
+    return sum(count for key, count in counters.items() if key[:2] == (scope, scope_id))
+
+
+def _pending(stage, exclude=()):
+    return db.session.query(AssetRequest).join(Distributor, AssetRequest.distributor_id == Distributor.id).filter(
+        AssetRequest.status == stage, AssetRequest.id.notin_(exclude)
+    ).order_by(AssetRequest.id).first()
+
+
+def test_incremental_counters_match_a_rebuild(app):
+    with app.app_context():
+        rebuild_status_counters()
+
+        req = _pending(PENDING_BM)
+        bm = db.session.get(User, req.distributor.bm_id)
+        assert approve_as_bm(req.id, bm, 'Free of Cost', justification='counter test')
+        rh = db.session.get(User, req.distributor.rh_id)
+        assert approve_as_rh(req.id, rh)
+        other = _pending(PENDING_BM, exclude=[req.id])
+        assert reject(other.id, db.session.get(User, other.distributor.bm_id), 'counter test')
+        db.session.commit()
+
+        dist = db.session.get(Distributor, req.distributor_id)
+        old_bm_id, old_rh_id = dist.bm_id, dist.rh_id
+        new_bm = db.session.query(User).filter(User.role == 'BM', User.id != old_bm_id).first()
+        before = _scope_total(_counters(), 'bm', new_bm.id)
+        dist.bm_id = new_bm.id
+        reassign_distributor_counters(dist, old_bm_id, old_rh_id)
+        db.session.commit()
+
+        incremental = _counters()
+        assert _scope_total(incremental, 'bm', new_bm.id) > before
+        rebuild_status_counters()
+        assert incremental == _counters()
+
+        dist.bm_id = old_bm_id
+        db.session.commit()
+        rebuild_status_counters()
+
+
+def test_counters_are_not_used_or_written_before_the_first_rebuild(app, users):
+    with app.app_context():
+        db.session.query(RequestStatusCounter).delete()
+        db.session.commit()
+        app.extensions.pop('status_counters_ready', None)
+        try:
+            assert not status_counters_ready()
+            req = _pending(PENDING_RH)
+            record_status_change(req, PENDING_RH, 'Approved')
+            assert db.session.query(RequestStatusCounter).count() == 0
+            db.session.rollback()
+
+            rebuild_status_counters()
+            app.extensions.pop('status_counters_ready', None)
+            assert status_counters_ready()
+            admin = db.session.get(User, users['Admin'].id)
+            assert counter_stats_for_user(admin)['total_requests'] == db.session.query(AssetRequest).count()
+        finally:
+            rebuild_status_counters()
@@ -0,0 +1,167 @@
+from assetify_app import db
+from assetify_app.status_counters import SCOPE_DISTRIBUTOR
+from assetify_app.transitions import (
+    PENDING_BM, PENDING_RH, approve_as_admin, approve_as_bm, approve_as_rh, deploy, reject
+)
+from conftest import PASSWORD
+from models import AssetRequest, Distributor, EmailOutbox, RequestStatusCounter, User
+
+
+def _request_at(status):
+    return db.session.query(AssetRequest).filter(AssetRequest.status == status).order_by(AssetRequest.id).first()
+
+
+def _other_user(role, not_id):
+    return db.session.query(User).filter(User.role == role, User.id != not_id).order_by(User.id).first()
+
+
+def _distributor_count(distributor_id, status):
+    return db.session.query(RequestStatusCounter.count).filter_by(
+        scope=SCOPE_DISTRIBUTOR, scope_id=distributor_id, status=status
+    ).scalar() or 0
+
+
+def _login(app, user):
+    client = app.test_client()
+    response = client.post('/login', data={'employee_code': user.employee_code, 'password': PASSWORD})
+    assert response.status_code == 302
+    return client
+
+
+# --- Lost races ---
+
+def test_second_bm_approval_loses_the_race(app):
+    with app.app_context():
+        req = _request_at(PENDING_BM)
+        bm = db.session.get(User, req.distributor.bm_id)
+        assert approve_as_bm(req.id, bm, 'Free of Cost', justification='first')
+        assert approve_as_bm(req.id, bm, 'With Security', security_amount=500) is None
+        db.session.commit()
+
+        db.session.expire_all()
+        assert (req.status, req.bm_approval_type, req.bm_foc_justification) == (PENDING_RH, 'Free of Cost', 'first')
+
+
+def test_lost_race_redirects_with_the_current_status(app):
+    with app.app_context():
+        req = _request_at(PENDING_BM)
+        bm = db.session.get(User, req.distributor.bm_id)
+        request_id = req.id
+        client = _login(app, bm)
+        form = {'approval_type': 'foc', 'foc_justification': 'route'}
+
+        assert client.post(f'/approve/{request_id}', data=form).status_code == 302
+        response = client.post(f'/approve/{request_id}', data=form)
+        assert response.headers['Location'].endswith(f'/request/{request_id}')
+        with client.session_transaction() as session:
+            category, message = session['_flashes'][-1]
+        assert category == 'warning' and f"it is now '{PENDING_RH}'" in message
+
+
+# --- Approver scope ---
+
+def test_bm_and_rh_cannot_act_on_other_regions(app):
+    with app.app_context():
+        at_bm = _request_at(PENDING_BM)
+        other_bm = _other_user('BM', at_bm.distributor.bm_id)
+        assert approve_as_bm(at_bm.id, other_bm, 'Free of Cost', justification='not mine') is None
+        assert reject(at_bm.id, other_bm, 'not mine') is None
+
+        at_rh = _request_at(PENDING_RH)
+        other_rh = _other_user('RH', at_rh.distributor.rh_id)
+        assert approve_as_rh(at_rh.id, other_rh) is None
+        assert reject(at_rh.id, other_rh, 'not mine') is None
+        db.session.commit()
+
+        db.session.expire_all()
+        assert (at_bm.status, at_rh.status) == (PENDING_BM, PENDING_RH)
+
+
+# --- Admin override ---
+
+def test_admin_override_at_the_bm_stage_sets_both_approvers(app, users):
+    with app.app_context():
+        admin = db.session.get(User, users['Admin'].id)
+        req = _request_at(PENDING_BM)
+        result = approve_as_admin(req.id, admin, 'urgent')
+        db.session.commit()
+
+        assert (result.old_status, result.status) == (PENDING_BM, 'Approved')
+        db.session.expire_all()
+        assert (req.bm_approver_id, req.rh_approver_id) == (admin.id, admin.id)
+        assert req.bm_remarks == req.rh_remarks == 'Approved by Admin: urgent'
+        assert req.bm_approval_type == 'Admin Override'
+
+
+def test_admin_override_at_the_rh_stage_keeps_the_bm_decision(app, users):
+    with app.app_context():
+        admin = db.session.get(User, users['Admin'].id)
+        req = _request_at(PENDING_RH)
+        bm_decision = (req.bm_approver_id, req.bm_remarks, req.bm_approval_type)
+        result = reject(req.id, admin, '')
+        db.session.commit()
+
+        assert (result.old_status, result.status) == (PENDING_RH, 'Rejected by Admin')
+        db.session.expire_all()
+        assert (req.bm_approver_id, req.bm_remarks, req.bm_approval_type) == bm_decision
+        assert req.rh_approver_id == admin.id
+        assert req.rh_remarks == 'Rejected by Admin: '
+
+
+# --- Deployment ---
+
+def test_only_the_requesting_se_can_deploy(app):
+    with app.app_context():
+        req = _request_at('Approved')
+        other_se = _other_user('SE', req.requester_id)
+        assert deploy(req.id, other_se, 'Make', 'SN-OTHER', None, None) is None
+
+        requester = db.session.get(User, req.requester_id)
+        result = deploy(req.id, requester, 'Make', 'SN-TRANSITIONS-1', None, None)
+        db.session.commit()
+        assert result.status == 'Deployed'
+        db.session.expire_all()
+        assert (req.deployed_by_id, req.deployed_serial_no) == (requester.id, 'SN-TRANSITIONS-1')
+
+
+# --- RETURNING columns ---
+
+def test_returning_columns_feed_notifications_and_counters(app):
+    with app.app_context():
+        req = _request_at(PENDING_BM)
+        distributor = db.session.get(Distributor, req.distributor_id)
+        rh = db.session.get(User, distributor.rh_id)
+        requester = db.session.get(User, req.requester_id)
+        bm = db.session.get(User, distributor.bm_id)
+        before = (_distributor_count(distributor.id, PENDING_BM), _distributor_count(distributor.id, PENDING_RH))
+
+        result = approve_as_bm(req.id, bm, 'Free of Cost', justification='returning')
+        assert (result.distributor.id, result.distributor.name) == (distributor.id, distributor.name)
+        assert (result.distributor.bm_id, result.distributor.rh_id) == (bm.id, rh.id)
+        assert (result.requester.id, result.requester.name) == (requester.id, requester.name)
+        assert (result.regional_head.name, result.regional_head.email) == (rh.name, rh.email)
+        assert result.regional_head.notification_mode == 'immediate'
+        assert (result.asset_model, result.retailer_name) == (req.asset_model, req.retailer_name)
+        db.session.commit()
+
+        assert (_distributor_count(distributor.id, PENDING_BM), _distributor_count(distributor.id, PENDING_RH)) == (
+            before[0] - 1, before[1] + 1
+        )
+
+
+def test_bm_approval_queues_the_rh_email(app):
+    with app.app_context():
+        req = _request_at(PENDING_BM)
+        request_id = req.id
+        bm = db.session.get(User, req.distributor.bm_id)
+        rh = db.session.get(User, req.distributor.rh_id)
+        client = _login(app, bm)
+
+        client.post(f'/approve/{request_id}', data={'approval_type': 'security', 'security_amount': '1000'})
+        entry = db.session.query(EmailOutbox).filter(
+            EmailOutbox.subject == f'Asset Request #{request_id} Requires Your Approval'
+        ).one()
+        assert entry.recipient == rh.email
+        assert rh.name in entry.html
+        db.session.delete(entry)
+        db.session.commit()
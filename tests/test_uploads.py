@@ -0,0 +1,108 @@
+import base64
+import io
+import os
+import time
+
+import pytest
+
+from assetify_app import db
+from assetify_app.photos import (
+    collect_unreferenced_uploads, migrate_legacy_uploads, rebuild_upload_references,
+    save_photo_from_data_url, thumbnail_filename, upload_path
+)
+from models import AssetRequest, StoredUpload
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _new_photo(colour):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), colour).save(buffer, 'JPEG')
+    filename, error = save_photo_from_data_url('data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode())
+    assert error is None
+    return filename
+
+
+def _ref_count(filename):
+    return db.session.query(StoredUpload.ref_count).filter(StoredUpload.filename == filename).scalar()
+
+
+def _age(path, seconds=3600):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.fixture
+def photo_request(app):
+    """A request with a photo, restored (with fresh reference counts) afterwards."""
+    with app.app_context():
+        req = db.session.query(AssetRequest).filter(AssetRequest.photo_filename.isnot(None)).first()
+        original = req.photo_filename
+        yield req
+        req.photo_filename = original
+        db.session.commit()
+        rebuild_upload_references()
+        db.session.remove()
+
+
+def test_replaced_photo_is_released_and_collected(photo_request):
+    original = photo_request.photo_filename
+    original_refs = _ref_count(original)
+
+    filename = _new_photo((10, 200, 30))
+    photo_request.photo_filename = filename
+    db.session.commit()
+    assert _ref_count(filename) == 1
+    assert _ref_count(original) == original_refs - 1
+
+    photo_request.photo_filename = original
+    db.session.commit()
+    assert _ref_count(filename) == 0
+
+    collected, _ = collect_unreferenced_uploads()
+    assert collected == 1
+    assert _ref_count(filename) is None
+    assert not os.path.exists(upload_path(filename))
+    assert not os.path.exists(upload_path(thumbnail_filename(filename)))
+    assert os.path.exists(upload_path(original))
+
+
+def test_orphan_files_are_collected_after_the_grace_period(app, photo_request):
+    filename = _new_photo((200, 10, 30))
+    db.session.rollback()  # the request that would have used the photo never commits
+    assert _ref_count(filename) is None
+    stray = os.path.join(app.config['UPLOAD_FOLDER'], 'abandoned.jpeg.part')
+    with open(stray, 'wb') as f:
+        f.write(b'partial')
+
+    assert collect_unreferenced_uploads(grace_minutes=60) == (0, 0)
+    assert os.path.exists(upload_path(filename))
+
+    for path in (upload_path(filename), upload_path(thumbnail_filename(filename)), stray):
+        _age(path, 2 * 3600)
+    assert collect_unreferenced_uploads(grace_minutes=60) == (1, 1)
+    assert not os.path.exists(upload_path(filename))
+    assert not os.path.exists(stray)
+    assert os.path.exists(upload_path(photo_request.photo_filename))
+
+
+def test_migration_copies_before_removing_legacy_files(app, photo_request):
+    with open(upload_path(photo_request.photo_filename), 'rb') as f:
+        content = f.read()
+    legacy_name = 'c0ffee00-0000-4000-8000-000000000000.jpeg'
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], legacy_name), 'wb') as f:
+        f.write(content + b'legacy')
+    db.session.query(AssetRequest).filter(AssetRequest.id == photo_request.id).update(
+        {AssetRequest.photo_filename: legacy_name}, synchronize_session=False
+    )
+    db.session.commit()
+
+    moved, missing = migrate_legacy_uploads(batch_size=1)
+    db.session.expire_all()
+    assert (moved, missing) == (1, [])
+    migrated = photo_request.photo_filename
+    assert migrated != legacy_name
+    with open(upload_path(migrated), 'rb') as f:
+        assert f.read() == content + b'legacy'
+    assert _ref_count(migrated) == 1
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], legacy_name))
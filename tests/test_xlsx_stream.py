@@ -0,0 +1,32 @@
+import io
+import warnings
+import zipfile
+from datetime import datetime
+
+import openpyxl
+
+from assetify_app.xlsx_stream import stream_xlsx
+
+
+def build(rows):
+    return b''.join(stream_xlsx(['ID', 'Name', 'Date'], rows, sheet_title='DMS Export', flush_every=100))
+
+
+def test_workbook_opens_without_style_warnings():
+    data = build((i, f'Retailer {i}\x01', datetime(2026, 1, 1)) for i in range(1, 501))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        workbook = openpyxl.load_workbook(io.BytesIO(data))
+    sheet = workbook.active
+    assert sheet.title == 'DMS Export'
+    assert sheet.max_row == 501
+    assert sheet['B501'].value == 'Retailer 500'
+    assert sheet['C2'].value == '2026-01-01T00:00:00'
+
+
+def test_sheet_entry_is_written_with_zip64_headers():
+    with zipfile.ZipFile(io.BytesIO(build([(1, 'a', None)]))) as archive:
+        assert archive.testzip() is None
+        sheet = archive.getinfo('xl/worksheets/sheet1.xml')
+        # force_zip64 marks the entry as needing ZIP64 (version 4.5) in its headers
+        assert sheet.extract_version >= zipfile.ZIP64_VERSION